@@ -0,0 +1,94 @@
+"""
+Process-wide, long-lived ``PDFAnalyzer``.
+
+Building an analyzer loads the environment, reads the config and sets up Azure clients
+whose connection pools should stay warm, so the API creates it once and shares it across
+requests and worker threads (the analyzer keeps no per-document state on itself).
+Connection pools are sized by ``AZURE_HTTP_POOL_SIZE`` and idle OpenAI connections
+kept for ``AZURE_HTTP_KEEPALIVE_SECONDS``; the clients themselves are created on first use.
+
+For multi-worker servers the service can be warmed in the parent process
+(``gunicorn --preload``): config, catalog and routing stats are inherited by the
+workers, and each forked worker lazily recreates its own Azure clients, because pooled
+sockets must not be shared across processes.
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pdf_analyzer import PDFAnalyzer
+
+
+HTTP_POOL_SIZE = int(os.getenv("AZURE_HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("AZURE_HTTP_KEEPALIVE_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyzerService:
+    """Lazily created, thread-safe holder of one warm ``PDFAnalyzer`` per process."""
+
+    def __init__(self, base_dir: str, config_path: Optional[str] = None,
+                 http_pool_size: int = HTTP_POOL_SIZE,
+                 http_keepalive: float = HTTP_KEEPALIVE_SECONDS):
+        """
+        Args:
+            base_dir: Project root (cache/ and config/ live under it)
+            config_path: Configuration file (default: <base_dir>/config/config.json)
+            http_pool_size: Connection pool size of each Azure client
+            http_keepalive: Seconds idle OpenAI connections are kept alive
+        """
+        self.base_dir = base_dir
+        self.config_path = config_path or os.path.join(base_dir, "config", "config.json")
+        self.http_pool_size = http_pool_size
+        self.http_keepalive = http_keepalive
+        self._analyzer: Optional["PDFAnalyzer"] = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def get(self) -> "PDFAnalyzer":
+        """The shared analyzer, created on first use (and re-connected after a fork)."""
+        analyzer = self._analyzer
+        if analyzer is not None and self._pid == os.getpid():
+            return analyzer
+        with self._lock:
+            if self._analyzer is None:
+                from pdf_analyzer import PDFAnalyzer
+                
+                self._analyzer = PDFAnalyzer(
+                    config_path=self.config_path,
+                    artifact_dir=os.path.join(self.base_dir, "cache", "layouts"),
+                    routing_stats_path=os.path.join(self.base_dir, "cache", "routing_stats.json"),
+                    usage_ledger_path=os.path.join(self.base_dir, "cache", "usage_ledger.db"),
+                    http_pool_size=self.http_pool_size,
+                    http_keepalive=self.http_keepalive,
+                )
+            elif self._pid != os.getpid():
+                logger.info(f"Worker {os.getpid()}: dropping Azure clients inherited from {self._pid}")
+                self._analyzer.reset_clients()
+            self._pid = os.getpid()
+            return self._analyzer
+
+    def warm(self) -> bool:
+        """Create the analyzer now (e.g. at startup); False if it cannot be created yet."""
+        try:
+            self.get()
+            return True
+        except Exception as e:
+            logger.warning(f"Analyzer not warmed, it will be created on first request: {e}")
+            return False
+
+
+_services: Dict[str, AnalyzerService] = {}
+_services_lock = threading.Lock()
+
+
+def get_analyzer_service(base_dir: str) -> AnalyzerService:
+    """Process-wide analyzer service for a project root."""
+    with _services_lock:
+        if base_dir not in _services:
+            _services[base_dir] = AnalyzerService(base_dir)
+        return _services[base_dir]
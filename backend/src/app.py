@@ -1,87 +1,244 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, make_response
 import os
-from utils import create_batch_config_from_config, create_consolidated_results
-from pdf_analyzer import PDFAnalyzer  # Assuming you have a PDFAnalyzer class for processing
-from dashboard_method_summary_analysis import create_dashboard
+from utils import create_batch_config_from_config, create_consolidated_results, consolidated_results_path, register_documents
+from run_config import RunConfig
+from analyzer_service import get_analyzer_service
+from instrumentation import PIPELINE_METRICS, stage, record
+from profiling import profiling_session
+from model_router import routing_fingerprint
+from build_graph import plan_builds, consolidation_needed
+from scheduler import get_scheduler, INTERACTIVE
+from backfill import Backfill, expand_backfill
+from usage_ledger import BudgetExceeded
+from circuit_breaker import CircuitOpen, any_open, breaker_states
+from latency_control import DeadlineExceeded
+from revalidation import Revalidator
+from datetime import datetime
 import json
+import time
+import uuid
 
 app = Flask(__name__)
 
+BASE_DIR = "D:\office_Work_shennanigans\hackathon\integrated_hackathon_codebase"
+DASHBOARD_CACHE_MAX_AGE = 300  # seconds browsers may reuse a component before revalidating
+ASSET_MAX_AGE = 31536000  # asset filenames are versioned, so they can be cached for a year
+ASSET_URL_PREFIX = "/assets"
+# Answer from the last-good results and refresh changed banks in the background (per request: "serve_stale")
+SERVE_STALE_DEFAULT = os.getenv("SERVE_STALE_WHILE_REVALIDATE", "0").lower() in ("1", "true", "yes")
+
+# quarter -> (consolidated_results.json mtime, DashboardComponents)
+_dashboards = {}
+# quarter -> (consolidated_results.json mtime, full dashboard HTML)
+_dashboard_html = {}
+
+# One warm PDFAnalyzer (and Azure connection pools) shared by all requests
+ANALYZER_SERVICE = get_analyzer_service(BASE_DIR)
+
+# Backfills started through the API (newest last); they share the scheduler with /api/analyze
+_backfills = []
+
+# Background refreshes of results served stale
+REVALIDATOR = Revalidator(get_scheduler(), ANALYZER_SERVICE.get, BASE_DIR)
+
+
+def _get_dashboard(quarter):
+    """Build (or reuse) the dashboard for a quarter from its consolidated results on disk."""
+    consolidated_path = os.path.join(BASE_DIR, "results", quarter, "consolidated_results.json")
+    if not os.path.exists(consolidated_path):
+        return None, None
+    mtime = os.path.getmtime(consolidated_path)
+    cached = _dashboards.get(quarter)
+    if cached and cached[0] == mtime:
+        record("cache_hits", cache="dashboard")
+        return cached[1], mtime
+    record("cache_misses", cache="dashboard")
+    from dashboard_method_summary_analysis import create_dashboard
+    
+    with stage("dashboard_build"):
+        dashboard = create_dashboard(consolidated_path, display_mode="none")
+    _dashboards[quarter] = (mtime, dashboard)
+    return dashboard, mtime
+
+
+def _get_dashboard_html(quarter):
+    """Complete dashboard HTML for a quarter (all components inline), cached per results version."""
+    dashboard, mtime = _get_dashboard(quarter)
+    if dashboard is None:
+        return None
+    cached = _dashboard_html.get(quarter)
+    if not cached or cached[0] != mtime:
+        with stage("dashboard_render"):
+            cached = (mtime, dashboard.to_html(asset_base_url=ASSET_URL_PREFIX))
+        _dashboard_html[quarter] = cached
+    return cached[1]
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline stage timings and counters in Prometheus text format."""
+    response = make_response(PIPELINE_METRICS.render_prometheus())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
+@app.route(f'{ASSET_URL_PREFIX}/<path:filename>', methods=['GET'])
+def dashboard_asset(filename):
+    """Pinned Plotly/html2pdf bundles so the dashboard loads without external network access."""
+    from dashboard_method_summary_analysis import dashboard_asset_source
+    
+    try:
+        source = dashboard_asset_source(filename)
+    except (KeyError, FileNotFoundError):
+        return jsonify({"error": f"Unknown asset: {filename}"}), 404
+    response = make_response(source)
+    response.headers['Content-Type'] = 'application/javascript; charset=utf-8'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+
+@app.route('/api/dashboard/<quarter>', methods=['GET'])
+def dashboard_shell(quarter):
+    """Lightweight dashboard page; charts are fetched per component as they scroll into view."""
+    dashboard, mtime = _get_dashboard(quarter)
+    if dashboard is None:
+        return jsonify({"error": f"No results found for {quarter}"}), 404
+    response = make_response(dashboard.generate_shell_html(f"/api/dashboard/{quarter}", ASSET_URL_PREFIX))
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(f"{quarter}-{mtime}")
+    return response.make_conditional(request)
+
+
+@app.route('/api/dashboard/<quarter>/<component>', methods=['GET'])
+def dashboard_component(quarter, component):
+    """Compact figure JSON for a single dashboard component."""
+    dashboard, mtime = _get_dashboard(quarter)
+    if dashboard is None:
+        return jsonify({"error": f"No results found for {quarter}"}), 404
+    index = dashboard.get_index(component)
+    if index is None:
+        return jsonify({"error": f"Unknown dashboard component: {component}"}), 404
+    response = make_response(dashboard.component_json(index, dashboard.shared_template()))
+    response.headers['Content-Type'] = 'application/json'
+    response.headers['Cache-Control'] = f'public, max-age={DASHBOARD_CACHE_MAX_AGE}'
+    response.set_etag(f"{quarter}-{mtime}-{dashboard.keys[index]}")
+    return response.make_conditional(request)
+
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     data = request.json
+    # Opt-in profiling: "X-Profile: 1" writes cProfile/tracemalloc reports to <base_dir>/profiles
+    if request.headers.get('X-Profile', '').lower() in ('1', 'true', 'yes'):
+        with profiling_session(os.path.join(BASE_DIR, "profiles")):
+            return _analyze(data)
+    return _analyze(data)
+
+
+def _analyze(data):
     bank_names = data.get('bank_names')  # Get the list of bank names
     latest_quarter = data.get('quarter')
-    base_dir = "D:\office_Work_shennanigans\hackathon\integrated_hackathon_codebase"
-    config_path = os.path.join(base_dir, "config", "config.json") # add a step where the data from the request populates the config
+    dashboard_mode = data.get('dashboard_mode', 'inline')  # "inline" embeds the full HTML, "lazy" links to the shell
+    force = bool(data.get('force', False))  # re-analyze banks even if their inputs are unchanged
+    dry_run = bool(data.get('dry_run', False))  # only report which banks would be re-analyzed
+    base_dir = BASE_DIR
+    config_path = os.path.join(base_dir, "config", "config.json")
 
     if not bank_names or not latest_quarter:
         return jsonify({"error": "Missing bank_names or latest_quarter"}), 400
 
-    # Add requested bank names and quarterto the configuration
-    # with open(config_path, 'r') as f:
-    #     config = json.load(f)
-    config = {}
-    config['requested_bank_names'] = bank_names
-    config['latest_quarter'] = latest_quarter
-    with open(config_path, 'w') as f:
-        json.dump(config, f)
+    # Per-request settings; config.json only supplies defaults and is never rewritten,
+    # so concurrent requests for different quarters do not interfere
+    run_config = RunConfig.from_file(config_path, requested_bank_names=bank_names, latest_quarter=latest_quarter,
+                                     run_id=f"api-{uuid.uuid4().hex[:12]}")
 
     # Create batch config based on the provided bank names
-    batch_config = create_batch_config_from_config(config_path, base_dir)
+    with stage("batch_config"):
+        batch_config = create_batch_config_from_config(run_config, base_dir)
     if not batch_config:
         return jsonify({"error": "Missing data"}), 400
 
-    # Initialize the PDFAnalyzer
-    analyzer = PDFAnalyzer(config_path=config_path)
+    # Only banks whose inputs changed since their last successful run are re-analyzed
+    stale, up_to_date = plan_builds(batch_config, latest_quarter, routing_fingerprint(), force=force)
+    if dry_run:
+        return jsonify({
+            "rebuild": [{"bank": c['bank'], "reason": c['rebuild_reason']} for c in stale],
+            "up_to_date": [c['bank'] for c in up_to_date]
+        }), 200
 
-    # Process each bank and trigger the analysis
-    results = []
-    for i, config in enumerate(batch_config):
+    # Stale-while-revalidate: answer from the last-good results at once (always while a
+    # remote service's circuit is open) and re-analyze changed banks in the background
+    requested_stale = [c for c in stale if c['bank'] in bank_names]
+    consolidated_output_path = consolidated_results_path(base_dir, run_config)
+    serve_stale = bool(data.get('serve_stale', SERVE_STALE_DEFAULT)) or any_open()
+    if serve_stale and os.path.exists(consolidated_output_path):
+        return _serve_last_good(consolidated_output_path, latest_quarter, dashboard_mode, requested_stale, run_config)
+
+    register_documents(requested_stale, latest_quarter, base_dir)
+    # Shared, already initialized PDFAnalyzer
+    analyzer = ANALYZER_SERVICE.get() if stale else None
+    if analyzer is not None and analyzer.ledger is not None:
+        try:
+            analyzer.ledger.check(run_config.extra["run_id"])
+        except BudgetExceeded as e:
+            return jsonify({"error": str(e)}), 429
+
+    # Queue each bank at interactive priority; they run ahead of any backfill work
+    scheduler = get_scheduler()
+    pending = []
+    for i, config in enumerate(stale):
         if config['bank'] in bank_names:
-            # Here you would run the analysis for each bank
-            try:
-                # Assuming analyze_pdf is a method that processes the PDF for the bank
-                result = analyzer.analyze_pdf(
-                    pdf_path=config['pdf'],
-                    user_prompt_path=config['user_prompt'],
-                    system_prompt_path=config['system_prompt'],
-                    output_filename=config['output']
-                )
-                results.append(result)
-            except Exception as e:
-                return jsonify({"error": f"Failed to analyze {config['bank']}: {str(e)}"}), 500
+            future = scheduler.submit(
+                analyzer.analyze_pdf,
+                pdf_path=config['pdfs'],
+                user_prompt_path=config['user_prompt'],
+                system_prompt_path=config['system_prompt'],
+                output_filename=config['output'],
+                run_config=run_config,
+                priority=INTERACTIVE
+            )
+            pending.append((config, future))
+
+    results = []
+    for config, future in pending:
+        try:
+            results.append(future.result())
+        except BudgetExceeded as e:
+            return jsonify({"error": f"Failed to analyze {config['bank']}: {str(e)}"}), 429
+        except (CircuitOpen, DeadlineExceeded) as e:
+            # The remote service is down or too slow: fall back to the last-good results if there are any
+            if os.path.exists(consolidated_output_path):
+                return _serve_last_good(consolidated_output_path, latest_quarter, dashboard_mode,
+                                        requested_stale, run_config, error=f"{config['bank']}: {str(e)}")
+            return jsonify({"error": f"Failed to analyze {config['bank']}: {str(e)}"}), 503
+        except Exception as e:
+            return jsonify({"error": f"Failed to analyze {config['bank']}: {str(e)}"}), 500
 
     # Create consolidated results
     # latest_quarter = config.get("latest_quarter")  # This should be dynamically inserted into the config
-    consolidated_output_path = os.path.join(base_dir, "results", latest_quarter, "consolidated_results.json")
-    create_consolidated_results(batch_config, consolidated_output_path)
+    if consolidation_needed(batch_config, consolidated_output_path):
+        with stage("consolidation"):
+            create_consolidated_results(batch_config, consolidated_output_path)
 
     with open(consolidated_output_path, 'r') as f:
         consolidated_results = json.load(f)
     
-    if consolidated_results:
+    if consolidated_results and dashboard_mode == 'lazy':
         try:
-            # Create dashboard with different display options
-            print("🚀 Creating Banking Dashboard...")
-            
-            # Option 1: Save and open in browser (recommended)
-            dashboard = create_dashboard(consolidated_output_path, display_mode="save_and_open")
-            
-            # Additional options you can use:
-            print("\n🎯 Additional Display Options:")
-            print("dashboard.list_components()           # List all components")
-            print("dashboard.show_individual(0)         # Show first component only")
-            print("dashboard.show_all_separate()        # Show all in separate tabs")
-            print("dashboard.save_html('custom.html')   # Save with custom filename")
-
-            # Read HTML file content into a string
-            html_path = os.path.join(base_dir, "backend", "src", "banking_dashboard_complete.html")
-            with open(html_path, "r", encoding="utf-8") as file:
-                html_data = file.read()
-
-                return jsonify({"message": "Analysis completed successfully", "output_path": consolidated_output_path, "consolidated_results": consolidated_results, "report_html": html_data}), 200
-            
+            dashboard, _ = _get_dashboard(latest_quarter)
+            dashboard_url = f"/api/dashboard/{latest_quarter}"
+            return jsonify({"message": "Analysis completed successfully", "output_path": consolidated_output_path, "consolidated_results": consolidated_results, "dashboard_url": dashboard_url, "dashboard_components": dashboard.manifest(dashboard_url)}), 200
+        except Exception as e:
+            print(f"❌ An error occurred: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({"message": "Analysis completed successfully", "output_path": consolidated_output_path, "consolidated_results": consolidated_results}), 200
+    elif consolidated_results:
+        try:
+            # Rendered in memory from the per-quarter cache: concurrent requests never share a file
+            html_data = _get_dashboard_html(latest_quarter)
+            return jsonify({"message": "Analysis completed successfully", "output_path": consolidated_output_path, "consolidated_results": consolidated_results, "report_html": html_data}), 200
         except Exception as e:
             print(f"❌ An error occurred: {str(e)}")
             import traceback
@@ -91,5 +248,89 @@ def analyze():
         print(f"❌ Error: File '{consolidated_output_path}' not found.") 
         return jsonify({"error": "No results found"}), 404
 
+def _serve_last_good(consolidated_output_path, quarter, dashboard_mode, stale_configs, run_config, error=None):
+    """Respond with the quarter's last consolidated results, flagged with their age, and refresh stale banks."""
+    refreshing = REVALIDATOR.refresh(quarter, [c['bank'] for c in stale_configs], run_config.extra["run_id"])
+    generated_at = os.path.getmtime(consolidated_output_path)
+    with open(consolidated_output_path, 'r') as f:
+        consolidated_results = json.load(f)
+    record("stale_responses", refreshing=str(bool(refreshing)).lower())
+
+    body = {
+        "message": "Served last-good results",
+        "output_path": consolidated_output_path,
+        "consolidated_results": consolidated_results,
+        "freshness": {
+            "stale": bool(stale_configs) or error is not None,
+            "generated_at": datetime.fromtimestamp(generated_at).isoformat(timespec="seconds"),
+            "age_seconds": round(time.time() - generated_at),
+            "outdated_banks": [c['bank'] for c in stale_configs],
+            "refreshing": refreshing,
+            "circuits": breaker_states(),
+        },
+    }
+    if error is not None:
+        body["freshness"]["error"] = error
+    try:
+        dashboard, mtime = _get_dashboard(quarter)  # cached per results version, so this is cheap
+        if dashboard_mode == 'lazy':
+            dashboard_url = f"/api/dashboard/{quarter}"
+            body.update(dashboard_url=dashboard_url, dashboard_components=dashboard.manifest(dashboard_url))
+        else:
+            body["report_html"] = _get_dashboard_html(quarter)
+    except Exception as e:
+        print(f"❌ An error occurred: {str(e)}")
+    return jsonify(body), 200
+
+
+@app.route('/api/status', methods=['GET'])
+def status():
+    """Circuit breakers, background refreshes and the analysis queue."""
+    return jsonify({
+        "circuits": breaker_states(),
+        "refreshing": REVALIDATOR.status(),
+        "scheduler": get_scheduler().stats(),
+    }), 200
+
+
+@app.route('/api/backfill', methods=['POST'])
+def start_backfill():
+    """Analyze a quarter range in the background, using only spare analysis capacity."""
+    data = request.json or {}
+    start_quarter = data.get('start_quarter')
+    end_quarter = data.get('end_quarter') or start_quarter
+    if not start_quarter:
+        return jsonify({"error": "Missing start_quarter"}), 400
+    try:
+        tasks = expand_backfill(BASE_DIR, start_quarter, end_quarter, data.get('bank_names'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not tasks:
+        return jsonify({"error": "No documents found for the requested range"}), 404
+
+    backfill = Backfill(get_scheduler(), ANALYZER_SERVICE.get(), BASE_DIR, tasks,
+                        force=bool(data.get('force', False))).start()
+    _backfills.append(backfill)
+    return jsonify({"message": "Backfill started", "id": len(_backfills) - 1, "tasks": len(tasks)}), 202
+
+
+@app.route('/api/backfill', methods=['GET'])
+def backfill_status():
+    return jsonify({
+        "scheduler": get_scheduler().stats(),
+        "backfills": [dict(b.progress(), id=i) for i, b in enumerate(_backfills)]
+    }), 200
+
+
+@app.route('/api/backfill/<int:backfill_id>', methods=['DELETE'])
+def cancel_backfill(backfill_id):
+    """Drop a backfill's queued and budget-deferred tasks; running analyses still finish."""
+    if not 0 <= backfill_id < len(_backfills):
+        return jsonify({"error": "Unknown backfill"}), 404
+    _backfills[backfill_id].cancel()
+    return jsonify(dict(_backfills[backfill_id].progress(), id=backfill_id)), 202
+
+
 if __name__ == '__main__':
+    ANALYZER_SERVICE.warm()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,169 @@
+"""
+Record and replay the remote calls of the pipeline.
+
+With ``AZURE_FIXTURES_MODE=record`` every table extraction and chat completion is
+passed through to the real services and saved under ``AZURE_FIXTURES_DIR``; with
+``AZURE_FIXTURES_MODE=replay`` they are served from those files instead, so the API
+can be exercised (e.g. by ``load_test.py``) without Azure credentials or quota.
+
+Replayed calls sleep for the recorded duration (times ``AZURE_FIXTURES_LATENCY_SCALE``)
+so the server sees realistic overlap between requests. A call without a recording
+raises ``FixtureNotFound``.
+
+Fixture layout::
+
+    <dir>/layouts/<pdf sha256>.json   {"elapsed": s, "layout": ExtractedLayout.to_dict()}
+    <dir>/chat/<request hash>.json    {"elapsed": s, "content": ..., "finish_reason": ..., "usage": {...}}
+"""
+
+import os
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+from build_graph import file_sha256
+from instrumentation import stage, record
+from table_extraction import ExtractedLayout, TableExtractor
+from utils import atomic_write_json
+
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class FixtureNotFound(LookupError):
+    """A replayed call has no recording."""
+
+
+class FixtureStore:
+    """Directory of recorded layouts and chat completions."""
+
+    def __init__(self, fixture_dir: str, mode: str, latency_scale: float = 1.0):
+        """
+        Args:
+            fixture_dir: Directory holding the recordings
+            mode: RECORD or REPLAY
+            latency_scale: Factor applied to recorded durations when replaying (0 = no delay)
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown fixture mode: {mode}")
+        self.fixture_dir = fixture_dir
+        self.mode = mode
+        self.latency_scale = latency_scale
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.fixture_dir, kind, f"{key}.json")
+
+    def load(self, kind: str, key: str) -> Dict[str, Any]:
+        path = self._path(kind, key)
+        if not os.path.exists(path):
+            record("fixture_misses", kind=kind)
+            raise FixtureNotFound(f"No recorded {kind} fixture {key} in {self.fixture_dir}")
+        with open(path, "r") as f:
+            fixture = json.load(f)
+        if self.latency_scale > 0:
+            time.sleep(fixture.get("elapsed", 0) * self.latency_scale)
+        record("fixture_replays", kind=kind)
+        return fixture
+
+    def save(self, kind: str, key: str, fixture: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self._path(kind, key)), exist_ok=True)
+        atomic_write_json(self._path(kind, key), fixture)
+
+    def wrap_table_extractor(self, extractor: TableExtractor) -> TableExtractor:
+        return FixtureTableExtractor(self, extractor)
+
+    def wrap_chat_client(self, client: Optional[Any]) -> "FixtureChatClient":
+        """Chat client serving (or recording through ``client``) completions."""
+        return FixtureChatClient(self, client)
+
+
+class FixtureTableExtractor(TableExtractor):
+    """Records or replays another extractor's layouts, keyed by the PDF's content hash."""
+
+    name = "fixture"
+
+    def __init__(self, store: FixtureStore, inner: TableExtractor):
+        self.store = store
+        self.inner = inner
+        self.name = inner.name  # layouts are those of the wrapped backend
+
+    def extract(self, pdf_path: str) -> ExtractedLayout:
+        key = file_sha256(pdf_path)
+        if self.store.mode == REPLAY:
+            with stage("layout_replay"):
+                return ExtractedLayout.from_dict(self.store.load("layouts", key)["layout"])
+        started = time.perf_counter()
+        layout = self.inner.extract(pdf_path)
+        self.store.save("layouts", key, {"elapsed": time.perf_counter() - started, "layout": layout.to_dict()})
+        return layout
+
+
+def chat_request_key(request: Dict[str, Any]) -> str:
+    """Hash of what determines a completion's content (not limits such as max_tokens)."""
+    relevant = {k: request.get(k) for k in ("model", "messages", "response_format")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Completions:
+    def __init__(self, client: "FixtureChatClient"):
+        self._client = client
+
+    def create(self, **request: Any) -> Any:
+        return self._client.create(**request)
+
+
+class FixtureChatClient:
+    """Stand-in for ``AzureOpenAI`` exposing ``chat.completions.create``."""
+
+    def __init__(self, store: FixtureStore, inner: Optional[Any]):
+        self.store = store
+        self.inner = inner
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def with_options(self, **options: Any) -> "FixtureChatClient":
+        """Same as ``AzureOpenAI.with_options`` (timeout, max_retries) for the recorded client."""
+        inner = self.inner.with_options(**options) if self.inner is not None else None
+        return FixtureChatClient(self.store, inner)
+
+    def create(self, **request: Any) -> Any:
+        key = chat_request_key(request)
+        if self.store.mode == REPLAY:
+            fixture = self.store.load("chat", key)
+            usage = fixture.get("usage")
+            return SimpleNamespace(
+                model=fixture.get("model"),
+                usage=SimpleNamespace(**usage) if usage else None,
+                choices=[SimpleNamespace(
+                    message=SimpleNamespace(content=fixture["content"]),
+                    finish_reason=fixture.get("finish_reason", "stop"),
+                )],
+            )
+        started = time.perf_counter()
+        response = self.inner.chat.completions.create(**request)
+        usage = response.usage
+        self.store.save("chat", key, {
+            "elapsed": time.perf_counter() - started,
+            "model": getattr(response, "model", None),
+            "content": response.choices[0].message.content,
+            "finish_reason": response.choices[0].finish_reason,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+            } if usage is not None else None,
+        })
+        return response
+
+
+def fixture_store_from_env() -> Optional[FixtureStore]:
+    """The store configured by ``AZURE_FIXTURES_MODE``/``AZURE_FIXTURES_DIR``, if any."""
+    mode = os.getenv("AZURE_FIXTURES_MODE", "").lower()
+    if not mode:
+        return None
+    fixture_dir = os.getenv("AZURE_FIXTURES_DIR")
+    if not fixture_dir:
+        raise ValueError("AZURE_FIXTURES_DIR must be set when AZURE_FIXTURES_MODE is used")
+    return FixtureStore(fixture_dir, mode, float(os.getenv("AZURE_FIXTURES_LATENCY_SCALE", "1.0")))
@@ -0,0 +1,239 @@
+"""
+History backfill: analyze every (quarter, bank) in a quarter range.
+
+``expand_backfill`` turns a quarter range and bank set into (quarter, bank) tasks from
+the quarter folders under ``documents/``. A ``Backfill`` submits them to the
+``AnalysisScheduler`` at ``BACKFILL`` priority (one fairness group per bank), so it
+only uses spare capacity, and consolidates each quarter once its last bank finishes.
+A task stopped by the exhausted daily usage budget is put back and resubmitted once the
+budget resets; the wait happens outside the scheduler, so no slot is held meanwhile.
+"""
+
+import os
+import re
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from build_graph import plan_builds, consolidation_needed
+from document_catalog import get_document_catalog
+from instrumentation import stage
+from model_router import routing_fingerprint
+from run_config import RunConfig
+from scheduler import AnalysisScheduler, BACKFILL
+from usage_ledger import BudgetExceeded
+from utils import create_batch_config, create_consolidated_results, consolidated_results_path, register_documents
+
+
+_QUARTER_RE = re.compile(r"^Q([1-4])(\d{4})$")
+
+
+def quarter_sort_key(quarter: str) -> Tuple[int, int]:
+    """(year, quarter number) of a quarter folder name such as "Q12025"."""
+    match = _QUARTER_RE.match(quarter)
+    if not match:
+        raise ValueError(f"Invalid quarter '{quarter}', expected e.g. Q12025")
+    return int(match.group(2)), int(match.group(1))
+
+
+def expand_backfill(base_dir: str, start_quarter: str, end_quarter: str,
+                    banks: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """
+    (quarter, bank) tasks for every bank folder of every quarter in the range.
+
+    Args:
+        base_dir: Project root
+        start_quarter: First quarter (inclusive), e.g. "Q12023"
+        end_quarter: Last quarter (inclusive)
+        banks: Only these banks (default: every bank folder that has a user prompt)
+
+    Returns:
+        Tasks ordered newest quarter first
+    """
+    low, high = quarter_sort_key(start_quarter), quarter_sort_key(end_quarter)
+    documents_root = os.path.join(base_dir, "documents")
+    quarters = [
+        q for q in os.listdir(documents_root)
+        if _QUARTER_RE.match(q) and low <= quarter_sort_key(q) <= high
+    ]
+    catalog = get_document_catalog(base_dir)
+    tasks = []
+    for quarter in sorted(quarters, key=quarter_sort_key, reverse=True):
+        catalog.refresh(quarter)
+        for bank in catalog.banks_for(quarter):
+            if banks and bank not in banks:
+                continue
+            if not os.path.exists(os.path.join(base_dir, "prompts", bank, "user_prompt.txt")):
+                continue
+            tasks.append((quarter, bank))
+    catalog.save()
+    return tasks
+
+
+def analyze_bank(analyzer, base_dir: str, quarter: str, bank: str, force: bool = False,
+                 run_id: Optional[str] = None) -> str:
+    """
+    Analyze one bank's supplement for a quarter unless its result is up to date.
+
+    Callers running this in a scheduler slot wait for an exhausted daily budget *before*
+    submitting it (see ``Backfill``), never inside the slot.
+
+    Returns:
+        "analyzed", "up_to_date" or "no_documents"
+
+    Raises:
+        BudgetExceeded: If a usage budget is used up
+    """
+    run_config = RunConfig(quarter, [bank], run_id=run_id)
+    batch_config = create_batch_config([bank], quarter, base_dir)
+    if not batch_config:
+        return "no_documents"
+    stale, _ = plan_builds(batch_config, quarter, routing_fingerprint(), force=force)
+    register_documents(stale, quarter, base_dir)
+    for config in stale:
+        analyzer.analyze_pdf(
+            pdf_path=config["pdfs"],
+            user_prompt_path=config["user_prompt"],
+            system_prompt_path=config["system_prompt"],
+            output_filename=config["output"],
+            run_config=run_config
+        )
+    return "analyzed" if stale else "up_to_date"
+
+
+def consolidate_quarter(base_dir: str, quarter: str) -> Optional[str]:
+    """
+    Re-consolidate every bank of a quarter that has results.
+
+    Returns:
+        Path of the consolidated results if they were rewritten, else None
+    """
+    banks = get_document_catalog(base_dir).banks_for(quarter)
+    quarter_config = [c for c in create_batch_config(banks, quarter, base_dir) if os.path.exists(c["output"])]
+    consolidated_output_path = consolidated_results_path(base_dir, RunConfig(quarter, banks))
+    if not quarter_config or not consolidation_needed(quarter_config, consolidated_output_path):
+        return None
+    with stage("consolidation"):
+        create_consolidated_results(quarter_config, consolidated_output_path)
+    return consolidated_output_path
+
+
+class Backfill:
+    """A set of (quarter, bank) tasks running at backfill priority."""
+
+    def __init__(self, scheduler: AnalysisScheduler, analyzer, base_dir: str,
+                 tasks: List[Tuple[str, str]], force: bool = False):
+        self.scheduler = scheduler
+        self.analyzer = analyzer
+        self.base_dir = base_dir
+        self.tasks = tasks
+        self.force = force
+        self.run_id = f"backfill-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+        self.results: Dict[Tuple[str, str], str] = {}
+        self._pending_by_quarter: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()  # set once every task (and its consolidation) is done
+        self._futures = []
+        self._deferred: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue()  # tasks waiting for the daily budget
+        self._resubmitter: Optional[threading.Thread] = None
+        self._cancelled = threading.Event()
+
+    def start(self) -> "Backfill":
+        for quarter, _ in self.tasks:
+            self._pending_by_quarter[quarter] = self._pending_by_quarter.get(quarter, 0) + 1
+        for quarter, bank in self.tasks:
+            self._submit(quarter, bank)
+        if not self.tasks:
+            self._finished.set()
+        return self
+
+    def _submit(self, quarter: str, bank: str) -> None:
+        future = self.scheduler.submit(
+            analyze_bank, self.analyzer, self.base_dir, quarter, bank, self.force, self.run_id,
+            priority=BACKFILL, fair_key=bank
+        )
+        future.add_done_callback(lambda f, q=quarter, b=bank: self._task_done(q, b, f))
+        with self._lock:
+            self._futures.append(future)
+
+    def _defer(self, quarter: str, bank: str) -> None:
+        """Resubmit a task once the daily budget has reset."""
+        self._deferred.put((quarter, bank))
+        with self._lock:
+            if self._resubmitter is None:
+                self._resubmitter = threading.Thread(target=self._resubmit_deferred, daemon=True,
+                                                     name=f"{self.run_id}-resubmit")
+                self._resubmitter.start()
+
+    def _resubmit_deferred(self) -> None:
+        while True:
+            task = self._deferred.get()
+            if task is None:  # every task is done
+                return
+            quarter, bank = task
+            try:
+                # Blocks this thread only; the scheduler's slots stay free for other work
+                ready = self.analyzer.ledger.wait_for_budget(self.run_id, stop=self._cancelled)
+            except BudgetExceeded as e:  # the backfill's own budget: waiting would not help
+                self._finish_task(quarter, bank, f"failed: {e}")
+                continue
+            if not ready:
+                self._finish_task(quarter, bank, "cancelled")
+                continue
+            self._submit(quarter, bank)
+
+    def _task_done(self, quarter: str, bank: str, future) -> None:
+        error = None if future.cancelled() else future.exception()
+        if (isinstance(error, BudgetExceeded) and error.scope == "daily" and self.analyzer.ledger is not None
+                and not self._cancelled.is_set()):
+            print(f"⏸️  Backfill {bank} {quarter}: {error}; resuming when the budget resets")
+            self._defer(quarter, bank)
+            return
+        if future.cancelled():
+            status = "cancelled"
+        elif error is not None:
+            status = f"failed: {error}"
+        else:
+            status = future.result()
+        self._finish_task(quarter, bank, status)
+
+    def _finish_task(self, quarter: str, bank: str, status: str) -> None:
+        with self._lock:
+            self.results[(quarter, bank)] = status
+            self._pending_by_quarter[quarter] -= 1
+            quarter_done = self._pending_by_quarter[quarter] == 0
+            all_done = len(self.results) == len(self.tasks)
+            if all_done and self._resubmitter is not None:
+                self._deferred.put(None)  # nothing can be deferred any more: end the resubmitter
+        print(f"{'✅' if status in ('analyzed', 'up_to_date') else '❌'} Backfill {bank} {quarter}: {status}")
+        if quarter_done:
+            try:
+                consolidate_quarter(self.base_dir, quarter)
+            except Exception as e:
+                print(f"❌ Consolidating {quarter} failed: {e}")
+        if all_done:
+            self._finished.set()
+
+    def wait(self) -> Dict[Tuple[str, str], str]:
+        """Block until every task is done; returns the status per (quarter, bank)."""
+        self._finished.wait()
+        resubmitter = self._resubmitter
+        if resubmitter is not None and resubmitter is not threading.current_thread():
+            resubmitter.join()
+        return dict(self.results)
+
+    def cancel(self) -> None:
+        """Drop queued and budget-deferred tasks; analyses already running still finish."""
+        self._cancelled.set()
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()  # recorded as "cancelled" by _task_done
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            done = dict(self.results)
+        failed = sum(1 for status in done.values() if status.startswith("failed"))
+        return {"total": len(self.tasks), "done": len(done), "failed": failed,
+                "pending": len(self.tasks) - len(done)}
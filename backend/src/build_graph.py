@@ -0,0 +1,139 @@
+"""
+Make-style dependency tracking for the results pipeline.
+
+Every bank result ``results/<quarter>/<Bank>/<Bank>.json`` is built from the bank's PDFs, the
+bank's user prompt, the shared system prompt, the quarter and the model routing
+configuration (deployment tiers and escalation thresholds, see ``model_router``).
+``analyze_pdf`` records content hashes of those inputs, plus the deployment the router
+actually chose, in the run manifest written next to the result (``<Bank>.manifest.json``).
+A batch then only rebuilds results whose recorded inputs differ from the current ones
+(or whose deployment is no longer one of the tiers), and re-consolidates only when a
+bank result changed.
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, List, Any, Optional, Sequence, Tuple, Union
+
+from instrumentation import manifest_path_for
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime) -> sha256, so unchanged files are hashed once per process
+_hash_cache: Dict[Tuple[str, int, float], str] = {}
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file (memoized on path, size and mtime)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def input_fingerprint(pdf_paths: Union[str, Sequence[str]], user_prompt_path: str, system_prompt_path: str,
+                      quarter: Optional[str], routing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fingerprint of everything a bank result depends on before it is built.
+
+    Returns:
+        Dict with sha256 hashes of the input files (a list under "pdf" when a bank has
+        several documents) plus quarter and routing configuration (``analyze_pdf`` adds
+        the chosen "deployment" once it is known)
+    """
+    pdf_hashes = [file_sha256(path) for path in ([pdf_paths] if isinstance(pdf_paths, str) else pdf_paths)]
+    return {
+        "pdf": pdf_hashes[0] if len(pdf_hashes) == 1 else pdf_hashes,
+        "user_prompt": file_sha256(user_prompt_path),
+        "system_prompt": file_sha256(system_prompt_path),
+        "quarter": quarter,
+        "routing": routing,
+    }
+
+
+def recorded_inputs(output_path: str) -> Optional[Dict[str, Any]]:
+    """Inputs recorded by the last successful build of ``output_path`` (None if unknown)."""
+    manifest_path = manifest_path_for(output_path)
+    if not os.path.exists(output_path) or not manifest_path.exists():
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get("status") != "success":
+        return None
+    return manifest.get("inputs")
+
+
+def rebuild_reason(config: Dict, quarter: str, routing: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Why a batch entry must be rebuilt, or None when its result is up to date."""
+    if not os.path.exists(config["output"]):
+        return "no previous result"
+    previous = recorded_inputs(config["output"])
+    if previous is None:
+        return "no successful build recorded"
+    current = input_fingerprint(config["pdfs"], config["user_prompt"], config["system_prompt"],
+                                quarter, routing)
+    changed = [name for name, value in current.items() if previous.get(name) != value]
+    deployment = previous.get("deployment")
+    if routing and deployment is not None and deployment not in routing["deployments"]:
+        changed.append("deployment")
+    if changed:
+        return "changed: " + ", ".join(changed)
+    return None
+
+
+def plan_builds(batch_config: List[Dict], quarter: str, routing: Optional[Dict[str, Any]],
+                force: bool = False) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Split a batch into entries that must be rebuilt and entries that are up to date.
+
+    Args:
+        batch_config: Entries from create_batch_config_from_config
+        quarter: Latest quarter of the run
+        routing: Routing configuration the results are produced with (``routing_fingerprint()``)
+        force: Rebuild everything
+
+    Returns:
+        (stale, up_to_date); stale entries carry a "rebuild_reason"
+    """
+    stale, up_to_date = [], []
+    for config in batch_config:
+        reason = "forced" if force else rebuild_reason(config, quarter, routing)
+        if reason:
+            stale.append({**config, "rebuild_reason": reason})
+        else:
+            up_to_date.append(config)
+    return stale, up_to_date
+
+
+def consolidation_needed(batch_config: List[Dict], consolidated_output_path: str) -> bool:
+    """True when the consolidated file is missing, older than a bank result, or covers other banks."""
+    if not os.path.exists(consolidated_output_path):
+        return True
+    consolidated_mtime = os.path.getmtime(consolidated_output_path)
+    outputs = [c["output"] for c in batch_config if os.path.exists(c["output"])]
+    if any(os.path.getmtime(output) > consolidated_mtime for output in outputs):
+        return True
+    try:
+        with open(consolidated_output_path, "r") as f:
+            consolidated_banks = set(json.load(f).get("banks", {}))
+    except (OSError, json.JSONDecodeError):
+        return True
+    return consolidated_banks != {c["bank"] for c in batch_config if os.path.exists(c["output"])}
+
+
+def print_build_plan(stale: List[Dict], up_to_date: List[Dict]) -> None:
+    """Show which banks would be rebuilt and why."""
+    for config in stale:
+        print(f"🔨 {config['bank']}: rebuild ({config['rebuild_reason']})")
+    for config in up_to_date:
+        print(f"✔️  {config['bank']}: up to date")
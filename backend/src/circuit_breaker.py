@@ -0,0 +1,162 @@
+"""
+Circuit breakers for the remote services.
+
+After ``CIRCUIT_FAILURE_THRESHOLD`` consecutive service failures (5xx, 429, timeouts,
+connection errors) a breaker opens and calls fail immediately with ``CircuitOpen``
+instead of adding load to a struggling service. After ``CIRCUIT_RESET_SECONDS`` one
+trial call is let through (half-open); its success closes the breaker again, its
+failure re-opens it. Other errors (client 4xx, local I/O, parsing, bugs) say nothing
+about the service's health: they are re-raised without being counted.
+
+Breakers are process-wide, one per service (``get_breaker("openai")``).
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict
+
+from instrumentation import record
+
+
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "60"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """The service's breaker is open; no call was made."""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"{name} is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+
+
+# Transport errors of the SDKs (matched by name, the SDKs are optional imports)
+_TRANSPORT_ERRORS = {
+    "APIConnectionError", "APITimeoutError",            # openai
+    "ServiceRequestError", "ServiceResponseError",      # azure-core
+    "ConnectionError", "Timeout",                       # requests
+}
+
+
+def is_service_failure(error: BaseException) -> bool:
+    """
+    Whether an exception indicates the remote service (not the request or local code) is unhealthy.
+
+    Only timeouts, connection errors, HTTP 5xx and 429 count; everything else (client
+    errors, local I/O, parsing, missing replay fixtures, bugs) says nothing about the service.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _TRANSPORT_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a half-open trial call."""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_seconds: float = RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_seconds or self._trial_running:
+                record("circuit_rejections", service=self.name)
+                raise CircuitOpen(self.name, max(0.0, self.reset_seconds - waited))
+            self._state = HALF_OPEN
+            self._trial_running = True
+
+    def _on_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                record("circuit_transitions", service=self.name, to=CLOSED)
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def _on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    record("circuit_transitions", service=self.name, to=OPEN)
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _release_trial(self) -> None:
+        with self._lock:
+            self._trial_running = False
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` unless the breaker is open, counting service failures and successes."""
+        self._before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            if is_service_failure(e):
+                self._on_failure()
+            else:
+                self._release_trial()  # not about the service's health: neither counted nor a success
+            raise
+        except BaseException:
+            self._release_trial()
+            raise
+        self._on_success()
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = self._failures
+        return {"state": self.state, "consecutive_failures": failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker of a remote service."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.to_dict() for breaker in breakers}
+
+
+def any_open() -> bool:
+    """Whether any remote service is currently refusing calls."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return any(breaker.state == OPEN for breaker in breakers)
@@ -0,0 +1,83 @@
+"""
+Shared pytest fixtures.
+
+Remote services are never called: analyzers run against recorded fixtures
+(``AZURE_FIXTURES_MODE=replay``) or get a fake chat client assigned.
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import circuit_breaker
+
+
+# test_api.py is a manual script against a running server, not a test module
+collect_ignore = ["test_api.py"]
+
+
+def chat_response(content, finish_reason="stop", prompt_tokens=100, completion_tokens=50):
+    """Object shaped like an ``AzureOpenAI`` chat completion."""
+    return SimpleNamespace(
+        model="fake",
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+    )
+
+
+class FakeChatClient:
+    """
+    Stand-in for ``AzureOpenAI``: each ``chat.completions.create`` call takes the next
+    step, a response or an exception (the last step repeats), after ``delay`` seconds.
+    """
+
+    def __init__(self, *steps, delay=0.0):
+        self.steps = list(steps)
+        self.delay = delay
+        self.requests = []
+        self.options = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def with_options(self, **options):
+        self.options.append(options)
+        return self
+
+    def create(self, **request):
+        import time
+
+        self.requests.append(request)
+        if self.delay:
+            time.sleep(self.delay)
+        step = self.steps[min(len(self.requests), len(self.steps)) - 1]
+        if isinstance(step, BaseException):
+            raise step
+        return step
+
+
+@pytest.fixture(autouse=True)
+def reset_breakers(monkeypatch):
+    """Circuit breakers are process-wide; every test starts with none."""
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    return tmp_path / "fixtures"
+
+
+@pytest.fixture
+def analyzer(tmp_path, fixture_dir, monkeypatch):
+    """PDFAnalyzer replaying recorded Azure calls from ``fixture_dir`` without delays."""
+    from pdf_analyzer import PDFAnalyzer
+
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT_NAME", "strong")
+    monkeypatch.delenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME", raising=False)
+    monkeypatch.setenv("AZURE_FIXTURES_MODE", "replay")
+    monkeypatch.setenv("AZURE_FIXTURES_DIR", str(fixture_dir))
+    monkeypatch.setenv("AZURE_FIXTURES_LATENCY_SCALE", "0")
+    monkeypatch.setenv("TABLE_EXTRACTION_BACKEND", "remote")
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"requested_bank_names": ["Synchrony"], "latest_quarter": "Q12025"}))
+    return PDFAnalyzer(config_path=str(config_path))
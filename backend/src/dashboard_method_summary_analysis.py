@@ -1,13 +1,18 @@
 import json
+import base64
+import struct
 import pandas as pd
+import plotly
 import plotly.graph_objects as go
-import plotly.express as px
+import plotly.colors
+import plotly.offline
 from plotly.subplots import make_subplots
 import numpy as np
 import os
 import webbrowser
 from datetime import datetime
 import warnings
+from profiling import profiled
 warnings.filterwarnings('ignore')
 
 # Enhanced Bank color mapping with distinct colors for each bank
@@ -28,7 +33,73 @@ BANK_COLORS = {
 }
 
 # Plotly color sequence for fallback
-PLOTLY_COLORS = px.colors.qualitative.Set1 + px.colors.qualitative.Set2
+PLOTLY_COLORS = plotly.colors.qualitative.Set1 + plotly.colors.qualitative.Set2
+
+# Pinned front-end bundles. Plotly.js is the build shipped inside the plotly package,
+# so the served bundle always matches the figure JSON produced here; html2pdf is
+# vendored in static/vendor. Neither is ever loaded from a CDN.
+PLOTLY_JS_VERSION = plotly.offline.get_plotlyjs_version()
+PLOTLY_JS_FILENAME = f"plotly-{PLOTLY_JS_VERSION}.min.js"
+HTML2PDF_VERSION = "0.10.1"
+HTML2PDF_FILENAME = f"html2pdf-{HTML2PDF_VERSION}.bundle.min.js"
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "vendor")
+
+# Scaling thresholds for charts with many banks / long quarter histories
+WEBGL_TRACE_THRESHOLD = 15   # more line traces than this are rendered with WebGL
+PEER_BAND_THRESHOLD = 25     # more banks than this are summarized as percentile bands
+BAND_HIGHLIGHT_N = 5         # banks still drawn as lines on top of the bands
+MAX_POINTS_PER_SERIES = 20   # longer series are decimated to this many quarters
+SUMMARY_TABLE_TOP_N = 15     # rows shown in summary tables
+
+# Numeric arrays at least this long are sent as base64 typed arrays (plotly.js >= 2.28)
+COMPACT_ARRAY_MIN_LENGTH = 16
+TYPED_ARRAYS_SUPPORTED = tuple(int(p) for p in PLOTLY_JS_VERSION.split(".")[:2]) >= (2, 28)
+
+def dashboard_asset_source(filename):
+    """
+    JavaScript source of a pinned dashboard bundle.
+    
+    Raises:
+        KeyError: if ``filename`` is not one of the pinned bundles
+        FileNotFoundError: if the vendored html2pdf bundle has not been deployed
+    """
+    if filename == PLOTLY_JS_FILENAME:
+        return plotly.offline.get_plotlyjs()
+    if filename == HTML2PDF_FILENAME:
+        with open(os.path.join(VENDOR_DIR, HTML2PDF_FILENAME), "r", encoding="utf-8") as f:
+            return f.read()
+    raise KeyError(filename)
+
+def _compact_arrays(value):
+    """Recursively replace long numeric lists with plotly.js typed-array specs"""
+    if hasattr(value, "tolist") and not isinstance(value, (str, bytes)):
+        value = value.tolist()
+    if isinstance(value, dict):
+        return {k: _compact_arrays(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        is_numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+        if TYPED_ARRAYS_SUPPORTED and is_numeric and len(value) >= COMPACT_ARRAY_MIN_LENGTH:
+            packed = struct.pack(f"<{len(value)}d", *value)
+            return {"dtype": "f8", "bdata": base64.b64encode(packed).decode("ascii")}
+        return [_compact_arrays(v) for v in value]
+    return value
+
+def slim_figure_dict(figure, shared_template=None):
+    """
+    Figure data + layout ready for compact JSON serialization
+    
+    The layout template is dropped when it equals ``shared_template`` (the page
+    supplies it once) and long numeric arrays are base64 encoded.
+    """
+    figure_dict = figure.to_plotly_json()
+    layout = dict(figure_dict.get("layout", {}))
+    if shared_template is not None and layout.get("template") == shared_template:
+        layout.pop("template")
+    return {"data": _compact_arrays(figure_dict.get("data", [])), "layout": layout}
+
+def to_compact_json(obj):
+    """Serialize with Plotly's encoder and no insignificant whitespace"""
+    return json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder, separators=(",", ":"))
 
 def load_and_process_data(json_file_path):
     """Load JSON data and convert to structured format"""
@@ -104,13 +175,27 @@ def create_ncl_coverage_table_data(banks_data, quarters):
     
     return pd.DataFrame(table_data)
 
-def create_combined_tables_figure(coverage_df, ncl_coverage_df):
-    """Create side-by-side tables in one figure"""
+def top_n_rows(df, n):
+    """Keep the n rows with the highest latest-quarter value (unchanged when already small)"""
+    if df.empty or not n or len(df) <= n:
+        return df
+    quarter_columns = [col for col in df.columns if col not in ('Bank', 'Δ Qtr (bps)')]
+    return df.sort_values(quarter_columns[-1], ascending=False, na_position='last').head(n)
+
+def create_combined_tables_figure(coverage_df, ncl_coverage_df, top_n=SUMMARY_TABLE_TOP_N):
+    """Create side-by-side tables in one figure (top_n banks per table by latest quarter)"""
+    
+    subplot_titles = []
+    for label, df in [("Coverage Rates", coverage_df), ("NCL Coverage", ncl_coverage_df)]:
+        shown = len(top_n_rows(df, top_n))
+        subplot_titles.append(f"{label} – Top {shown} of {len(df)}" if shown < len(df) else label)
+    coverage_df = top_n_rows(coverage_df, top_n)
+    ncl_coverage_df = top_n_rows(ncl_coverage_df, top_n)
     
     fig = make_subplots(
         rows=1, cols=2,
         specs=[[{"type": "table"}, {"type": "table"}]],
-        subplot_titles=["Coverage Rates", "NCL Coverage"],
+        subplot_titles=subplot_titles,
         horizontal_spacing=0.1
     )
     
@@ -304,8 +389,64 @@ def add_download_button(fig, button_text="Download", x_position=0.95, y_position
     
     return fig
 
-def create_line_chart_with_table(banks_data, metric_name, metric_category, quarters, title, ylabel):
-    """Create line chart with summary table using Plotly"""
+def _decimate_indices(n_points, max_points):
+    """Evenly spaced indices (always keeping the latest point) so at most max_points remain"""
+    if not max_points or n_points <= max_points:
+        return list(range(n_points))
+    step = (n_points - 1) / (max_points - 1)
+    return sorted({round(i * step) for i in range(max_points)})
+
+def _latest_value_sort_key(values, latest_idx):
+    """Sort key placing the highest latest-quarter values first and missing values last"""
+    latest_val = values[latest_idx] if latest_idx < len(values) else np.nan
+    return (pd.isna(latest_val), -latest_val if not pd.isna(latest_val) else 0)
+
+def add_peer_band_traces(fig, chart_data, quarters, indices, row=1, col=1):
+    """
+    Summarize many banks as percentile bands instead of one line per bank
+    
+    Adds a 10th-90th and a 25th-75th percentile band plus the peer median, so the
+    number of traces no longer grows with the number of banks.
+    """
+    matrix = np.array([[values[i] for i in indices] for values in chart_data.values()], dtype=float)
+    x_vals = [quarters[i] for i in indices]
+    percentiles = {p: np.nanpercentile(matrix, p, axis=0) for p in (10, 25, 50, 75, 90)}
+    
+    for low, high, fill_color in [(10, 90, 'rgba(52, 152, 219, 0.15)'), (25, 75, 'rgba(52, 152, 219, 0.30)')]:
+        fig.add_trace(
+            go.Scatter(x=x_vals, y=percentiles[high], mode='lines', line=dict(width=0),
+                       showlegend=False, hoverinfo='skip'),
+            row=row, col=col
+        )
+        fig.add_trace(
+            go.Scatter(x=x_vals, y=percentiles[low], mode='lines', line=dict(width=0),
+                       fill='tonexty', fillcolor=fill_color, name=f'Peers P{low}-P{high}',
+                       hovertemplate=f'P{low}: %{{y:.2f}}%<extra></extra>'),
+            row=row, col=col
+        )
+    
+    fig.add_trace(
+        go.Scatter(x=x_vals, y=percentiles[50], mode='lines', name='Peer median',
+                   line=dict(color='#7f8c8d', width=2, dash='dash'),
+                   hovertemplate='Peer median<br>Quarter: %{x}<br>Rate: %{y:.2f}%<extra></extra>'),
+        row=row, col=col
+    )
+    return fig
+
+def create_line_chart_with_table(banks_data, metric_name, metric_category, quarters, title, ylabel,
+                                 webgl_threshold=WEBGL_TRACE_THRESHOLD, band_threshold=PEER_BAND_THRESHOLD,
+                                 max_points=MAX_POINTS_PER_SERIES, table_top_n=SUMMARY_TABLE_TOP_N,
+                                 highlight_banks=None):
+    """
+    Create line chart with summary table using Plotly
+    
+    Scaling behaviour for large peer sets / long histories:
+    - more than webgl_threshold banks: lines are drawn with WebGL (Scattergl)
+    - more than band_threshold banks: peers are shown as percentile bands, with only
+      highlight_banks (default: top banks by latest value) drawn as lines
+    - series longer than max_points quarters are decimated
+    - the summary table shows the top table_top_n banks by latest value
+    """
     
     # Prepare chart data
     chart_data = {}
@@ -319,28 +460,43 @@ def create_line_chart_with_table(banks_data, metric_name, metric_category, quart
             if any(not pd.isna(v) for v in values):  # Only include if has some data
                 chart_data[bank_name] = values
     
+    latest_idx = len(quarters) - 1
+    ranked_banks = sorted(chart_data, key=lambda bank: _latest_value_sort_key(chart_data[bank], latest_idx))
+    table_banks = ranked_banks[:table_top_n] if table_top_n and len(ranked_banks) > table_top_n else list(chart_data)
+    table_title = "Last 2 Quarters Summary"
+    if len(table_banks) < len(chart_data):
+        table_title = f"Last 2 Quarters – Top {len(table_banks)} of {len(chart_data)}"
+    
     # Create subplot with chart and table
     fig = make_subplots(
         rows=1, cols=2,
         column_widths=[0.7, 0.3],
         specs=[[{"type": "scatter"}, {"type": "table"}]],
-        subplot_titles=[title, "Last 2 Quarters Summary"]
+        subplot_titles=[title, table_title]
     )
     
+    plot_indices = _decimate_indices(len(quarters), max_points)
+    line_banks = list(chart_data)
+    if band_threshold and len(chart_data) > band_threshold:
+        add_peer_band_traces(fig, chart_data, quarters, plot_indices)
+        line_banks = [b for b in (highlight_banks or ranked_banks[:BAND_HIGHLIGHT_N]) if b in chart_data]
+    scatter_type = go.Scattergl if len(line_banks) > webgl_threshold else go.Scatter
+    
     # Add line chart
     color_idx = 0
-    for bank_name, values in chart_data.items():
+    for bank_name in line_banks:
+        values = chart_data[bank_name]
         color = BANK_COLORS.get(bank_name, PLOTLY_COLORS[color_idx % len(PLOTLY_COLORS)])
         color_idx += 1
         
         # Only plot non-NaN values
-        valid_data = [(i, v) for i, v in enumerate(values) if not pd.isna(v)]
+        valid_data = [(i, values[i]) for i in plot_indices if not pd.isna(values[i])]
         if valid_data:
             x_vals, y_vals = zip(*valid_data)
             quarter_labels = [quarters[i] for i in x_vals]
             
             fig.add_trace(
-                go.Scatter(
+                scatter_type(
                     x=quarter_labels,
                     y=y_vals,
                     mode='lines+markers',
@@ -360,7 +516,8 @@ def create_line_chart_with_table(banks_data, metric_name, metric_category, quart
         table_headers = ['Bank', last_two_quarters[0], last_two_quarters[1], 'Change (bps)']
         table_values = [[], [], [], []]
         
-        for bank_name, values in chart_data.items():
+        for bank_name in table_banks:
+            values = chart_data[bank_name]
             table_values[0].append(bank_name)
             
             # Previous quarter value
@@ -433,11 +590,38 @@ class DashboardComponents:
     def __init__(self):
         self.components = []
         self.titles = []
+        self.keys = []
     
-    def add_component(self, figure, title):
+    def add_component(self, figure, title, key=None):
         """Add a component to the dashboard"""
         self.components.append(figure)
         self.titles.append(title)
+        self.keys.append(key or f"chart{len(self.keys)}")
+    
+    def get_index(self, component):
+        """Resolve a component key or numeric index to a list index (None if unknown)"""
+        if component in self.keys:
+            return self.keys.index(component)
+        if str(component).isdigit() and int(component) < len(self.components):
+            return int(component)
+        return None
+    
+    def shared_template(self):
+        """Layout template common to the components (taken from the first one)"""
+        if not self.components:
+            return None
+        return self.components[0].to_plotly_json().get("layout", {}).get("template")
+    
+    def component_json(self, component_index, shared_template=None):
+        """Serialize a single component as compact Plotly JSON (data + layout)"""
+        return to_compact_json(slim_figure_dict(self.components[component_index], shared_template))
+    
+    def manifest(self, url_prefix):
+        """List components with their lazy-load URLs"""
+        return [
+            {"index": i, "key": key, "title": title, "url": f"{url_prefix}/{key}"}
+            for i, (key, title) in enumerate(zip(self.keys, self.titles))
+        ]
     
     def show_individual(self, component_index):
         """Show a specific component by index"""
@@ -460,9 +644,13 @@ class DashboardComponents:
         for i, title in enumerate(self.titles):
             print(f"  {i}: {title}")
     
-    def save_html(self, filename="banking_dashboard_complete.html"):
+    def to_html(self, asset_base_url=None):
+        """Complete dashboard HTML (all components inline) as a string"""
+        return self._generate_html(asset_base_url)
+    
+    def save_html(self, filename="banking_dashboard_complete.html", asset_base_url=None):
         """Save all components to a single HTML file"""
-        html_content = self._generate_html()
+        html_content = self._generate_html(asset_base_url)
         
         with open(filename, "w", encoding="utf-8") as f:
             f.write(html_content)
@@ -471,23 +659,145 @@ class DashboardComponents:
         print(f"💾 Dashboard saved: {html_path}")
         return html_path
     
-    def save_and_open(self, filename="banking_dashboard_complete.html"):
+    def save_and_open(self, filename="banking_dashboard_complete.html", asset_base_url=None):
         """Save to HTML and open in browser"""
-        html_path = self.save_html(filename)
+        html_path = self.save_html(filename, asset_base_url)
         webbrowser.open(f"file://{html_path}")
         print(f"🌐 Opening in browser: {html_path}")
         return html_path
     
     
-    def _generate_html(self):
+    def _generate_html(self, asset_base_url=None):
         """Generate complete HTML with single top download button"""
-        html_content = """
+        shared_template = self.shared_template()
+        html_content = self._html_head(asset_base_url, shared_template)
+        
+        # Add each component to HTML
+        for i, (component, title) in enumerate(zip(self.components, self.titles)):
+            html_content += f"""
+            <div class="section">
+                <h2 class="component-title">{title}</h2>
+                <div class="chart-container" id="chart{i}"></div>
+            </div>
+            """
+            
+            # Add the Plotly JavaScript
+            component_json = self.component_json(i, shared_template)
+            html_content += f"""
+            <script>
+                renderFigure(document.getElementById('chart{i}'), {component_json});
+            </script>
+            """
+        
+        html_content += """
+            </div>
+            
+            <script>
+                function loadAllCharts() {
+                    return Promise.resolve();
+                }
+            </script>
+        """
+        html_content += self._html_footer()
+        
+        return html_content
+    
+    def generate_shell_html(self, url_prefix, asset_base_url=None):
+        """
+        Generate a lightweight dashboard shell whose charts are fetched lazily.
+        
+        Each section only carries a placeholder sized to the figure height; the
+        figure JSON is requested from ``{url_prefix}/{key}`` once the section
+        scrolls into view. Component JSON is expected without the shared
+        layout template, which is embedded once in the shell.
+        """
+        html_content = self._html_head(asset_base_url, self.shared_template())
+        
+        for i, (component, title, key) in enumerate(zip(self.components, self.titles, self.keys)):
+            height = component.layout.height or 450
+            html_content += f"""
+            <div class="section">
+                <h2 class="component-title">{title}</h2>
+                <div class="chart-container" id="chart{i}" data-src="{url_prefix}/{key}" style="min-height: {height}px;"></div>
+            </div>
+            """
+        
+        html_content += """
+            </div>
+            
+            <script>
+                var pendingCharts = {};
+                
+                // Fetch a component's figure JSON and render it once
+                function loadChart(el) {
+                    if (!pendingCharts[el.id]) {
+                        pendingCharts[el.id] = fetch(el.dataset.src)
+                            .then(function(response) { return response.json(); })
+                            .then(function(fig) { return renderFigure(el, fig); });
+                    }
+                    return pendingCharts[el.id];
+                }
+                
+                function loadAllCharts() {
+                    var charts = document.querySelectorAll('.chart-container[data-src]');
+                    return Promise.all(Array.prototype.map.call(charts, loadChart));
+                }
+                
+                if ('IntersectionObserver' in window) {
+                    var chartObserver = new IntersectionObserver(function(entries) {
+                        entries.forEach(function(entry) {
+                            if (entry.isIntersecting) {
+                                chartObserver.unobserve(entry.target);
+                                loadChart(entry.target);
+                            }
+                        });
+                    }, { rootMargin: '200px' });
+                    document.querySelectorAll('.chart-container[data-src]').forEach(function(el) {
+                        chartObserver.observe(el);
+                    });
+                } else {
+                    loadAllCharts();
+                }
+            </script>
+        """
+        html_content += self._html_footer()
+        
+        return html_content
+    
+    def _html_head(self, asset_base_url=None, shared_template=None):
+        """
+        HTML document head, styles and dashboard header
+        
+        With ``asset_base_url`` the pinned Plotly and html2pdf bundles are loaded from
+        that URL prefix (e.g. the app's ``/assets``); otherwise they are inlined, so a
+        standalone HTML file works offline.
+        """
+        scripts = []
+        for filename in (PLOTLY_JS_FILENAME, HTML2PDF_FILENAME):
+            if asset_base_url:
+                scripts.append(f'<script src="{asset_base_url}/{filename}"></script>')
+            else:
+                scripts.append(f'<script type="text/javascript">{dashboard_asset_source(filename)}</script>')
+        scripts = "\n            ".join(scripts)
+        
+        return f"""
         <!DOCTYPE html>
         <html>
         <head>
             <title>Banking Dashboard - Credit Risk Metrics</title>
-            <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/html2pdf.js/0.10.1/html2pdf.bundle.min.js"></script>
+            {scripts}
+            <script>
+                // Layout template shared by every figure; components are serialized without it
+                var dashboardTemplate = {to_compact_json(shared_template)};
+                
+                function renderFigure(el, fig) {{
+                    if (dashboardTemplate && !fig.layout.template) {{
+                        fig.layout.template = dashboardTemplate;
+                    }}
+                    return Plotly.newPlot(el, fig.data, fig.layout, {{responsive: true}});
+                }}
+            </script>
+        """ + """
             <style>
                 body { 
                     font-family: Arial, sans-serif; 
@@ -561,29 +871,10 @@ class DashboardComponents:
                     <button class="download-btn" onclick="downloadDashboardPDF()">📥 Download</button>
                 </div>
         """
-        
-        # Add each component to HTML
-        for i, (component, title) in enumerate(zip(self.components, self.titles)):
-            html_content += f"""
-            <div class="section">
-                <h2 class="component-title">{title}</h2>
-                <div class="chart-container" id="chart{i}"></div>
-            </div>
-            """
-            
-            # Add the Plotly JavaScript
-            component_json = component.to_json()
-            html_content += f"""
-            <script>
-                var plotlyDiv{i} = document.getElementById('chart{i}');
-                var plotData{i} = {component_json};
-                Plotly.newPlot(plotlyDiv{i}, plotData{i}.data, plotData{i}.layout, {{responsive: true}});
-            </script>
-            """
-        
-        html_content += """
-            </div>
-            
+    
+    def _html_footer(self):
+        """PDF download script and closing tags"""
+        return """
             <script>
                 // Download entire dashboard as PDF
                 function downloadDashboardPDF() {
@@ -608,7 +899,10 @@ class DashboardComponents:
                     btn.innerHTML = '⏳ Generating...';
                     btn.disabled = true;
                     
-                    html2pdf().set(opt).from(element).save().then(function() {
+                    // Charts that have not scrolled into view yet must be rendered first
+                    loadAllCharts().then(function() {
+                        return html2pdf().set(opt).from(element).save();
+                    }).then(function() {
                         // Reset button
                         btn.innerHTML = originalText;
                         btn.disabled = false;
@@ -624,10 +918,10 @@ class DashboardComponents:
         </body>
         </html>
         """
-        
-        return html_content
 
-def create_dashboard(json_file_path, display_mode="save_and_open"):
+@profiled("create_dashboard")
+def create_dashboard(json_file_path, display_mode="save_and_open", asset_base_url=None,
+                     html_filename="banking_dashboard_complete.html"):
     """
     Create the complete dashboard
     
@@ -636,6 +930,9 @@ def create_dashboard(json_file_path, display_mode="save_and_open"):
     - "save_only": Save HTML file only
     - "individual": Show each component separately
     - "none": Don't display, just return components
+    
+    asset_base_url: load the Plotly/html2pdf bundles from this URL prefix instead of inlining them
+    html_filename: where the "save_*" modes write the HTML
     """
     
     # Load data
@@ -667,7 +964,7 @@ def create_dashboard(json_file_path, display_mode="save_and_open"):
             annotation_width=1500,
             with_background=False
         )
-    dashboard.add_component(tables_fig, "📊 Coverage Rates & NCL Coverage")
+    dashboard.add_component(tables_fig, "📊 Coverage Rates & NCL Coverage", key="coverage_tables")
     
     # 2. NCL Rate Chart
     ncl_chart = create_line_chart_with_table(
@@ -694,7 +991,7 @@ def create_dashboard(json_file_path, display_mode="save_and_open"):
         border_color="#d0d0d0"
     )
     
-    dashboard.add_component(ncl_chart, "📈 Net Credit Loss (NCL) Rates")
+    dashboard.add_component(ncl_chart, "📈 Net Credit Loss (NCL) Rates", key="ncl_rate")
     
     # 3. 30+ Days Delinquency Chart
     dq30_chart = create_line_chart_with_table(
@@ -702,7 +999,7 @@ def create_dashboard(json_file_path, display_mode="save_and_open"):
         '30+ Days Delinquency rates trend',
         '30+ DQ Rate (%)'
     )
-    dashboard.add_component(dq30_chart, "📊 30+ Days Delinquency Rates")
+    dashboard.add_component(dq30_chart, "📊 30+ Days Delinquency Rates", key="dq30_rate")
     
     # 4. 90+ Days Delinquency Chart
     dq90_chart = create_line_chart_with_table(
@@ -710,13 +1007,13 @@ def create_dashboard(json_file_path, display_mode="save_and_open"):
         '90+ Days Delinquency rates trend',
         '90+ DQ Rate (%)'
     )
-    dashboard.add_component(dq90_chart, "📉 90+ Days Delinquency Rates")
+    dashboard.add_component(dq90_chart, "📉 90+ Days Delinquency Rates", key="dq90_rate")
     
     # Display based on mode
     if display_mode == "save_and_open":
-        dashboard.save_and_open()
+        dashboard.save_and_open(html_filename, asset_base_url=asset_base_url)
     elif display_mode == "save_only":
-        dashboard.save_html()
+        dashboard.save_html(html_filename, asset_base_url=asset_base_url)
     elif display_mode == "individual":
         dashboard.show_all_separate()
     elif display_mode == "list":
@@ -0,0 +1,312 @@
+"""
+Content-addressed catalog of source documents.
+
+Every PDF under ``documents/<quarter>/<bank>/`` is fingerprinted once (sha256, page count
+and document type, redone only when its size or mtime changes) and the catalog is
+persisted in ``cache/document_catalog.json``. Byte-identical files in different quarter or bank
+folders therefore resolve to the same hash, and the tables extracted from that hash
+are stored once in the ``LayoutArtifactStore`` and shared by every config referencing it.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from build_graph import file_sha256
+from table_extraction import ExtractedLayout
+from utils import atomic_write_json
+
+
+logger = logging.getLogger(__name__)
+
+
+# Detected document types, in order of preference when a bank folder holds several PDFs.
+# "_extracted" files are page subsets of a full supplement (smaller and cheaper to analyze).
+DOCUMENT_TYPES = ("supplement_extract", "supplement", "other")
+RELEVANT_DOCUMENT_TYPES = ("supplement_extract", "supplement")
+
+
+def detect_document_type(filename: str) -> str:
+    """Classify a PDF by its file name."""
+    name = filename.lower()
+    if "supplement" not in name:
+        return "other"
+    if "_extracted" in name:
+        return "supplement_extract"
+    return "supplement"
+
+
+def select_documents(pdf_paths: List[str]) -> List[str]:
+    """
+    Documents of a bank to analyze together: every relevant one, except full supplements
+    whose ``_extracted`` page subset is also present (the subset holds the same tables).
+    """
+    stems = {os.path.splitext(os.path.basename(path))[0].lower() for path in pdf_paths}
+    return [
+        path for path in pdf_paths
+        if os.path.splitext(os.path.basename(path))[0].lower() + "_extracted" not in stems
+    ]
+
+
+def count_pdf_pages(pdf_path: str) -> Optional[int]:
+    """Page count of a PDF (pypdf when installed, otherwise a scan of the page objects)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+    try:
+        if PdfReader is not None:
+            return len(PdfReader(pdf_path).pages)
+        with open(pdf_path, "rb") as f:
+            data = f.read()
+    except Exception as e:
+        logger.warning(f"Could not count pages of {pdf_path}: {e}")
+        return None
+    leaf_pages = len(re.findall(rb"/Type\s*/Page(?![a-zA-Z])", data))
+    if leaf_pages:
+        return leaf_pages
+    # Page objects hidden in compressed object streams: fall back to the page tree count
+    counts = [int(c) for c in re.findall(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)", data)]
+    return max(counts) if counts else None
+
+
+class DocumentCatalog:
+    """
+    Persistent index of ``documents/<quarter>/<bank>/*.pdf``.
+
+    Entries hold size, mtime, sha256, page count and detected document type. Folders are
+    re-listed only when their mtime changes and files are re-hashed only when their size
+    or mtime changes; lookups by (quarter, bank) go through an in-memory index.
+    """
+
+    def __init__(self, catalog_path: str, documents_root: str):
+        """
+        Args:
+            catalog_path: JSON file the catalog is persisted to
+            documents_root: The ``documents/`` directory paths are stored relative to
+        """
+        self.catalog_path = catalog_path
+        self.documents_root = documents_root
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.folders: Dict[str, float] = {}  # "<quarter>/<bank>" -> folder mtime at last listing
+        self._index: Dict[Tuple[str, str], List[str]] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        if os.path.exists(catalog_path):
+            try:
+                with open(catalog_path, "r") as f:
+                    stored = json.load(f)
+                self.documents = stored.get("documents", {})
+                self.folders = stored.get("folders", {})
+            except (OSError, ValueError):
+                logger.warning(f"Unreadable document catalog, rebuilding: {catalog_path}")
+        self._rebuild_index()
+
+    def _relpath(self, pdf_path: str) -> str:
+        return os.path.relpath(os.path.abspath(pdf_path), os.path.abspath(self.documents_root)).replace(os.sep, "/")
+
+    def _rebuild_index(self) -> None:
+        self._index = {}
+        for rel in sorted(self.documents):
+            parts = rel.split("/")
+            if len(parts) == 3:
+                self._index.setdefault((parts[0], parts[1]), []).append(rel)
+
+    def fingerprint(self, pdf_path: str) -> Dict[str, Any]:
+        """Catalog entry for a PDF, (re-)analyzing it only if it is new or changed on disk."""
+        with self._lock:
+            rel = self._relpath(pdf_path)
+            stat = os.stat(pdf_path)
+            entry = self.documents.get(rel)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                entry = {
+                    "sha256": file_sha256(pdf_path),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "page_count": count_pdf_pages(pdf_path),
+                    "document_type": detect_document_type(os.path.basename(pdf_path)),
+                    "cataloged_at": datetime.now().isoformat(timespec="seconds"),
+                }
+                is_new = rel not in self.documents
+                self.documents[rel] = entry
+                self._dirty = True
+                if is_new:
+                    self._rebuild_index()
+            return entry
+
+    def refresh(self, quarter: Optional[str] = None) -> None:
+        """
+        Bring the catalog up to date with the documents folder.
+
+        Args:
+            quarter: Only refresh this quarter's folders (default: all quarters)
+        """
+        with self._lock:
+            quarters = [quarter] if quarter else sorted(os.listdir(self.documents_root))
+            for q in quarters:
+                quarter_dir = os.path.join(self.documents_root, q)
+                banks = set(os.listdir(quarter_dir)) if os.path.isdir(quarter_dir) else set()
+                # Include previously seen folders so removed ones are dropped from the catalog
+                banks |= {folder.split("/", 1)[1] for folder in self.folders if folder.startswith(q + "/")}
+                for bank in sorted(banks):
+                    self._refresh_folder(q, bank)
+            self._rebuild_index()
+
+    def _refresh_folder(self, quarter: str, bank: str) -> None:
+        """Re-list one bank folder (caller holds ``self._lock``)."""
+        folder = f"{quarter}/{bank}"
+        bank_dir = os.path.join(self.documents_root, quarter, bank)
+        if not os.path.isdir(bank_dir):
+            if folder in self.folders:
+                self._forget(lambda rel: rel.startswith(folder + "/"))
+                del self.folders[folder]
+            return
+        folder_mtime = os.path.getmtime(bank_dir)
+        if self.folders.get(folder) == folder_mtime:
+            # No files added or removed; only re-check the known ones
+            for rel in self._index.get((quarter, bank), []):
+                self.fingerprint(os.path.join(self.documents_root, rel))
+            return
+        present = set()
+        for entry in os.scandir(bank_dir):
+            if entry.is_file() and entry.name.lower().endswith(".pdf"):
+                present.add(f"{folder}/{entry.name}")
+                self.fingerprint(entry.path)
+        self._forget(lambda rel: rel.startswith(folder + "/") and rel not in present)
+        self.folders[folder] = folder_mtime
+        self._dirty = True
+
+    def _forget(self, predicate) -> None:
+        """Drop the entries matching ``predicate`` (caller holds ``self._lock``)."""
+        for rel in [rel for rel in self.documents if predicate(rel)]:
+            del self.documents[rel]
+            self._dirty = True
+
+    def documents_for(self, quarter: str, bank: str,
+                      document_types: Tuple[str, ...] = RELEVANT_DOCUMENT_TYPES) -> List[str]:
+        """
+        Absolute paths of a bank's cataloged PDFs for a quarter, most preferred first.
+
+        Args:
+            quarter: Quarter folder name, e.g. "Q12025"
+            bank: Bank folder name
+            document_types: Document types to include, in order of preference
+        """
+        with self._lock:
+            rels = [
+                rel for rel in self._index.get((quarter, bank), [])
+                if self.documents[rel]["document_type"] in document_types
+            ]
+            rels.sort(key=lambda rel: (document_types.index(self.documents[rel]["document_type"]), rel))
+            return [os.path.join(self.documents_root, *rel.split("/")) for rel in rels]
+
+    def has_folder(self, quarter: str, bank: str) -> bool:
+        with self._lock:
+            return f"{quarter}/{bank}" in self.folders
+
+    def banks_for(self, quarter: str) -> List[str]:
+        """Bank folders cataloged for a quarter."""
+        with self._lock:
+            return sorted(folder.split("/", 1)[1] for folder in self.folders if folder.startswith(quarter + "/"))
+
+    def duplicates_of(self, pdf_path: str) -> List[str]:
+        """Other cataloged documents with identical content."""
+        with self._lock:
+            rel = self._relpath(pdf_path)
+            sha = self.fingerprint(pdf_path)["sha256"]
+            return sorted(path for path, entry in self.documents.items() if entry["sha256"] == sha and path != rel)
+
+    def register(self, pdf_path: str, quarter: str, bank: str) -> str:
+        """
+        Catalog a document selected for (quarter, bank) and return its content hash.
+
+        Warns when the same bytes are already cataloged under another quarter, i.e. the
+        "new" quarter's supplement is really an old file.
+        """
+        with self._lock:
+            sha = self.fingerprint(pdf_path)["sha256"]
+            duplicates = self.duplicates_of(pdf_path)
+        for other in duplicates:
+            other_quarter = other.split("/", 1)[0]
+            if other_quarter != quarter:
+                logger.warning(
+                    f"{bank} {quarter}: {self._relpath(pdf_path)} is byte-identical to {other} "
+                    f"({other_quarter}); the document may not be for {quarter}"
+                )
+        return sha
+
+    def save(self) -> None:
+        """Persist the catalog if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+            atomic_write_json(self.catalog_path, {"documents": self.documents, "folders": self.folders})
+            self._dirty = False
+
+
+# One catalog per catalog file, kept for the life of the process
+_catalogs: Dict[str, DocumentCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_document_catalog(base_dir: str) -> DocumentCatalog:
+    """Process-wide catalog of ``<base_dir>/documents`` persisted under ``<base_dir>/cache``."""
+    catalog_path = os.path.join(base_dir, "cache", "document_catalog.json")
+    with _catalogs_lock:
+        if catalog_path not in _catalogs:
+            _catalogs[catalog_path] = DocumentCatalog(catalog_path, os.path.join(base_dir, "documents"))
+        return _catalogs[catalog_path]
+
+
+def cataloged_page_count(pdf_path: str) -> Optional[int]:
+    """Page count of a PDF from the loaded catalog holding it (counted directly if none does)."""
+    path = os.path.abspath(pdf_path)
+    with _catalogs_lock:
+        catalogs = list(_catalogs.values())
+    for catalog in catalogs:
+        if path.startswith(os.path.abspath(catalog.documents_root) + os.sep):
+            return catalog.fingerprint(pdf_path)["page_count"]
+    return count_pdf_pages(pdf_path)
+
+
+# Bump when table extraction changes what a stored layout looks like
+LAYOUT_FORMAT_VERSION = 1
+
+
+class LayoutArtifactStore:
+    """
+    Extracted tables keyed by document content hash, shared across quarters and banks.
+
+    Layouts are stored as serialized table grids (``ExtractedLayout.to_dict``); the
+    markdown sent to the model is regenerated from them, so it is never stored twice and
+    a markdown format change needs no invalidation. Entries are also keyed by the
+    extraction backend that produced them and by ``LAYOUT_FORMAT_VERSION``
+    (``<sha256>.<backend>.v<version>.json``), so a local-engine layout is never reused for
+    a Document Intelligence run (or the reverse).
+    """
+
+    def __init__(self, artifact_dir: str):
+        self.artifact_dir = artifact_dir
+        os.makedirs(artifact_dir, exist_ok=True)
+
+    def _path(self, sha256: str, backend: str) -> str:
+        return os.path.join(self.artifact_dir, f"{sha256}.{backend}.v{LAYOUT_FORMAT_VERSION}.json")
+
+    def get(self, sha256: str, backend: str) -> Optional[ExtractedLayout]:
+        path = self._path(sha256, backend)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return ExtractedLayout.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Unreadable layout artifact, extracting again: {path}")
+            return None
+
+    def put(self, sha256: str, backend: str, layout: ExtractedLayout) -> None:
+        atomic_write_json(self._path(sha256, backend), layout.to_dict(), indent=None)
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for serving the API with several worker processes:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master so config, catalog and routing state are loaded once;
+each worker then creates its own Azure connection pools on first use.
+"""
+
+import os
+
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "900"))  # a full analysis takes minutes
+keepalive = 5
+preload_app = True
+
+
+def when_ready(server):
+    from app import ANALYZER_SERVICE
+    ANALYZER_SERVICE.warm()
@@ -0,0 +1,246 @@
+"""
+Structured instrumentation for the analysis pipeline.
+
+Stages are timed with the ``stage`` context manager and quantities (bytes uploaded,
+tables, tokens, cache hits, ...) are counted with ``record``. Everything is aggregated
+in the process-wide ``PIPELINE_METRICS`` registry (exposed by the Flask app as a
+Prometheus ``/metrics`` endpoint) and, while a ``RunManifest`` is active, also in that
+manifest, which is written next to the results file of a single document.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+from utils import atomic_write_json
+
+
+# Histogram buckets (seconds) for stage durations; remote calls take seconds to minutes
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_manifest: contextvars.ContextVar = contextvars.ContextVar("current_manifest", default=None)
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("current_stage", default=None)
+
+
+class MetricsRegistry:
+    """Thread-safe store of stage duration histograms and labelled counters."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Dict[str, Any]] = {}
+        self._failures: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+
+    def observe_stage(self, stage_name: str, seconds: float, failed: bool = False) -> None:
+        """Add one stage duration to its histogram."""
+        with self._lock:
+            hist = self._durations.setdefault(
+                stage_name, {"count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets)}
+            )
+            hist["count"] += 1
+            hist["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+            if failed:
+                self._failures[stage_name] += 1
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add ``value`` to the counter ``name`` with the given labels."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-dict copy of the current values."""
+        with self._lock:
+            return {
+                "stages": {name: dict(hist, buckets=list(hist["buckets"])) for name, hist in self._durations.items()},
+                "failures": dict(self._failures),
+                "counters": {
+                    (name + "".join(f"[{k}={v}]" for k, v in labels)): value
+                    for (name, labels), value in self._counters.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP pipeline_stage_duration_seconds Duration of pipeline stages",
+            "# TYPE pipeline_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage_name, hist in sorted(self._durations.items()):
+                for bound, count in zip(self.buckets, hist["buckets"]):
+                    lines.append(f'pipeline_stage_duration_seconds_bucket{{stage="{stage_name}",le="{bound}"}} {count}')
+                lines.append(f'pipeline_stage_duration_seconds_bucket{{stage="{stage_name}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'pipeline_stage_duration_seconds_sum{{stage="{stage_name}"}} {hist["sum"]:.6f}')
+                lines.append(f'pipeline_stage_duration_seconds_count{{stage="{stage_name}"}} {hist["count"]}')
+
+            lines.append("# HELP pipeline_stage_failures_total Pipeline stages that raised")
+            lines.append("# TYPE pipeline_stage_failures_total counter")
+            for stage_name, count in sorted(self._failures.items()):
+                lines.append(f'pipeline_stage_failures_total{{stage="{stage_name}"}} {count}')
+
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                metric = f"pipeline_{name}_total"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} counter")
+                    declared.add(metric)
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{metric}{{{label_str}}} {value:g}" if label_str else f"{metric} {value:g}")
+
+        rss = resident_memory_bytes()
+        if rss is not None:
+            lines.append("# HELP process_resident_memory_bytes Resident memory size in bytes")
+            lines.append("# TYPE process_resident_memory_bytes gauge")
+            lines.append(f"process_resident_memory_bytes {rss}")
+
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current resident set size of this process, or None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+PIPELINE_METRICS = MetricsRegistry()
+
+
+class RunManifest:
+    """
+    Per-document record of stage timings and counters.
+
+    Use as a context manager so that ``stage``/``record`` calls made anywhere in the
+    pipeline (in the same thread or task) are attributed to this document.
+    """
+
+    def __init__(self, **context: Any):
+        self.context = context
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.status = "running"
+        self._start = time.perf_counter()
+        self._token = None
+
+    def __enter__(self) -> "RunManifest":
+        self._token = _current_manifest.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.status = "failed" if exc_type else "success"
+        if exc is not None:
+            self.context["error"] = str(exc)
+        _current_manifest.reset(self._token)
+
+    def add_stage(self, stage_name: str, seconds: float, failed: bool) -> None:
+        entry = self.stages.setdefault(stage_name, {"seconds": 0.0, "calls": 0, "status": "ok"})
+        entry["seconds"] = round(entry["seconds"] + seconds, 6)
+        entry["calls"] += 1
+        if failed:
+            entry["status"] = "failed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.context,
+            "status": self.status,
+            "started_at": self.started_at,
+            "total_seconds": round(time.perf_counter() - self._start, 6),
+            "stages": self.stages,
+            "counters": dict(self.counters),
+        }
+
+    def write(self, results_path: str) -> str:
+        """
+        Write the manifest next to a results file (``<name>.manifest.json``).
+
+        A failed attempt is written to ``<name>.failed.manifest.json`` instead: the last
+        successful result is still on disk and valid, and its manifest must stay intact
+        for incremental builds to keep treating it as up to date.
+        """
+        failed_path = failed_manifest_path_for(results_path)
+        if self.status == "failed":
+            manifest_path = failed_path
+        else:
+            manifest_path = manifest_path_for(results_path)
+            if failed_path.exists():
+                failed_path.unlink()  # superseded by this successful run
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(str(manifest_path), self.to_dict())
+        return str(manifest_path)
+
+
+def manifest_path_for(results_path: str) -> Path:
+    """Path of the run manifest belonging to a results file."""
+    path = Path(results_path)
+    return path.with_name(f"{path.stem}.manifest.json")
+
+
+def failed_manifest_path_for(results_path: str) -> Path:
+    """Path of the manifest of the last failed attempt at a results file."""
+    path = Path(results_path)
+    return path.with_name(f"{path.stem}.failed.manifest.json")
+
+
+def current_manifest() -> Optional[RunManifest]:
+    """The manifest active in this context, if any."""
+    return _current_manifest.get()
+
+
+def current_stage() -> Optional[str]:
+    """Name of the innermost stage running in this context, if any."""
+    return _current_stage.get()
+
+
+@contextmanager
+def stage(stage_name: str):
+    """Time a pipeline stage into the global registry and the active manifest."""
+    start = time.perf_counter()
+    failed = False
+    token = _current_stage.set(stage_name)
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _current_stage.reset(token)
+        elapsed = time.perf_counter() - start
+        PIPELINE_METRICS.observe_stage(stage_name, elapsed, failed)
+        manifest = current_manifest()
+        if manifest is not None:
+            manifest.add_stage(stage_name, elapsed, failed)
+
+
+def record(name: str, value: float = 1, **labels: str) -> None:
+    """
+    Count a quantity (e.g. ``bytes_uploaded``, ``prompt_tokens``, ``cache_hits``).
+
+    Args:
+        name: Counter name; exported as ``pipeline_<name>_total``
+        value: Amount to add
+        labels: Optional Prometheus labels (also folded into the manifest key)
+    """
+    PIPELINE_METRICS.increment(name, value, **labels)
+    manifest = current_manifest()
+    if manifest is not None:
+        key = name + "".join(f"[{k}={v}]" for k, v in sorted(labels.items()))
+        manifest.counters[key] += value
@@ -0,0 +1,225 @@
+"""
+Deadlines and hedged requests for the remote stages.
+
+Deadlines: every remote stage has a time limit (``STAGE_DEADLINES``, overridable with
+e.g. ``STAGE_DEADLINES="layout_poll=300,chat_completion=90"``). A call that runs past it
+raises ``DeadlineExceeded`` instead of holding the request indefinitely. Inside a call,
+``remaining_seconds()`` tells the attempt how much of the deadline is left, so the client
+call itself can be given that timeout (and no SDK retries that would restart it): an
+abandoned attempt then stops, and stops spending, when the deadline passes.
+
+Hedging (``HEDGE_CHAT_CALLS=1``): a chat call still running after the observed p95
+latency of its stage gets a duplicate, and whichever returns first is used. The loser is
+cancelled if it has not started; one already in flight cannot be interrupted by the
+synchronous SDK, so it is abandoned (it ends at the stage deadline at the latest) and
+its result is passed to ``on_discard`` so its usage can still be accounted for. Hedges
+are capped at ``HEDGE_BUDGET`` of the calls of a stage and only start once
+``HEDGE_MIN_SAMPLES`` latencies have been observed.
+
+Attempts run on pool threads. Inside a profiling session they are profiled into the
+caller's report (see ``profiling.profile_worker_thread``).
+"""
+
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+from instrumentation import record
+from profiling import profile_worker_thread
+
+
+DEFAULT_STAGE_DEADLINES = {
+    "layout_poll": 600.0,
+    "chat_completion": 180.0,
+    "repair": 120.0,
+}
+
+HEDGE_ENABLED = os.getenv("HEDGE_CHAT_CALLS", "0").lower() in ("1", "true", "yes")
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+LATENCY_WINDOW = 200  # most recent latencies per stage the percentile is taken from
+# Retries of a failed attempt while its deadline leaves room (the SDK's own are disabled then)
+DEADLINE_MAX_RETRIES = int(os.getenv("DEADLINE_MAX_RETRIES", "2"))
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Absolute time.perf_counter() by which the running attempt must finish, if any
+_attempt_deadline: contextvars.ContextVar = contextvars.ContextVar("attempt_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A remote stage did not finish within its deadline."""
+
+    def __init__(self, stage_name: str, deadline: float):
+        self.stage_name = stage_name
+        self.deadline = deadline
+        super().__init__(f"{stage_name} did not finish within its {deadline:g}s deadline")
+
+
+def _parse_deadlines(spec: str) -> Dict[str, float]:
+    deadlines = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+STAGE_DEADLINES = {**DEFAULT_STAGE_DEADLINES, **_parse_deadlines(os.getenv("STAGE_DEADLINES", ""))}
+
+
+def stage_deadline(stage_name: Optional[str]) -> Optional[float]:
+    """Deadline in seconds of a stage, or None if it has none."""
+    return STAGE_DEADLINES.get(stage_name) if stage_name else None
+
+
+def remaining_seconds() -> Optional[float]:
+    """Time left before the deadline of the attempt running in this context (None: no deadline)."""
+    deadline_at = _attempt_deadline.get()
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - time.perf_counter())
+
+
+class HedgedCaller:
+    """Runs calls with a deadline, hedging those slower than their stage's p95."""
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, budget: float = HEDGE_BUDGET,
+                 min_samples: int = HEDGE_MIN_SAMPLES, percentile: float = HEDGE_PERCENTILE,
+                 max_workers: int = 32):
+        """
+        Args:
+            enabled: Issue hedges at all (deadlines apply either way)
+            budget: Maximum hedges as a fraction of the calls of a stage
+            min_samples: Latencies a stage needs before it is hedged
+            percentile: Latency percentile after which a hedge is issued
+            max_workers: Threads running calls and their hedges
+        """
+        self.enabled = enabled
+        self.budget = budget
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-call")
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._calls: Dict[str, int] = {}
+        self._hedges: Dict[str, int] = {}
+
+    def _observe(self, stage_name: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(stage_name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def hedge_delay(self, stage_name: str) -> Optional[float]:
+        """Seconds after which a call of the stage is hedged, or None while too few samples exist."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(stage_name, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        rank = max(1, math.ceil(self.percentile / 100 * len(latencies)))
+        return latencies[rank - 1]
+
+    def _take_hedge(self, stage_name: str) -> bool:
+        with self._lock:
+            hedges = self._hedges.get(stage_name, 0)
+            if hedges + 1 > self.budget * self._calls.get(stage_name, 0):
+                return False
+            self._hedges[stage_name] = hedges + 1
+            return True
+
+    @staticmethod
+    def _attempt(fn: Callable[[], Any], deadline_at: Optional[float]) -> Any:
+        _attempt_deadline.set(deadline_at)  # in the attempt's own context copy
+        with profile_worker_thread():
+            return fn()
+
+    def _submit(self, fn: Callable[[], Any], deadline_at: Optional[float]):
+        # Each attempt runs in its own copy of the caller's context (manifest, stage, profile)
+        context = contextvars.copy_context()
+        started = time.perf_counter()
+        return self._pool.submit(context.run, self._attempt, fn, deadline_at), started
+
+    def call(self, stage_name: str, fn: Callable[[], Any], deadline: Optional[float] = None,
+             on_discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Run ``fn`` (and possibly a hedge of it) and return the first result.
+
+        Args:
+            stage_name: Stage the call belongs to (latencies and budgets are per stage)
+            fn: The call; must be safe to run twice
+            deadline: Seconds after which ``DeadlineExceeded`` is raised
+            on_discard: Called with the result of the attempt that lost the race
+        """
+        with self._lock:
+            self._calls[stage_name] = self._calls.get(stage_name, 0) + 1
+        start = time.perf_counter()
+        deadline_at = None if deadline is None else start + deadline
+        primary, primary_started = self._submit(fn, deadline_at)
+        attempts = {primary: ("primary", primary_started)}
+
+        delay = self.hedge_delay(stage_name) if self.enabled else None
+        if delay is not None and (deadline is None or delay < deadline):
+            done, _ = wait([primary], timeout=delay)
+            if not done:
+                if self._take_hedge(stage_name):
+                    record("hedges_issued", stage=stage_name)
+                    hedge, hedge_started = self._submit(fn, deadline_at)
+                    attempts[hedge] = ("hedge", hedge_started)
+                else:
+                    record("hedges_skipped", stage=stage_name, reason="budget")
+
+        remaining = None if deadline is None else max(0.0, deadline - (time.perf_counter() - start))
+        pending = set(attempts)
+        winner = None
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            # Prefer a successful attempt; an error only counts once every attempt has failed
+            succeeded = [future for future in done if future.exception() is None]
+            if succeeded:
+                winner = succeeded[0]
+            elif not pending:
+                winner = next(iter(done))
+            if remaining is not None:
+                remaining = max(0.0, deadline - (time.perf_counter() - start))
+
+        for future in attempts:
+            if future is not winner:
+                self._discard(future, on_discard)
+        if winner is None:
+            record("deadline_exceeded", stage=stage_name)
+            raise DeadlineExceeded(stage_name, deadline)
+
+        kind, started = attempts[winner]
+        if len(attempts) > 1:
+            record("hedge_wins", stage=stage_name, winner=kind)
+        if winner.exception() is None:
+            self._observe(stage_name, time.perf_counter() - started)
+        return winner.result()
+
+    @staticmethod
+    def _discard(future, on_discard: Optional[Callable[[Any], None]]) -> None:
+        if future.cancel():
+            return
+        if on_discard is not None:
+            context = contextvars.copy_context()  # attribute the late result to the caller's manifest
+            future.add_done_callback(
+                lambda f: f.exception() is None and context.run(on_discard, f.result())
+            )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, hedges and current hedge delay per stage."""
+        with self._lock:
+            stages = list(self._calls)
+        return {
+            name: {
+                "calls": self._calls.get(name, 0),
+                "hedges": self._hedges.get(name, 0),
+                "hedge_delay": self.hedge_delay(name),
+            }
+            for name in stages
+        }
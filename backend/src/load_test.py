@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Load test for the ``/api/analyze`` endpoint.
+
+Drives a weighted mix of (bank list, quarter) requests against a running API, either
+with a fixed number of concurrent callers (``--concurrency``, closed loop) or at a
+fixed arrival rate (``--rate`` requests/second, open loop), and reports latency
+percentiles, throughput, errors and the server's resident memory over time (sampled
+from ``/metrics``). ``--ramp 1,2,4,8`` runs one step per concurrency level to find
+the point where throughput stops growing.
+
+To test the server rather than Azure, record the remote calls once and replay them::
+
+    AZURE_FIXTURES_MODE=record AZURE_FIXTURES_DIR=fixtures python app.py   # then run test_api.py
+    AZURE_FIXTURES_MODE=replay AZURE_FIXTURES_DIR=fixtures python app.py
+    python load_test.py --banks JPMorgan WellsFargo --quarters Q12025 --ramp 1,2,4,8 --duration 60
+
+Requests are sent with ``force`` so every one runs the pipeline instead of being
+skipped as up to date (``--no-force`` measures the cached path).
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+
+class RequestMix:
+    """Weighted request bodies for ``/api/analyze``."""
+
+    def __init__(self, entries: List[Dict[str, Any]], force: bool = True, seed: Optional[int] = None):
+        """
+        Args:
+            entries: Dicts with "bank_names", "quarter", optional "weight" and any other
+                request fields (e.g. "dashboard_mode")
+            force: Send ``force`` so the analyses are not skipped as up to date
+            seed: Random seed for reproducible request sequences
+        """
+        if not entries:
+            raise ValueError("The request mix is empty")
+        self.bodies = []
+        self.weights = []
+        for entry in entries:
+            body = {k: v for k, v in entry.items() if k != "weight"}
+            body.setdefault("force", force)
+            self.bodies.append(body)
+            self.weights.append(float(entry.get("weight", 1)))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "RequestMix":
+        with open(path, "r") as f:
+            return cls(json.load(f), **kwargs)
+
+    @classmethod
+    def from_banks(cls, banks: List[str], quarters: List[str], **kwargs: Any) -> "RequestMix":
+        """One entry per quarter with every bank, one per (quarter, bank)."""
+        entries = []
+        for quarter in quarters:
+            entries.append({"bank_names": banks, "quarter": quarter})
+            if len(banks) > 1:
+                entries.extend({"bank_names": [bank], "quarter": quarter} for bank in banks)
+        return cls(entries, **kwargs)
+
+    def next_body(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._random.choices(self.bodies, weights=self.weights)[0]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LoadTest:
+    """One load-test step against a running API."""
+
+    def __init__(self, base_url: str, mix: RequestMix, duration: float = 60.0,
+                 concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 max_requests: Optional[int] = None, timeout: float = 900.0,
+                 sample_seconds: float = 1.0):
+        """
+        Args:
+            base_url: API root, e.g. http://127.0.0.1:5000
+            mix: Request bodies to send
+            duration: Seconds to keep issuing requests
+            concurrency: Closed loop: callers each sending their next request when the last returns
+            rate: Open loop: mean arrivals per second (Poisson), regardless of response times
+            max_requests: Stop issuing after this many requests
+            timeout: Seconds before a request counts as a timeout error
+            sample_seconds: Interval of server memory samples
+        """
+        if (concurrency is None) == (rate is None):
+            raise ValueError("Set exactly one of concurrency or rate")
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        self.duration = duration
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.sample_seconds = sample_seconds
+        self.samples: List[Dict[str, Any]] = []  # one per completed request
+        self.memory: List[Dict[str, float]] = []  # server RSS over time
+        self._issued = 0
+        self._lock = threading.Lock()
+        self._started = 0.0
+
+    def _take_ticket(self) -> bool:
+        with self._lock:
+            if self.max_requests is not None and self._issued >= self.max_requests:
+                return False
+            self._issued += 1
+            return True
+
+    def _send(self) -> None:
+        body = self.mix.next_body()
+        request = urllib.request.Request(
+            f"{self.base_url}/api/analyze",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        sent = time.perf_counter()
+        status, error = None, None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status, error = e.code, f"HTTP {e.code}"
+        except Exception as e:
+            error = "timeout" if "timed out" in str(e) else type(e).__name__
+        finished = time.perf_counter()
+        with self._lock:
+            self.samples.append({
+                "start": sent - self._started,
+                "latency": finished - sent,
+                "status": status,
+                "error": error,
+                "banks": len(body.get("bank_names", [])),
+            })
+
+    def _closed_loop_caller(self, deadline: float) -> None:
+        while time.perf_counter() < deadline and self._take_ticket():
+            self._send()
+
+    def _sample_memory(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            rss = server_memory_bytes(self.base_url)
+            if rss is not None:
+                self.memory.append({"t": time.perf_counter() - self._started, "rss_bytes": rss})
+            stop.wait(self.sample_seconds)
+
+    def run(self) -> Dict[str, Any]:
+        self._started = time.perf_counter()
+        deadline = self._started + self.duration
+        stop_sampling = threading.Event()
+        sampler = threading.Thread(target=self._sample_memory, args=(stop_sampling,), daemon=True)
+        sampler.start()
+
+        if self.concurrency is not None:
+            callers = [threading.Thread(target=self._closed_loop_caller, args=(deadline,), daemon=True)
+                       for _ in range(self.concurrency)]
+            for caller in callers:
+                caller.start()
+            for caller in callers:
+                caller.join()
+        else:
+            arrivals = random.Random()
+            with ThreadPoolExecutor(max_workers=256, thread_name_prefix="load") as pool:
+                next_arrival = time.perf_counter()
+                while next_arrival < deadline and self._take_ticket():
+                    time.sleep(max(0.0, next_arrival - time.perf_counter()))
+                    pool.submit(self._send)
+                    next_arrival += arrivals.expovariate(self.rate)
+
+        elapsed = time.perf_counter() - self._started
+        stop_sampling.set()
+        sampler.join()
+        return summarize(self.samples, elapsed, self.memory,
+                         concurrency=self.concurrency, rate=self.rate)
+
+
+def server_memory_bytes(base_url: str) -> Optional[float]:
+    """``process_resident_memory_bytes`` from the server's /metrics, if exposed."""
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+            text = response.read().decode("utf-8")
+    except Exception:
+        return None
+    for line in text.splitlines():
+        if line.startswith("process_resident_memory_bytes "):
+            return float(line.split()[1])
+    return None
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float, memory: List[Dict[str, float]],
+              **settings: Any) -> Dict[str, Any]:
+    """Latency percentiles, throughput, error breakdown and memory of one step."""
+    ok = [s["latency"] for s in samples if s["error"] is None]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if s["error"] is not None:
+            errors[s["error"]] = errors.get(s["error"], 0) + 1
+    rss = [m["rss_bytes"] for m in memory]
+    return {
+        **{k: v for k, v in settings.items() if v is not None},
+        "requests": len(samples),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        "errors": errors,
+        "latency_seconds": {
+            "p50": percentile(ok, 50),
+            "p95": percentile(ok, 95),
+            "p99": percentile(ok, 99),
+            "max": max(ok) if ok else None,
+        },
+        "server_memory_mb": {
+            "start": rss[0] / 2**20,
+            "peak": max(rss) / 2**20,
+            "end": rss[-1] / 2**20,
+        } if rss else None,
+        "memory_series": memory,
+        "samples": samples,
+    }
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return f"{seconds:7.2f}s" if seconds is not None else "      -"
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    load = f"concurrency {summary['concurrency']}" if "concurrency" in summary else f"rate {summary['rate']}/s"
+    lat = summary["latency_seconds"]
+    print(f"📈 {load}: {summary['requests']} requests in {summary['elapsed_seconds']:.1f}s, "
+          f"{summary['throughput_rps']:.2f} ok/s, {summary['error_rate']:.1%} errors")
+    print(f"   latency p50 {_fmt(lat['p50'])}  p95 {_fmt(lat['p95'])}  p99 {_fmt(lat['p99'])}  max {_fmt(lat['max'])}")
+    if summary["errors"]:
+        print(f"   errors: {', '.join(f'{kind} x{count}' for kind, count in summary['errors'].items())}")
+    if summary["server_memory_mb"]:
+        mem = summary["server_memory_mb"]
+        print(f"   server RSS {mem['start']:.0f} MB -> peak {mem['peak']:.0f} MB -> {mem['end']:.0f} MB")
+
+
+def saturation_step(steps: List[Dict[str, Any]], min_gain: float = 0.1,
+                    max_error_rate: float = 0.01) -> Optional[Dict[str, Any]]:
+    """First ramp step that adds less than ``min_gain`` throughput or starts failing."""
+    for previous, step in zip(steps, steps[1:]):
+        if step["error_rate"] > max_error_rate:
+            return step
+        if step["throughput_rps"] < previous["throughput_rps"] * (1 + min_gain):
+            return step
+    return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the /api/analyze endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="API root")
+    parser.add_argument("--mix", help="JSON file: list of {bank_names, quarter, weight, ...} request bodies")
+    parser.add_argument("--banks", nargs="+", help="Banks to request (instead of --mix)")
+    parser.add_argument("--quarters", nargs="+", default=["Q12025"], help="Quarters to request with --banks")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Concurrent callers (closed loop)")
+    load.add_argument("--rate", type=float, help="Requests per second (open loop)")
+    load.add_argument("--ramp", help="Comma-separated concurrency levels run one after another, e.g. 1,2,4,8")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds per step")
+    parser.add_argument("--requests", type=int, help="Maximum requests per step")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Per-request timeout in seconds")
+    parser.add_argument("--no-force", action="store_true", help="Let the server skip up-to-date banks")
+    parser.add_argument("--seed", type=int, help="Random seed for the request sequence")
+    parser.add_argument("--report", help="Write every step (including raw samples) to this JSON file")
+    args = parser.parse_args()
+
+    if args.mix:
+        mix = RequestMix.from_file(args.mix, force=not args.no_force, seed=args.seed)
+    elif args.banks:
+        mix = RequestMix.from_banks(args.banks, args.quarters, force=not args.no_force, seed=args.seed)
+    else:
+        parser.error("Provide --mix or --banks")
+
+    if args.ramp:
+        levels = [int(level) for level in args.ramp.split(",")]
+        step_settings = [{"concurrency": level} for level in levels]
+    elif args.rate:
+        step_settings = [{"rate": args.rate}]
+    else:
+        step_settings = [{"concurrency": args.concurrency or 1}]
+
+    steps = []
+    for settings in step_settings:
+        test = LoadTest(args.url, mix, duration=args.duration, max_requests=args.requests,
+                        timeout=args.timeout, **settings)
+        steps.append(test.run())
+        print_summary(steps[-1])
+
+    if len(steps) > 1:
+        saturated = saturation_step(steps)
+        if saturated:
+            print(f"🧱 Saturation at concurrency {saturated['concurrency']} "
+                  f"({saturated['throughput_rps']:.2f} ok/s, p95 {_fmt(saturated['latency_seconds']['p95']).strip()})")
+        else:
+            print("🚀 Throughput still growing at the highest level tested")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(steps, f, indent=2)
+        print(f"💾 Report written to {args.report}")
+    return 1 if any(step["requests"] == 0 for step in steps) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,28 @@ This script demonstrates how to use the PDFAnalyzer class.
 """
 
 import sys
+import time
 import argparse
 from pathlib import Path
 from pdf_analyzer import PDFAnalyzer, validate_file_paths, create_output_directory
 import os
-import json
-from utils import create_batch_config_from_config, create_consolidated_results
+from contextlib import nullcontext
+from datetime import date, timedelta
+from utils import create_batch_config_from_config, create_consolidated_results, consolidated_results_path, register_documents
+from run_config import RunConfig
+from instrumentation import PIPELINE_METRICS, stage
+from profiling import profiling_session
+from model_router import routing_fingerprint
+from build_graph import plan_builds, consolidation_needed, print_build_plan
+from run_journal import RunJournal
+from watcher import DocumentWatcher, DEFAULT_SETTLE_SECONDS
+from scheduler import AnalysisScheduler
+from backfill import Backfill, expand_backfill, analyze_bank, consolidate_quarter
+from work_queue import WorkQueue, QueueWorker, default_worker_id
+from usage_ledger import UsageLedger, BudgetExceeded, GROUP_COLUMNS, format_report
+
+BASE_DIR = "D:\office_Work_shennanigans\hackathon\integrated_hackathon_codebase"
+DEFAULT_QUEUE_PATH = os.path.join(BASE_DIR, "cache", "work_queue.db")
 
 
 def main():
@@ -22,6 +38,7 @@ def main():
     parser.add_argument("--config", default="config.json", help="Path to configuration file")
     parser.add_argument("--output", help="Custom output filename")
     parser.add_argument("--output-dir", default="./output", help="Output directory")
+    parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports to ./profiles")
     
     args = parser.parse_args()
     
@@ -45,12 +62,13 @@ def main():
         
         # Run analysis
         print("Starting PDF analysis...")
-        results = analyzer.analyze_pdf(
-            pdf_path=args.pdf,
-            user_prompt_path=args.user_prompt,
-            system_prompt_path=args.system_prompt,
-            output_filename=output_filename
-        )
+        with profiling_session("profiles") if args.profile else nullcontext():
+            results = analyzer.analyze_pdf(
+                pdf_path=args.pdf,
+                user_prompt_path=args.user_prompt,
+                system_prompt_path=args.system_prompt,
+                output_filename=output_filename
+            )
         
         print(f"✅ Analysis completed successfully!")
         print(f"📊 Results saved to: {output_filename}")
@@ -70,6 +88,13 @@ def main():
         sys.exit(1)
 
 
+def create_analyzer(base_dir: str) -> PDFAnalyzer:
+    """Analyzer sharing the project's layout cache, routing stats and usage ledger."""
+    return PDFAnalyzer(artifact_dir=os.path.join(base_dir, "cache", "layouts"),
+                       routing_stats_path=os.path.join(base_dir, "cache", "routing_stats.json"),
+                       usage_ledger_path=os.path.join(base_dir, "cache", "usage_ledger.db"))
+
+
 def run_example():
     """
     Example function showing how to use the PDFAnalyzer programmatically.
@@ -104,51 +129,276 @@ def run_example():
         return None
 
 
-def batch_analyze():
+def batch_analyze(profile: bool = False, force: bool = False, dry_run: bool = False,
+                  resume: str = None):
     """
     Batch processing for multiple PDFs using config and utility functions.
+    
+    Only banks whose inputs (PDF, prompts, quarter, deployment) changed since their
+    last successful run are re-analyzed.
+    
+    Args:
+        profile: Write cProfile/tracemalloc reports for each document to <base_dir>/profiles
+        force: Re-analyze every bank regardless of recorded inputs
+        dry_run: Only print which banks would be rebuilt
+        resume: Run id of an interrupted batch; completed banks and stages are reused
     """
-    base_dir = "D:\office_Work_shennanigans\hackathon\integrated_hackathon_codebase"
+    base_dir = BASE_DIR
     config_path = os.path.join(base_dir, "config", "config.json")
-    batch_config = create_batch_config_from_config(config_path, base_dir)
+    profile_dir = os.path.join(base_dir, "profiles")
+    run_config = RunConfig.from_file(config_path)
+    latest_quarter = run_config.latest_quarter
+    with stage("batch_config"):
+        batch_config = create_batch_config_from_config(run_config, base_dir)
     print(batch_config)
-    analyzer = PDFAnalyzer()
-    results = []
 
-    for i, config in enumerate(batch_config):
+    stale, up_to_date = plan_builds(batch_config, latest_quarter, routing_fingerprint(), force=force)
+    print_build_plan(stale, up_to_date)
+    if dry_run:
+        return []
+    register_documents(stale, latest_quarter, base_dir)
+
+    journal = RunJournal(os.path.join(base_dir, "runs"), run_id=resume,
+                         quarter=latest_quarter, banks=[c["bank"] for c in batch_config])
+    print(f"📒 Run id: {journal.run_id} (resume with --resume {journal.run_id})")
+    run_config = run_config.with_overrides(run_id=journal.run_id)  # usage is charged to this run
+
+    analyzer = create_analyzer(base_dir) if stale else None
+    results = [{"config": config, "status": "up_to_date"} for config in up_to_date]
+
+    for i, config in enumerate(stale):
         try:
-            print(f"Processing document {i+1}/{len(batch_config)}: {config['pdf']}")
-            result = analyzer.analyze_pdf(
-                pdf_path=config["pdf"],
-                user_prompt_path=config["user_prompt"],
-                system_prompt_path=config["system_prompt"],
-                output_filename=config["output"]
-            )
+            checkpoint = journal.bank(config["bank"])
+            if checkpoint.is_done():
+                print(f"⏭️  Document {i+1}/{len(stale)} already completed in run {journal.run_id}")
+                results.append({"config": config, "status": "up_to_date"})
+                continue
+            print(f"Processing document {i+1}/{len(stale)}: {', '.join(config['pdfs'])}")
+            with profiling_session(profile_dir) if profile else nullcontext():
+                result = analyzer.analyze_pdf(
+                    pdf_path=config["pdfs"],
+                    user_prompt_path=config["user_prompt"],
+                    system_prompt_path=config["system_prompt"],
+                    output_filename=config["output"],
+                    checkpoint=checkpoint,
+                    run_config=run_config
+                )
             results.append({"config": config, "result": result, "status": "success"})
             print(f"✅ Document {i+1} completed")
+        except BudgetExceeded as e:
+            print(f"🛑 {e}; remaining documents not started (resume with --resume {journal.run_id})")
+            results.append({"config": config, "error": str(e), "status": "failed"})
+            break
         except Exception as e:
             print(f"❌ Document {i+1} failed: {e}")
             results.append({"config": config, "error": str(e), "status": "failed"})
 
     # Summary
     successful = sum(1 for r in results if r["status"] == "success")
-    failed = len(results) - successful
-    print(f"\n📊 Batch processing completed: {successful} successful, {failed} failed")
+    failed = sum(1 for r in results if r["status"] == "failed")
+    skipped = len(results) - successful - failed
+    print(f"\n📊 Batch processing completed: {successful} successful, {failed} failed, {skipped} up to date")
+
+    # Consolidate results (only when a bank result changed)
+    consolidated_output_path = consolidated_results_path(base_dir, run_config)
+    if consolidation_needed(batch_config, consolidated_output_path):
+        with stage("consolidation"):
+            create_consolidated_results(batch_config, consolidated_output_path)
+    else:
+        print(f"✔️  Consolidated results up to date: {consolidated_output_path}")
 
-    # Consolidate results
-    # Load the configuration to get the latest quarter
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-    latest_quarter = config.get("latest_quarter")
-    consolidated_output_path = os.path.join(base_dir, "results", latest_quarter, "consolidated_results.json")
-    create_consolidated_results(batch_config, consolidated_output_path)
+    # Stage timing summary for the whole batch
+    for stage_name, hist in PIPELINE_METRICS.snapshot()["stages"].items():
+        print(f"⏱️  {stage_name}: {hist['sum']:.2f}s over {hist['count']} call(s)")
+    if analyzer is not None and len(analyzer.router.deployments) > 1:
+        for bank, routing in analyzer.router.escalation_rates().items():
+            print(f"🔀 {bank}: escalated {routing['escalated']}/{routing['routed']} ({routing['rate']:.0%})")
+    if analyzer is not None:
+        for stage_name, hedging in analyzer.hedger.stats().items():
+            if hedging["hedges"]:
+                print(f"🪃 {stage_name}: {hedging['hedges']} hedged call(s) out of {hedging['calls']}")
 
     return results
 
 
+def process_document_update(base_dir: str, quarter: str, bank: str, analyzer: PDFAnalyzer):
+    """
+    Run the pipeline for a single (quarter, bank) and refresh that quarter's
+    consolidated results and dashboard.
+    """
+    print(f"📄 New supplement for {bank} {quarter}")
+    if not os.path.exists(os.path.join(base_dir, "prompts", bank, "user_prompt.txt")):
+        print(f"⚠️  No user prompt for {bank}; skipping")
+        return
+
+    if analyzer.ledger is not None:
+        analyzer.ledger.wait_for_budget()  # the watcher's own thread pauses, not a scheduler slot
+    status = analyze_bank(analyzer, base_dir, quarter, bank)
+    if status == "analyzed":
+        print(f"✅ {bank} {quarter} analyzed")
+    else:
+        print(f"✔️  {bank} {quarter}: {status.replace('_', ' ')}")
+
+    # Re-consolidate every bank of the quarter that has results, then rebuild its dashboard
+    consolidated_output_path = consolidate_quarter(base_dir, quarter)
+    if consolidated_output_path:
+        from dashboard_method_summary_analysis import create_dashboard
+        with stage("dashboard_build"):
+            create_dashboard(consolidated_output_path, display_mode="save_only",
+                             html_filename=os.path.join(base_dir, "results", quarter, "banking_dashboard.html"))
+
+
+def watch_documents(settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+    """Long-running mode: analyze supplements as they land in documents/<quarter>/<bank>/."""
+    base_dir = BASE_DIR
+    analyzer = create_analyzer(base_dir)
+    watcher = DocumentWatcher(
+        os.path.join(base_dir, "documents"),
+        on_ready=lambda quarter, bank: process_document_update(base_dir, quarter, bank, analyzer),
+        settle_seconds=settle_seconds
+    )
+    print(f"👀 Watching {watcher.documents_root} (Ctrl+C to stop)")
+    watcher.run()
+
+
+def run_backfill(quarter_range: str, banks=None, concurrency: int = 4, force: bool = False):
+    """
+    Analyze every bank of every quarter in ``START:END`` (e.g. "Q12023:Q42024"),
+    newest quarter first, round-robin across banks.
+    """
+    base_dir = BASE_DIR
+    start_quarter, _, end_quarter = quarter_range.partition(":")
+    tasks = expand_backfill(base_dir, start_quarter, end_quarter or start_quarter, banks)
+    if not tasks:
+        print(f"❌ No documents found for {quarter_range}")
+        return {}
+    print(f"🗂️  Backfilling {len(tasks)} (quarter, bank) pair(s) with {concurrency} worker(s)")
+
+    analyzer = create_analyzer(base_dir)
+    # Nothing interactive runs in this process, so backfill may use every worker
+    scheduler = AnalysisScheduler(max_concurrency=concurrency, backfill_share=1.0)
+    try:
+        results = Backfill(scheduler, analyzer, base_dir, tasks, force=force).start().wait()
+    finally:
+        scheduler.shutdown()
+
+    failed = [f"{bank} {quarter}" for (quarter, bank), status in results.items() if status.startswith("failed")]
+    print(f"📊 Backfill done: {len(results) - len(failed)}/{len(results)} succeeded")
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+    return results
+
+
+def coordinate(quarter_range: str, banks=None, queue_path: str = DEFAULT_QUEUE_PATH,
+               poll_seconds: float = 10.0):
+    """
+    Coordinator: enqueue every (quarter, bank) of ``START:END`` into the shared queue and
+    report progress until ``--worker`` processes (on this or other nodes) have finished them.
+    """
+    base_dir = BASE_DIR
+    start_quarter, _, end_quarter = quarter_range.partition(":")
+    tasks = expand_backfill(base_dir, start_quarter, end_quarter or start_quarter, banks)
+    if not tasks:
+        print(f"❌ No documents found for {quarter_range}")
+        return None
+    queue = WorkQueue(queue_path)
+    job_id = queue.enqueue(tasks)
+    print(f"🗂️  Job {job_id}: {len(tasks)} task(s) queued in {queue_path}")
+    print(f"   Start workers with: python main.py --worker --queue {queue_path} --job {job_id}")
+
+    while True:
+        status = queue.status(job_id)
+        print(f"⏳ {status['done']} done, {status['failed']} failed, {status['leased']} running, "
+              f"{status['queued']} queued ({len(status['active_workers'])} worker(s))")
+        if status["finished"]:
+            break
+        time.sleep(poll_seconds)
+
+    # Workers consolidate each quarter when its last task ends; pick up any they did not reach
+    worker_id = default_worker_id()
+    for quarter in queue.unconsolidated_quarters(job_id):
+        if queue.claim_consolidation(job_id, quarter, worker_id):
+            consolidate_quarter(base_dir, quarter)
+    for failure in status["failures"]:
+        print(f"❌ {failure['bank']} {failure['quarter']}: {failure['error']}")
+    print(f"📊 Job {job_id} done: {status['done']}/{status['total']} succeeded")
+    return status
+
+
+def run_worker(queue_path: str = DEFAULT_QUEUE_PATH, job_id: str = None, force: bool = False,
+               keep_running: bool = False):
+    """Worker: claim and analyze queued (quarter, bank) tasks until the queue is drained."""
+    base_dir = BASE_DIR
+    analyzer = create_analyzer(base_dir)
+    worker = QueueWorker(WorkQueue(queue_path), analyzer, base_dir, force=force)
+    try:
+        worker.run(job_id=job_id, exit_when_idle=not keep_running)
+    except BudgetExceeded as e:
+        print(f"🛑 Worker {worker.worker_id} stopped: {e}")
+    print(f"👋 Worker {worker.worker_id} processed {worker.processed} task(s)")
+    return worker.processed
+
+
+def usage_report(days: int = 7, group_by=("day", "bank"), run_id: str = None):
+    """Print token and page usage of the last ``days`` days (or of one run) from the ledger."""
+    ledger = UsageLedger.from_env(os.path.join(BASE_DIR, "cache", "usage_ledger.db"))
+    since = None if run_id else (date.today() - timedelta(days=days - 1)).isoformat()
+    rows = ledger.usage(group_by=group_by, run_id=run_id, since=since)
+    scope = f"run {run_id}" if run_id else f"since {since}"
+    print(f"💰 Usage {scope}\n")
+    print(format_report(rows, group_by))
+
+    today = ledger.totals(day=date.today().isoformat())
+    for (scope_name, resource), budget in ledger.budgets.items():
+        if budget is None:
+            continue
+        if scope_name == "daily":
+            print(f"📏 Daily {resource} budget: {today[resource]} of {budget} used today")
+        elif run_id:
+            print(f"📏 Run {resource} budget: {ledger.totals(run_id=run_id)[resource]} of {budget} used")
+    return rows
+
+
 if __name__ == "__main__":
     # Run the main CLI interface
     # main()
     # Alternatively, uncomment one of these to run examples:
     # run_example()
-    batch_analyze()
\ No newline at end of file
+    batch_parser = argparse.ArgumentParser(description="Batch-analyze all banks listed in config.json")
+    batch_parser.add_argument("--profile", action="store_true", help="Write cProfile/tracemalloc reports to <base_dir>/profiles")
+    batch_parser.add_argument("--force", action="store_true", help="Re-analyze every bank even if its inputs are unchanged")
+    batch_parser.add_argument("--dry-run", action="store_true", help="Only show which banks would be re-analyzed")
+    batch_parser.add_argument("--resume", metavar="RUN_ID", help="Resume an interrupted batch from its run journal")
+    batch_parser.add_argument("--watch", action="store_true", help="Keep running and analyze supplements as they are added to documents/")
+    batch_parser.add_argument("--settle-seconds", type=float, default=DEFAULT_SETTLE_SECONDS,
+                              help="Watch mode: seconds a new file must stay unchanged before it is processed")
+    batch_parser.add_argument("--backfill", metavar="START:END", help="Analyze every bank of a quarter range, e.g. Q12023:Q42024")
+    batch_parser.add_argument("--banks", nargs="+", help="Backfill: only these banks")
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="Backfill: analyses running at once")
+    batch_parser.add_argument("--coordinate", metavar="START:END", help="Queue a quarter range for --worker processes and wait for it")
+    batch_parser.add_argument("--worker", action="store_true", help="Process tasks from the shared work queue")
+    batch_parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="Shared work queue database")
+    batch_parser.add_argument("--job", help="Worker: only process tasks of this job")
+    batch_parser.add_argument("--keep-running", action="store_true", help="Worker: keep polling when the queue is empty")
+    batch_parser.add_argument("--usage-report", action="store_true", help="Print token/page usage from the usage ledger")
+    batch_parser.add_argument("--days", type=int, default=7, help="Usage report: days to include")
+    batch_parser.add_argument("--group-by", default="day,bank",
+                              help=f"Usage report: comma-separated columns of {', '.join(GROUP_COLUMNS)}")
+    batch_parser.add_argument("--run", help="Usage report: only this run id (batch run, backfill or queue job)")
+    batch_args = batch_parser.parse_args()
+    if batch_args.usage_report:
+        usage_report(days=batch_args.days, group_by=[c for c in batch_args.group_by.split(",") if c],
+                     run_id=batch_args.run)
+    elif batch_args.watch:
+        watch_documents(settle_seconds=batch_args.settle_seconds)
+    elif batch_args.coordinate:
+        coordinate(batch_args.coordinate, banks=batch_args.banks, queue_path=batch_args.queue)
+    elif batch_args.worker:
+        run_worker(queue_path=batch_args.queue, job_id=batch_args.job, force=batch_args.force,
+                   keep_running=batch_args.keep_running)
+    elif batch_args.backfill:
+        run_backfill(batch_args.backfill, banks=batch_args.banks, concurrency=batch_args.concurrency,
+                     force=batch_args.force)
+    else:
+        batch_analyze(profile=batch_args.profile, force=batch_args.force, dry_run=batch_args.dry_run,
+                      resume=batch_args.resume)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Tiered routing of chat completions across Azure OpenAI deployments.
+
+Each document is first sent to the fast (cheaper) deployment; its parsed response is
+validated against the expected metrics, quarters and sanity ranges, and only documents
+that fail are escalated to the next, stronger deployment. Escalations are counted per
+bank, and a bank that almost always escalates skips the fast tier altogether.
+
+Tiers come from the environment:
+
+- ``AZURE_OPENAI_FAST_DEPLOYMENT_NAME`` (optional) fast tier
+- ``AZURE_OPENAI_DEPLOYMENT_NAME`` strong tier (the deployment used before routing)
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from instrumentation import record
+from result_validation import is_acceptable, summarize_issues
+from utils import atomic_write_json
+
+
+# A bank that escalated at least this share of its last runs goes straight to the strong tier
+STICKY_ESCALATION_RATE = 0.8
+STICKY_MIN_SAMPLES = 3
+
+logger = logging.getLogger(__name__)
+
+
+def deployments_from_env() -> List[str]:
+    """Configured deployment tiers, cheapest first (empty if no strong deployment is set)."""
+    strong = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    if not strong:
+        return []
+    fast = os.getenv("AZURE_OPENAI_FAST_DEPLOYMENT_NAME")
+    return [fast, strong] if fast and fast != strong else [strong]
+
+
+def routing_fingerprint(deployments: Optional[List[str]] = None, sticky_rate: float = STICKY_ESCALATION_RATE,
+                        sticky_min_samples: int = STICKY_MIN_SAMPLES) -> Dict[str, Any]:
+    """Routing configuration results depend on: the deployment tiers and escalation thresholds."""
+    return {
+        "deployments": list(deployments if deployments is not None else deployments_from_env()),
+        "sticky_rate": sticky_rate,
+        "sticky_min_samples": sticky_min_samples,
+    }
+
+
+class ModelRouter:
+    """Routes a completion through deployment tiers, escalating on failed validation."""
+
+    def __init__(self, deployments: List[str], stats_path: Optional[str] = None,
+                 sticky_rate: float = STICKY_ESCALATION_RATE,
+                 sticky_min_samples: int = STICKY_MIN_SAMPLES):
+        """
+        Args:
+            deployments: Deployment names, cheapest first, strongest last
+            stats_path: Optional JSON file persisting per-bank routing counts across runs
+            sticky_rate: Escalation rate above which a bank skips the fast tier
+            sticky_min_samples: Routed documents needed before a bank can become sticky
+        """
+        if not deployments:
+            raise ValueError("At least one deployment is required for routing")
+        self.deployments = deployments
+        self.stats_path = stats_path
+        self.sticky_rate = sticky_rate
+        self.sticky_min_samples = sticky_min_samples
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}  # bank -> {"routed": n, "escalated": n}
+        if stats_path and os.path.exists(stats_path):
+            try:
+                with open(stats_path, "r") as f:
+                    self.stats = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Unreadable routing stats, starting fresh: {stats_path}")
+
+    @classmethod
+    def from_env(cls, stats_path: Optional[str] = None) -> "ModelRouter":
+        """Router over the fast and strong deployments configured in the environment."""
+        deployments = deployments_from_env()
+        if not deployments:
+            raise ValueError("Azure OpenAI deployment name not found in environment variables")
+        return cls(deployments, stats_path=stats_path)
+
+    def fingerprint(self) -> Dict[str, Any]:
+        """This router's part of a result's input fingerprint (see ``build_graph``)."""
+        return routing_fingerprint(self.deployments, self.sticky_rate, self.sticky_min_samples)
+
+    @property
+    def strong_deployment(self) -> str:
+        return self.deployments[-1]
+
+    def escalation_rate(self, bank: str) -> Optional[float]:
+        """Share of a bank's routed documents that needed escalation (None if never routed)."""
+        entry = self.stats.get(bank)
+        if not entry or not entry["routed"]:
+            return None
+        return entry["escalated"] / entry["routed"]
+
+    def escalation_rates(self) -> Dict[str, Dict[str, Any]]:
+        """Routing counts and escalation rate per bank."""
+        with self._lock:
+            return {
+                bank: {**entry, "rate": round(self.escalation_rate(bank), 3)}
+                for bank, entry in sorted(self.stats.items()) if entry["routed"]
+            }
+
+    def tiers_for(self, bank: str) -> List[str]:
+        """Deployments to try for a bank, in order."""
+        entry = self.stats.get(bank, {"routed": 0})
+        rate = self.escalation_rate(bank)
+        if (len(self.deployments) > 1 and rate is not None
+                and entry["routed"] >= self.sticky_min_samples and rate >= self.sticky_rate):
+            return self.deployments[-1:]
+        return self.deployments
+
+    def complete(self, call: Callable[[str], str], validate: Callable[[str], List[Dict[str, Any]]],
+                 bank: str) -> Tuple[str, str, List[Dict[str, Any]]]:
+        """
+        Run ``call`` on each tier until its output validates.
+
+        Args:
+            call: Sends the request to the given deployment and returns the raw content
+            validate: Returns the validation issues of a raw content
+            bank: Bank the document belongs to (for escalation tracking)
+
+        Returns:
+            Tuple of (content, deployment used, remaining issues). The strong tier's output
+            is returned even if it still has issues.
+        """
+        tiers = self.tiers_for(bank)
+        escalated = len(tiers) < len(self.deployments)  # sticky banks count as escalated
+        for i, deployment in enumerate(tiers):
+            content = call(deployment)
+            issues = validate(content)
+            last_tier = i == len(tiers) - 1
+            if is_acceptable(issues) or last_tier:
+                record("routed_requests", bank=bank, deployment=deployment)
+                if escalated:
+                    record("escalations", bank=bank)
+                self._update_stats(bank, escalated)
+                return content, deployment, issues
+            logger.info(f"{bank}: {deployment} output failed validation ({summarize_issues(issues)}), escalating")
+            escalated = True
+        raise AssertionError("unreachable")
+
+    def _update_stats(self, bank: str, escalated: bool) -> None:
+        with self._lock:
+            entry = self.stats.setdefault(bank, {"routed": 0, "escalated": 0})
+            entry["routed"] += 1
+            entry["escalated"] += int(escalated)
+            if self.stats_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.stats_path)), exist_ok=True)
+                atomic_write_json(self.stats_path, self.stats)
@@ -1,15 +1,37 @@
 import os
 import json
+import time
 import logging
-from typing import Optional, Dict, List, Any
+import threading
+from typing import Optional, Dict, List, Any, Sequence, Union, TYPE_CHECKING
 from pathlib import Path
 
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeOutputOption, AnalyzeResult
-from azure.core.credentials import AzureKeyCredential
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 
+# The Azure SDKs are imported when the first client is created, not at import time
+if TYPE_CHECKING:
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+    from openai import AzureOpenAI
+
+from instrumentation import RunManifest, stage, record, current_stage
+from profiling import profiled, track_memory
+from build_graph import file_sha256, input_fingerprint
+from run_journal import BankCheckpoint
+from document_catalog import LayoutArtifactStore, cataloged_page_count
+from model_router import ModelRouter
+from result_validation import validate_metrics, summarize_issues, is_acceptable, response_schema, metrics_json_schema
+from result_repair import (salvage_json, cells_to_repair, relevant_tables, build_repair_prompt,
+                           merge_repair, requested_structure)
+from table_extraction import create_table_extractor, ExtractedLayout
+from azure_fixtures import fixture_store_from_env, REPLAY
+from usage_ledger import UsageLedger
+from token_budget import completion_cap, estimate_prompt_tokens, next_cap
+from latency_control import (DEADLINE_MAX_RETRIES, RETRY_BACKOFF_SECONDS, DeadlineExceeded, HedgedCaller,
+                             remaining_seconds, stage_deadline)
+from circuit_breaker import get_breaker, is_service_failure
+from run_config import RunConfig
+from utils import atomic_write_json, ensure_results_subdirs
+
 
 class PDFAnalyzer:
     """
@@ -17,20 +39,45 @@ class PDFAnalyzer:
     and extracting metrics using Azure OpenAI.
     """
     
-    def __init__(self, config_path: str = "D:/office_Work_shennanigans/hackathon/integrated_hackathon_codebase/config/config.json"):
+    def __init__(self, config_path: str = "D:/office_Work_shennanigans/hackathon/integrated_hackathon_codebase/config/config.json",
+                 artifact_dir: Optional[str] = None,
+                 routing_stats_path: Optional[str] = None,
+                 http_pool_size: Optional[int] = None,
+                 http_keepalive: Optional[float] = None,
+                 usage_ledger_path: Optional[str] = None):
         """
         Initialize the PDF analyzer with configuration and Azure clients.
         
         Args:
-            config_path: Path to the configuration JSON file
+            config_path: Path to the configuration JSON file (defaults only; per-run
+                settings are passed to analyze_pdf)
+            artifact_dir: Optional directory of layout artifacts shared by identical documents
+            routing_stats_path: Optional file persisting per-bank model escalation counts
+            http_pool_size: Optional connection pool size of the Azure clients (SDK default if None)
+            http_keepalive: Optional seconds idle OpenAI connections are kept alive
+            usage_ledger_path: Optional ledger database for token/page usage and budgets
         """
         load_dotenv("D:/office_Work_shennanigans/hackathon/integrated_hackathon_codebase/.env")
         self.config = self._load_config(config_path)
         self.logger = self._setup_logging()
+        self.layout_store = LayoutArtifactStore(artifact_dir) if artifact_dir else None
+        self.http_pool_size = http_pool_size
+        self.http_keepalive = http_keepalive
         
-        # Initialize Azure clients
-        self.doc_intelligence_client = self._init_document_intelligence_client()
-        self.openai_client = self._init_openai_client()
+        # Azure clients are created on first use
+        self._client_lock = threading.Lock()
+        self.reset_clients()
+        self.table_extractor = create_table_extractor(lambda: self.doc_intelligence_client)
+        # Recorded remote calls (AZURE_FIXTURES_MODE=record|replay), e.g. for load tests
+        self.fixtures = fixture_store_from_env()
+        if self.fixtures is not None:
+            self.table_extractor = self.fixtures.wrap_table_extractor(self.table_extractor)
+        # Replayed calls cost nothing, so they are not charged
+        replaying = self.fixtures is not None and self.fixtures.mode == REPLAY
+        self.ledger = UsageLedger.from_env(usage_ledger_path) if usage_ledger_path and not replaying else None
+        self.router = ModelRouter.from_env(stats_path=routing_stats_path)
+        self.hedger = HedgedCaller()  # chat-call deadlines and tail-latency hedging
+        self._schema_unsupported = set()  # deployments that rejected json_schema response formats
     
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load configuration from JSON file."""
@@ -60,21 +107,64 @@ class PDFAnalyzer:
             
         return logging.getLogger(__name__)
     
-    def _init_document_intelligence_client(self) -> DocumentIntelligenceClient:
+    def reset_clients(self) -> None:
+        """Drop the Azure clients; they and their connection pools are recreated on next use."""
+        self._doc_intelligence_client = None
+        self._openai_client = None
+    
+    @property
+    def doc_intelligence_client(self) -> "DocumentIntelligenceClient":
+        """Document Intelligence client, created on the first remote layout call."""
+        if self._doc_intelligence_client is None:
+            with self._client_lock:
+                if self._doc_intelligence_client is None:
+                    self._doc_intelligence_client = self._init_document_intelligence_client()
+        return self._doc_intelligence_client
+    
+    @property
+    def openai_client(self) -> "AzureOpenAI":
+        """Azure OpenAI client, created on the first chat completion."""
+        if self._openai_client is None:
+            with self._client_lock:
+                if self._openai_client is None:
+                    self._openai_client = self._init_openai_client()
+        return self._openai_client
+    
+    def _init_document_intelligence_client(self) -> "DocumentIntelligenceClient":
         """Initialize Azure Document Intelligence client."""
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+        from azure.core.credentials import AzureKeyCredential
+        
         endpoint = os.getenv("AZURE_DOC_INTELLIGENCE_ENDPOINT")
         key = os.getenv("AZURE_DOC_INTELLIGENCE_KEY")
         
         if not endpoint or not key:
             raise ValueError("Azure Document Intelligence credentials not found in environment variables")
         
+        transport_kwargs = {}
+        if self.http_pool_size:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from azure.core.pipeline.transport import RequestsTransport
+            
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.http_pool_size, pool_maxsize=self.http_pool_size)
+            session.mount("https://", adapter)
+            transport_kwargs["transport"] = RequestsTransport(session=session, session_owner=False)
+        
         return DocumentIntelligenceClient(
             endpoint=endpoint,
-            credential=AzureKeyCredential(key)
+            credential=AzureKeyCredential(key),
+            **transport_kwargs
         )
     
-    def _init_openai_client(self) -> AzureOpenAI:
+    def _init_openai_client(self) -> "AzureOpenAI":
         """Initialize Azure OpenAI client."""
+        if self.fixtures is not None and self.fixtures.mode == REPLAY:
+            return self.fixtures.wrap_chat_client(None)
+        
+        from openai import AzureOpenAI
+        
         endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
         key = os.getenv("AZURE_OPENAI_API_KEY")
         api_version = os.getenv("AZURE_OPENAI_API_VERSION")
@@ -82,62 +172,191 @@ class PDFAnalyzer:
         if not all([endpoint, key, api_version]):
             raise ValueError("Azure OpenAI credentials not found in environment variables")
         
-        return AzureOpenAI(
+        client_kwargs = {}
+        if self.http_pool_size:
+            import httpx
+            
+            client_kwargs["http_client"] = httpx.Client(limits=httpx.Limits(
+                max_connections=self.http_pool_size,
+                max_keepalive_connections=self.http_pool_size,
+                keepalive_expiry=self.http_keepalive
+            ))
+        
+        client = AzureOpenAI(
             azure_endpoint=endpoint,
             api_key=key,
-            api_version=api_version
+            api_version=api_version,
+            **client_kwargs
         )
+        return self.fixtures.wrap_chat_client(client) if self.fixtures is not None else client
     
+    @profiled("analyze_pdf")
     def analyze_pdf(self, 
-                   pdf_path: str,
+                   pdf_path: Union[str, Sequence[str]],
                    user_prompt_path: str,
                    system_prompt_path: str,
-                   output_filename: Optional[str] = None) -> Dict[str, Any]:
+                   output_filename: Optional[str] = None,
+                   checkpoint: Optional[BankCheckpoint] = None,
+                   latest_quarter: Optional[str] = None,
+                   run_config: Optional[RunConfig] = None) -> Dict[str, Any]:
         """
         Main pipeline method to analyze PDF and extract metrics.
         
         Args:
-            pdf_path: Path to the PDF file to analyze
+            pdf_path: Path to the PDF file to analyze, or the paths of all of a bank's
+                documents (their tables are sent together in one completion)
             user_prompt_path: Path to the user prompt file
             system_prompt_path: Path to the system prompt file
             output_filename: Optional custom output filename
+            checkpoint: Optional run-journal checkpoint; completed stages are reused
+                and newly completed ones are recorded
+            latest_quarter: Quarter to analyze (defaults to run_config's, then the config file's)
+            run_config: Settings of the run this document belongs to
             
         Returns:
             Dictionary containing extracted metrics
         """
+        latest_quarter = (latest_quarter or (run_config.latest_quarter if run_config else None)
+                          or self.config.get("latest_quarter"))
+        output_filename = output_filename or self._generate_output_filename(latest_quarter)
+        pdf_paths = [pdf_path] if isinstance(pdf_path, str) else list(pdf_path)
+        bank = Path(pdf_paths[0]).parent.name
+        manifest = RunManifest(pdf_path=pdf_path if isinstance(pdf_path, str) else pdf_paths,
+                               output=output_filename, quarter=latest_quarter, bank=bank,
+                               run_id=run_config.extra.get("run_id") if run_config else None)
         try:
-            self.logger.info(f"Starting PDF analysis for: {pdf_path}")
-            
-            # Load prompts
-            user_prompt = self._load_prompt_file(user_prompt_path)
-            system_prompt = self._load_prompt_file(system_prompt_path)
-            
-            # Process system prompt with quarter information
-            system_prompt = self._inject_prompt_variables(system_prompt)
-            
-            # Extract tables from PDF
-            self.logger.info("Extracting tables from PDF...")
-            result = self._extract_tables_from_pdf(pdf_path)
-            
-            # Convert tables to markdown
-            self.logger.info("Converting tables to markdown...")
-            markdown_output = self._generate_markdown_from_tables(result)
-            
-            # Process with OpenAI
-            self.logger.info("Processing with Azure OpenAI...")
-            response_content = self._process_with_openai(system_prompt, user_prompt, markdown_output)
-            
-            # Parse and save results
-            metrics_json = self._parse_response(response_content)
-            output_path = self._save_results(metrics_json, output_filename or self._generate_output_filename())
+            with manifest:
+                self.logger.info(f"Starting PDF analysis for: {', '.join(pdf_paths)}")
+                
+                # Load prompts
+                with stage("prompt_load"):
+                    user_prompt = self._load_prompt_file(user_prompt_path)
+                    system_prompt = self._load_prompt_file(system_prompt_path)
+                    
+                    # Process system prompt with quarter information
+                    system_prompt = self._inject_prompt_variables(system_prompt, latest_quarter)
+                
+                for path in pdf_paths:
+                    if not os.path.exists(path):
+                        raise FileNotFoundError(f"PDF file not found: {path}")
+                
+                # Refuse new remote work once the run's or the day's budget is used up
+                if self.ledger is not None:
+                    self.ledger.check()
+                
+                # Record what this result is built from, for incremental rebuilds
+                inputs = input_fingerprint(
+                    pdf_paths, user_prompt_path, system_prompt_path,
+                    latest_quarter, self.router.fingerprint()
+                )
+                manifest.context["inputs"] = inputs
+                if checkpoint is not None:
+                    checkpoint.bind_inputs(inputs)
+                
+                markdown_output = self._get_documents_markdown(pdf_paths, checkpoint)
+                
+                quarters = self.compute_past_5_quarters(latest_quarter)
+                completion = checkpoint.load("completion") if checkpoint else None
+                if isinstance(completion, str):  # checkpoints written before the deployment was kept
+                    completion = {"content": completion, "deployment": None}
+                if completion is not None:
+                    self.logger.info("Reusing checkpointed completion")
+                    record("checkpoint_hits", stage="completion")
+                    response_content, deployment = completion["content"], completion["deployment"]
+                else:
+                    # Process with OpenAI, escalating to the stronger deployment if needed
+                    self.logger.info("Processing with Azure OpenAI...")
+                    schema = response_schema(quarters)
+                    with stage("chat_completion"):
+                        response_content, deployment, _ = self.router.complete(
+                            lambda name: self._process_with_openai(system_prompt, user_prompt, markdown_output,
+                                                                   name, schema),
+                            lambda content: validate_metrics(self._parse_response(content), quarters),
+                            bank=bank,
+                        )
+                    if checkpoint is not None:
+                        checkpoint.save("completion", {"content": response_content, "deployment": deployment})
+                # The deployment the router actually chose is part of what the result is built from
+                manifest.context["deployment"] = deployment
+                manifest.context["inputs"] = {**inputs, "deployment": deployment}
+                
+                metrics_json = self._parse_response(response_content)
+                issues = validate_metrics(metrics_json, quarters)
+                if not is_acceptable(issues):
+                    with stage("repair"):
+                        metrics_json = self._repair_result(metrics_json, issues, quarters,
+                                                           system_prompt, user_prompt, markdown_output)
+                
+                # Save results
+                with stage("result_save"):
+                    output_path = self._save_results(metrics_json, output_filename)
             
+            manifest.write(output_path)
+            if checkpoint is not None:
+                checkpoint.save("done", output_path)
             self.logger.info(f"Analysis completed successfully. Results saved to: {output_path}")
             return metrics_json
             
         except Exception as e:
             self.logger.error(f"Error during PDF analysis: {str(e)}")
+            manifest.write(output_filename)  # to <name>.failed.manifest.json; the last good one is kept
             raise
     
+    def _get_documents_markdown(self, pdf_paths: List[str],
+                                checkpoint: Optional[BankCheckpoint] = None) -> str:
+        """
+        Markdown tables of a bank's documents, reusing the run checkpoint if there is one.
+        Several documents are concatenated, each under a heading with its file name.
+        """
+        markdown_output = checkpoint.load("layout") if checkpoint else None
+        if markdown_output is not None:
+            self.logger.info("Reusing checkpointed layout tables")
+            record("checkpoint_hits", stage="layout")
+            return markdown_output
+        
+        if len(pdf_paths) == 1:
+            markdown_output = self._get_layout_markdown(pdf_paths[0], file_sha256(pdf_paths[0]))
+        else:
+            markdown_output = "\n\n".join(
+                f"## Document: {os.path.basename(path)}\n\n{self._get_layout_markdown(path, file_sha256(path))}"
+                for path in pdf_paths
+            )
+        
+        if checkpoint is not None:
+            checkpoint.save("layout", markdown_output)
+        return markdown_output
+    
+    def _get_layout_markdown(self, pdf_path: str, document_hash: str) -> str:
+        """
+        Markdown tables for a PDF, generated from the stored tables of any byte-identical
+        document and only otherwise from a new extraction.
+        """
+        result = None
+        if self.layout_store is not None:
+            result = self.layout_store.get(document_hash, self.table_extractor.name)
+            if result is not None:
+                self.logger.info(f"Reusing layout of identical document {document_hash[:12]}")
+                record("cache_hits", cache="layout")
+        
+        if result is None:
+            # Reject the upload before dispatch if its pages would exceed a page budget
+            if self.ledger is not None and self.table_extractor.name != "local":
+                self.ledger.check(pages=cataloged_page_count(pdf_path) or 0)
+            
+            # Extract tables from PDF
+            self.logger.info("Extracting tables from PDF...")
+            with track_memory("analyze_result"):
+                result = self._extract_tables_from_pdf(pdf_path)
+            if self.layout_store is not None:
+                self.layout_store.put(document_hash, self.table_extractor.name, result)
+        
+        # Convert tables to markdown
+        self.logger.info("Converting tables to markdown...")
+        with stage("markdown_generation"):
+            markdown_output = self._generate_markdown_from_tables(result)
+        del result
+        return markdown_output
+    
     def _load_prompt_file(self, prompt_path: str) -> str:
         """Load prompt from file."""
         try:
@@ -146,18 +365,20 @@ class PDFAnalyzer:
         except FileNotFoundError:
             raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
     
-    def _extract_tables_from_pdf(self, pdf_path: str) -> AnalyzeResult:
-        """Extract tables from PDF using Azure Document Intelligence."""
+    def _extract_tables_from_pdf(self, pdf_path: str) -> ExtractedLayout:
+        """Extract tables from PDF with the configured backend (local text layer or Document Intelligence)."""
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"PDF file not found: {pdf_path}")
         
-        with open(pdf_path, "rb") as f:
-            poller = self.doc_intelligence_client.begin_analyze_document(
-                "prebuilt-layout", body=f
-            )
-            result = poller.result()
+        result = self.table_extractor.extract(pdf_path)
+        if self.ledger is not None and result.billed_pages:
+            self.ledger.charge(pages=result.billed_pages, stage="layout")
         
-        self.logger.info(f"Extracted {len(result.tables)} tables from PDF")
+        record("tables_extracted", len(result.tables), backend=result.backend)
+        record("table_cells", sum(table.cell_count for table in result.tables))
+        self.logger.info(
+            f"Extracted {len(result.tables)} tables from PDF ({result.backend}, confidence {result.confidence:.2f})"
+        )
         
         # Log table information
         for table_idx, table in enumerate(result.tables):
@@ -167,75 +388,220 @@ class PDFAnalyzer:
         
         return result
     
-    def _generate_markdown_from_tables(self, result: AnalyzeResult) -> str:
+    @profiled("generate_markdown")
+    def _generate_markdown_from_tables(self, result: ExtractedLayout) -> str:
         """Convert extracted tables to markdown format."""
         markdown_tables = []
 
         for table_idx, table in enumerate(result.tables):
-            # Initialize a 2D list to hold cell contents
-            table_matrix = [["" for _ in range(table.column_count)] for _ in range(table.row_count)]
+            rows = list(table.rows())
 
-            # Fill the matrix with content
-            for cell in table.cells:
-                row = cell.row_index
-                col = cell.column_index
-                table_matrix[row][col] = cell.content.strip()
-
-            # Convert matrix to markdown
-            header = "| " + " | ".join(table_matrix[0]) + " |"
+            # Convert grid to markdown
+            header = "| " + " | ".join(rows[0]) + " |"
             separator = "| " + " | ".join(["---"] * table.column_count) + " |"
-            rows = ["| " + " | ".join(row) + " |" for row in table_matrix[1:]]
+            body = ["| " + " | ".join(row) + " |" for row in rows[1:]]
 
-            markdown = f"### Table {table_idx + 1}\n\n" + "\n".join([header, separator] + rows)
+            markdown = f"### Table {table_idx + 1}\n\n" + "\n".join([header, separator] + body)
             markdown_tables.append(markdown)
 
         return "\n\n".join(markdown_tables)
     
-    def _process_with_openai(self, system_prompt: str, user_prompt: str, document_text: str) -> str:
-        """Process the document with Azure OpenAI."""
-        deployment_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-        if not deployment_name:
-            raise ValueError("Azure OpenAI deployment name not found in environment variables")
+    def _process_with_openai(self, system_prompt: str, user_prompt: str, document_text: str,
+                             deployment_name: Optional[str] = None,
+                             response_schema: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Process the document with Azure OpenAI.
+        
+        ``max_tokens`` is sized from the response schema (see ``token_budget``) instead of a
+        fixed reservation; a response truncated at the cap is retried with a larger one.
+        
+        Args:
+            system_prompt: Prepared system prompt
+            user_prompt: User prompt
+            document_text: Markdown tables sent with the prompt
+            deployment_name: Deployment to use (default: the strongest routed deployment)
+            response_schema: Optional JSON schema the response is constrained to. Deployments
+                that do not support structured outputs fall back to plain JSON mode.
+        """
+        deployment_name = deployment_name or self.router.strong_deployment
         
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"{user_prompt}\n\nDocument Text:\n{document_text}"}
         ]
+        max_tokens = completion_cap(response_schema)
+        if self.ledger is not None:
+            self.ledger.check(tokens=estimate_prompt_tokens(messages, response_schema) + max_tokens)
         
-        response = self.openai_client.chat.completions.create(
-            model=deployment_name,
-            messages=messages,
-            max_tokens=4000,
-            temperature=0  # Low temperature for factual analysis
-        )
+        stage_name = current_stage() or "chat_completion"
+        deadline = stage_deadline(stage_name)
+        while True:
+            record("max_tokens_reserved", max_tokens, deployment=deployment_name)
+            request = dict(
+                model=deployment_name,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0  # Low temperature for factual analysis
+            )
+            # A call slower than the stage's p95 may be hedged; the losing attempt's usage is still charged
+            response = get_breaker("openai").call(lambda: self.hedger.call(
+                stage_name,
+                lambda: self._create_completion(request, response_schema),
+                deadline=deadline,
+                on_discard=lambda discarded: self._record_usage(discarded, deployment_name, hedge=True)
+            ))
+            self._record_usage(response, deployment_name)
+            
+            if response.choices[0].finish_reason != "length":
+                break
+            larger = next_cap(max_tokens)
+            if larger is None:
+                self.logger.warning(f"Completion truncated at the maximum of {max_tokens} tokens")
+                break
+            self.logger.info(f"Completion truncated at {max_tokens} tokens, retrying with {larger}")
+            record("truncation_retries", deployment=deployment_name)
+            max_tokens = larger
         
         return response.choices[0].message.content
     
+    def _record_usage(self, response: Any, deployment_name: str, hedge: bool = False) -> None:
+        """Count a completion's tokens in the metrics and the usage ledger."""
+        if response.usage is None:
+            return
+        record("prompt_tokens", response.usage.prompt_tokens, deployment=deployment_name)
+        record("completion_tokens", response.usage.completion_tokens, deployment=deployment_name)
+        if self.ledger is not None:
+            extra = {"stage": f"{current_stage() or 'chat_completion'}_hedge"} if hedge else {}
+            self.ledger.charge(response.usage.prompt_tokens, response.usage.completion_tokens,
+                               deployment=deployment_name, **extra)
+    
+    def _create_completion(self, request: Dict[str, Any], response_schema: Optional[Dict[str, Any]]) -> Any:
+        """
+        One chat completion within what is left of the stage deadline.
+        
+        The SDK's own retries would each restart the full timeout, so under a deadline the
+        client gets the remaining time as its timeout and no retries; failed attempts are
+        retried here instead, only while the deadline leaves room for the backoff.
+        """
+        stage_name = current_stage() or "chat_completion"
+        retries = 0
+        while True:
+            remaining = remaining_seconds()
+            client = self.openai_client
+            if remaining is not None:
+                if remaining <= 0:  # an abandoned attempt: do not start (and pay for) another call
+                    raise DeadlineExceeded(stage_name, stage_deadline(stage_name))
+                client = client.with_options(timeout=remaining, max_retries=0)
+            try:
+                return self._create_completion_once(client, request, response_schema)
+            except Exception as e:
+                backoff = RETRY_BACKOFF_SECONDS * 2 ** retries
+                if (remaining is None or retries >= DEADLINE_MAX_RETRIES or not is_service_failure(e)
+                        or remaining_seconds() <= backoff):
+                    raise
+                self.logger.info(f"Chat completion failed ({e}), retrying in {backoff:g}s")
+                record("chat_retries", deployment=request["model"])
+                time.sleep(backoff)
+                retries += 1
+    
+    def _create_completion_once(self, client: Any, request: Dict[str, Any],
+                                response_schema: Optional[Dict[str, Any]]) -> Any:
+        """One chat completion, constrained to ``response_schema`` where the deployment supports it."""
+        try:
+            from openai import BadRequestError
+        except ImportError:  # replayed fixtures need no SDK
+            BadRequestError = ()
+        
+        deployment_name = request["model"]
+        if response_schema is not None and deployment_name not in self._schema_unsupported:
+            try:
+                return client.chat.completions.create(
+                    **request,
+                    response_format={
+                        "type": "json_schema",
+                        "json_schema": {"name": "bank_metrics", "strict": True, "schema": response_schema}
+                    }
+                )
+            except BadRequestError as e:
+                if "response_format" not in str(e) and "json_schema" not in str(e):
+                    raise
+                self.logger.warning(f"{deployment_name} does not support structured outputs, using JSON mode: {e}")
+                self._schema_unsupported.add(deployment_name)
+        json_mode = {"response_format": {"type": "json_object"}} if response_schema is not None else {}
+        return client.chat.completions.create(**request, **json_mode)
+    
     def _parse_response(self, response_content: str) -> Dict[str, Any]:
-        """Parse the OpenAI response as JSON."""
+        """Parse the OpenAI response as JSON, salvaging what it can from malformed output."""
         try:
             return json.loads(response_content)
         except json.JSONDecodeError:
+            salvaged = salvage_json(response_content)
+            if salvaged is not None:
+                self.logger.warning("Response was not valid JSON. Salvaged the parseable part.")
+                return salvaged
             self.logger.warning("Response was not valid JSON. Saving raw content.")
             return {"raw_output": response_content}
     
+    def _repair_result(self, metrics_json: Dict[str, Any], issues: List[Dict[str, Any]],
+                       quarters: List[str], system_prompt: str, user_prompt: str,
+                       markdown_output: str) -> Dict[str, Any]:
+        """
+        Re-extract only the cells that failed validation, from the tables relevant to them.
+        
+        Args:
+            metrics_json: Parsed result (possibly salvaged or raw_output)
+            issues: Validation issues of metrics_json
+            quarters: Expected quarter keys
+            system_prompt: Prepared system prompt
+            user_prompt: Bank-specific user prompt
+            markdown_output: Markdown tables of the whole document
+            
+        Returns:
+            The result with valid repaired values merged in
+        """
+        result = {} if "raw_output" in metrics_json else metrics_json
+        cells = cells_to_repair(issues, quarters)
+        metrics = sorted({metric for _, metric, _ in cells})
+        tables = relevant_tables(markdown_output, metrics)
+        self.logger.info(
+            f"Repairing {len(cells)} cell(s) ({summarize_issues(issues)}) "
+            f"with {len(tables)}/{len(markdown_output)} chars of tables"
+        )
+        record("repair_requests")
+        
+        prompt = f"{user_prompt}\n\n{build_repair_prompt(cells, result)}"
+        try:
+            schema = metrics_json_schema(requested_structure(cells))
+            repair = self._parse_response(self._process_with_openai(system_prompt, prompt, tables, response_schema=schema))
+        except Exception as e:
+            self.logger.warning(f"Repair request failed, keeping the unrepaired result: {e}")
+            return metrics_json
+        
+        repaired = merge_repair(result, repair, cells)
+        record("repaired_cells", repaired)
+        if not repaired:
+            return metrics_json
+        remaining = validate_metrics(result, quarters)
+        self.logger.info(f"Repaired {repaired}/{len(cells)} cell(s); remaining: {summarize_issues(remaining)}")
+        return result
+    
     def _save_results(self, metrics_json: Dict[str, Any], output_filename: str) -> str:
-        """Save results to JSON file."""
+        """Save results to JSON file (temp file + rename, never truncated)."""
         output_path = Path(output_filename)
         
-        with open(output_path, "w") as f:
-            json.dump(metrics_json, f, indent=2)
+        ensure_results_subdirs(str(output_path))
+        atomic_write_json(str(output_path), metrics_json)
         
         return str(output_path)
     
-    def _generate_output_filename(self) -> str:
-        """Generate output filename based on configuration."""
-        latest_quarter = self.config.get("latest_quarter", "unknown")
+    def _generate_output_filename(self, latest_quarter: Optional[str] = None) -> str:
+        """Generate output filename based on the run's quarter."""
+        latest_quarter = latest_quarter or self.config.get("latest_quarter", "unknown")
         return f"output_metrics_{latest_quarter}.json"
     
-    def _inject_prompt_variables(self, base_prompt: str) -> str:
+    def _inject_prompt_variables(self, base_prompt: str, latest_quarter: Optional[str] = None) -> str:
         """Inject quarter variables into the prompt."""
-        latest_quarter = self.config.get("latest_quarter")
+        latest_quarter = latest_quarter or self.config.get("latest_quarter")
         if not latest_quarter:
             raise ValueError("latest_quarter not found in configuration")
         
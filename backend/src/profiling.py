@@ -0,0 +1,235 @@
+"""
+Opt-in CPU and memory profiling for pipeline runs.
+
+Profiling is off unless a ``profiling_session`` is active (``main.py --profile`` or the
+``X-Profile: 1`` request header on the API). Inside a session, functions wrapped with
+``@profiled(name)`` are profiled with cProfile and tracemalloc: the outermost profiled
+call writes a ``.prof`` file and a text report to the profiles directory and logs a
+top-N summary, while nested profiled calls (and ``track_memory`` blocks) add their
+elapsed time and memory deltas to that report.
+
+cProfile only sees the thread that enabled it. Work a profiled call hands to pool
+threads (hedged chat calls) is profiled with ``profile_worker_thread`` and merged into
+the caller's CPU profile; tracemalloc already covers every thread.
+"""
+
+import io
+import os
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+TRACEMALLOC_FRAMES = 10
+DEFAULT_TOP_N = 15
+
+logger = logging.getLogger(__name__)
+
+_session: contextvars.ContextVar = contextvars.ContextVar("profiling_session", default=None)
+_active_report: contextvars.ContextVar = contextvars.ContextVar("active_profile_report", default=None)
+
+# cProfile and tracemalloc are process-wide; only one profiled region runs at a time
+_profile_lock = threading.Lock()
+
+
+class ProfileSession:
+    """Where and how much to report for profiled calls."""
+
+    def __init__(self, profile_dir: str, top_n: int = DEFAULT_TOP_N):
+        self.profile_dir = Path(profile_dir)
+        self.top_n = top_n
+
+
+class _ProfileReport:
+    """Nested regions recorded while an outermost profiled call is running."""
+
+    def __init__(self):
+        self.regions: List[Dict[str, Any]] = []
+        # Nested regions reset the tracemalloc peak, so the overall peak is tracked here
+        self.peak_bytes = 0
+        # Profiles of work done on other threads on behalf of the profiled call
+        self.thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_thread_profile(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self.thread_profiles.append(profiler)
+
+
+@contextmanager
+def profiling_session(profile_dir: str, top_n: int = DEFAULT_TOP_N):
+    """Enable ``@profiled`` / ``track_memory`` hooks for the enclosed code."""
+    token = _session.set(ProfileSession(profile_dir, top_n))
+    try:
+        yield
+    finally:
+        _session.reset(token)
+
+
+def profiling_enabled() -> bool:
+    return _session.get() is not None
+
+
+@contextmanager
+def track_memory(name: str):
+    """
+    Record elapsed time plus net and peak traced memory of a block.
+
+    The net figure is what the block still holds afterwards (e.g. a retained
+    ``AnalyzeResult``). No-op unless a profiled call is active.
+    """
+    report = _active_report.get()
+    if report is None or not tracemalloc.is_tracing():
+        yield
+        return
+
+    current_before, peak_before = tracemalloc.get_traced_memory()
+    report.peak_bytes = max(report.peak_bytes, peak_before)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_after, peak = tracemalloc.get_traced_memory()
+        report.peak_bytes = max(report.peak_bytes, peak)
+        report.regions.append({
+            "name": name,
+            "seconds": time.perf_counter() - start,
+            "net_bytes": current_after - current_before,
+            "peak_bytes": peak - current_before,
+        })
+
+
+@contextmanager
+def profile_worker_thread():
+    """
+    Profile a block running on a worker thread on behalf of the active profiled call.
+
+    The block must run in a copy of the caller's context (``contextvars.copy_context``).
+    No-op outside a profiled call.
+    """
+    report = _active_report.get()
+    if report is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler already active on this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        report.add_thread_profile(profiler)
+
+
+def profiled(name: str):
+    """Decorator profiling a function call when a profiling session is active."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _session.get()
+            if session is None:
+                return func(*args, **kwargs)
+            if _active_report.get() is not None:
+                with track_memory(name):
+                    return func(*args, **kwargs)
+            return _run_profiled(session, name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _run_profiled(session: ProfileSession, name: str, func, args, kwargs):
+    with _profile_lock:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        report = _ProfileReport()
+        token = _active_report.set(report)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            elapsed = time.perf_counter() - start
+            _active_report.reset(token)
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, report.peak_bytes)
+            snapshot_after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                _write_report(session, name, elapsed, current, peak, profiler,
+                              snapshot_before, snapshot_after, report)
+            except OSError as e:
+                logger.warning(f"Could not write profile for {name}: {e}")
+
+
+def _write_report(session: ProfileSession, name: str, elapsed: float, current: int, peak: int,
+                  profiler: cProfile.Profile, snapshot_before, snapshot_after,
+                  report: _ProfileReport) -> Optional[str]:
+    """Dump the cProfile stats and a text summary; log the top-N summary."""
+    session.profile_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{name}_{os.getpid()}_{threading.get_ident()}"
+    prof_path = session.profile_dir / f"{stem}.prof"
+    # The calling thread plus the worker threads that ran on its behalf
+    with report._lock:
+        thread_profiles = list(report.thread_profiles)
+    stats_stream = io.StringIO()
+    stats = pstats.Stats(profiler, *thread_profiles, stream=stats_stream)
+    stats.dump_stats(str(prof_path))
+    stats.sort_stats("cumulative").print_stats(session.top_n)
+
+    lines = [
+        f"Profile: {name}",
+        f"Elapsed: {elapsed:.3f}s",
+        f"Worker threads profiled: {len(thread_profiles)}",
+        f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB",
+        "",
+        "Nested regions:",
+    ]
+    for region in report.regions:
+        lines.append(
+            f"  {region['name']}: {region['seconds']:.3f}s, "
+            f"held {region['net_bytes'] / 1024 / 1024:+.1f} MiB, "
+            f"peak {region['peak_bytes'] / 1024 / 1024:.1f} MiB"
+        )
+    lines += ["", f"Top {session.top_n} allocation sites (growth during call):"]
+    for stat in snapshot_after.compare_to(snapshot_before, "lineno")[:session.top_n]:
+        lines.append(f"  {stat}")
+    lines += ["", "CPU profile (cumulative):", stats_stream.getvalue()]
+
+    txt_path = session.profile_dir / f"{stem}.txt"
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+    # Short summary in the logs; the full report is on disk
+    logger.info(f"Profile {name}: {elapsed:.2f}s, peak {peak / 1024 / 1024:.1f} MiB -> {txt_path}")
+    for region in report.regions:
+        logger.info(
+            f"  {region['name']}: {region['seconds']:.2f}s, "
+            f"held {region['net_bytes'] / 1024 / 1024:+.1f} MiB, peak {region['peak_bytes'] / 1024 / 1024:.1f} MiB"
+        )
+    top_functions = pstats.Stats(profiler, *thread_profiles).sort_stats("cumulative")
+    for func_key in top_functions.fcn_list[:session.top_n]:
+        filename, lineno, func_name = func_key
+        cumulative = top_functions.stats[func_key][3]
+        logger.info(f"  {cumulative:8.3f}s  {func_name} ({os.path.basename(filename)}:{lineno})")
+    return str(txt_path)
@@ -0,0 +1,236 @@
+"""
+Targeted repair of incomplete model output.
+
+Instead of re-running a whole document when a completion is malformed or some cells are
+missing or implausible, the repair stage:
+
+1. salvages whatever valid JSON the completion contains (``salvage_json``),
+2. lists the metric/quarter cells that still fail validation (``cells_to_repair``),
+3. selects only the layout tables relevant to those metrics (``relevant_tables``) and
+   asks for just those cells (``build_repair_prompt``),
+4. merges the valid answers back into the result (``merge_repair``).
+"""
+
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_validation import EXPECTED_METRICS, METRIC_RANGES, BLOCKING_ISSUES, parse_metric_value
+
+
+# Table keywords per metric; computed metrics use the keywords of their inputs
+METRIC_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "30+ Delinquency Rate (%)": ("delinquen", "30+", "30 days", "past due"),
+    "90+ Delinquency Rate (%)": ("delinquen", "90+", "90 days", "past due"),
+    "Net Credit Loss ($ in millions)": ("net charge-off", "net credit loss", "charge-offs"),
+    "Net Credit Loss Rate (%)": ("net charge-off", "net credit loss", "charge-off rate"),
+    "Outstanding Balance ($ in millions)": ("credit card loans", "loans", "receivables", "outstanding"),
+    "Loss Reserve ($ in millions)": ("allowance", "reserve"),
+    "Coverage Ratio (%)": ("allowance", "reserve", "credit card loans", "loans"),
+    "Net Credit Loss Coverage": ("allowance", "reserve", "net charge-off", "net credit loss"),
+    "Loan Loss Reserve ($ in millions)": ("allowance", "reserve"),
+    "Impairment Charge ($ in millions)": ("allowance", "reserve", "net charge-off", "net credit loss"),
+}
+
+MAX_REPAIR_TABLES = 6
+# Cut points tried (latest first) when closing a truncated JSON object
+MAX_TRUNCATION_CANDIDATES = 50
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TABLE_SPLIT_RE = re.compile(r"(?=^### Table \d+)", re.MULTILINE)
+
+
+def salvage_json(content: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort parse of a completion that should be a JSON object.
+
+    Handles markdown fences, prose around the object, truncated output (closed at the last
+    complete value) and, as a last resort, individual metric objects found in the text.
+
+    Returns:
+        The recovered object, or None if nothing usable was found
+    """
+    text = _FENCE_RE.sub("", (content or "").strip())
+    try:
+        parsed = json.loads(text)
+        return parsed if isinstance(parsed, dict) else None
+    except json.JSONDecodeError:
+        pass
+
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    try:
+        return json.JSONDecoder().raw_decode(text)[0]
+    except json.JSONDecodeError:
+        pass
+
+    closed = _close_truncated(text)
+    if closed is not None:
+        return closed
+
+    fragments: Dict[str, Any] = {}
+    for category, metric_names in EXPECTED_METRICS.items():
+        for metric in metric_names:
+            match = re.search(re.escape(json.dumps(metric)) + r"\s*:\s*(\{[^{}]*\})", text)
+            if match:
+                try:
+                    fragments.setdefault(category, {})[metric] = json.loads(match.group(1))
+                except json.JSONDecodeError:
+                    continue
+    return fragments or None
+
+
+def _close_truncated(text: str) -> Optional[Dict[str, Any]]:
+    """Cut a truncated JSON object back to its last complete member and close it."""
+    candidates = []  # (cut position, open brackets at that point)
+    stack: List[str] = []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if not stack:
+                break
+            stack.pop()
+            candidates.append((i + 1, tuple(stack)))
+        elif char == ",":
+            candidates.append((i, tuple(stack)))
+
+    for cut, open_brackets in reversed(candidates[-MAX_TRUNCATION_CANDIDATES:]):
+        try:
+            parsed = json.loads(text[:cut] + "".join(reversed(open_brackets)))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def cells_to_repair(issues: List[Dict[str, Any]], quarters: List[str]) -> List[Tuple[str, str, str]]:
+    """(category, metric, quarter) cells behind the blocking issues, in schema order."""
+    wanted = set()
+    for issue in issues:
+        if issue["kind"] not in BLOCKING_ISSUES:
+            continue
+        categories = [issue["category"]] if issue["category"] else list(EXPECTED_METRICS)
+        for category in categories:
+            metrics = [issue["metric"]] if issue["metric"] else EXPECTED_METRICS[category]
+            for metric in metrics:
+                for quarter in ([issue["quarter"]] if issue["quarter"] else quarters):
+                    wanted.add((category, metric, quarter))
+    return [
+        (category, metric, quarter)
+        for category, metric_names in EXPECTED_METRICS.items()
+        for metric in metric_names
+        for quarter in quarters
+        if (category, metric, quarter) in wanted
+    ]
+
+
+def relevant_tables(markdown: str, metrics: List[str], max_tables: int = MAX_REPAIR_TABLES) -> str:
+    """
+    The markdown tables most likely to hold the given metrics.
+
+    Args:
+        markdown: Layout markdown (``### Table N`` blocks)
+        metrics: Metric names to look for
+        max_tables: Maximum number of tables to keep
+
+    Returns:
+        The selected tables in document order (all tables if none match)
+    """
+    tables = [block.strip() for block in _TABLE_SPLIT_RE.split(markdown) if block.strip()]
+    keywords = {kw for metric in metrics for kw in METRIC_KEYWORDS.get(metric, ())}
+    scored = []
+    for position, table in enumerate(tables):
+        lowered = table.lower()
+        score = sum(lowered.count(kw) for kw in keywords)
+        if score:
+            scored.append((score, position))
+    if not scored:
+        return markdown
+    keep = sorted(position for _, position in sorted(scored, reverse=True)[:max_tables])
+    return "\n\n".join(tables[position] for position in keep)
+
+
+def requested_structure(cells: List[Tuple[str, str, str]]) -> Dict[str, Dict[str, List[str]]]:
+    """{category: {metric: [quarter, ...]}} of the given cells (see ``metrics_json_schema``)."""
+    structure: Dict[str, Dict[str, List[str]]] = {}
+    for category, metric, quarter in cells:
+        structure.setdefault(category, {}).setdefault(metric, []).append(quarter)
+    return structure
+
+
+def build_repair_prompt(cells: List[Tuple[str, str, str]], current: Dict[str, Any]) -> str:
+    """
+    Instructions asking for only the given cells.
+
+    Args:
+        cells: (category, metric, quarter) cells to extract again
+        current: Result so far; its valid values are given as context for computed metrics
+    """
+    requested = {
+        category: {metric: {quarter: "" for quarter in quarters} for metric, quarters in metrics.items()}
+        for category, metrics in requested_structure(cells).items()
+    }
+    known = {
+        category: {metric: values for metric, values in section.items() if isinstance(values, dict)}
+        for category, section in current.items() if category in EXPECTED_METRICS and isinstance(section, dict)
+    }
+    return (
+        "A previous extraction from these tables left some values missing or implausible.\n"
+        "Extract only the values below; return JSON with exactly this structure:\n"
+        f"{json.dumps(requested)}\n\n"
+        "Values already extracted (use them as inputs for computed metrics):\n"
+        f"{json.dumps(known)}"
+    )
+
+
+def merge_repair(result: Dict[str, Any], repair: Optional[Dict[str, Any]],
+                 cells: List[Tuple[str, str, str]]) -> int:
+    """
+    Copy valid repaired values into ``result`` (in place).
+
+    Only the requested cells are taken, and only if they parse and lie in range.
+
+    Returns:
+        Number of cells repaired
+    """
+    if not isinstance(repair, dict):
+        return 0
+    repaired = 0
+    for category, metric, quarter in cells:
+        section = repair.get(category)
+        if not isinstance(section, dict):  # malformed output, e.g. a category given as a list
+            continue
+        values = section.get(metric)
+        if not isinstance(values, dict) or quarter not in values:
+            continue
+        try:
+            number = parse_metric_value(values[quarter])
+        except ValueError:
+            continue
+        low, high = METRIC_RANGES.get(metric, (None, None))
+        if number is None or (low is not None and number < low) or (high is not None and number > high):
+            continue
+        section = result.get(category)
+        if not isinstance(section, dict):
+            section = result[category] = {}
+        if not isinstance(section.get(metric), dict):
+            section[metric] = {}
+        section[metric][quarter] = values[quarter]
+        # Keep quarters in chronological order ("Q12025" -> (2025, 1))
+        section[metric] = dict(sorted(section[metric].items(), key=lambda item: (item[0][2:], item[0][:2])))
+        repaired += 1
+    return repaired
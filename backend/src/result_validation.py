@@ -0,0 +1,169 @@
+"""
+Validation of extracted metrics against the expected schema and sanity ranges.
+
+The expected structure mirrors ``prompts/System_prompt/system_prompt2.txt``: a
+``metrics`` and a ``computed_metrics`` section, each metric keyed by the five quarters
+returned by ``PDFAnalyzer.compute_past_5_quarters``. Values are strings such as
+"4.52%", "$1,588" or "-$101"; "Null" or "" marks a missing value.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+EXPECTED_METRICS: Dict[str, List[str]] = {
+    "metrics": [
+        "30+ Delinquency Rate (%)",
+        "90+ Delinquency Rate (%)",
+        "Net Credit Loss ($ in millions)",
+        "Net Credit Loss Rate (%)",
+        "Outstanding Balance ($ in millions)",
+        "Loss Reserve ($ in millions)",
+    ],
+    "computed_metrics": [
+        "Coverage Ratio (%)",
+        "Net Credit Loss Coverage",
+        "Loan Loss Reserve ($ in millions)",
+        "Impairment Charge ($ in millions)",
+    ],
+}
+
+# Plausible (min, max) per metric; None means unbounded on that side
+METRIC_RANGES: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "30+ Delinquency Rate (%)": (0, 25),
+    "90+ Delinquency Rate (%)": (0, 15),
+    "Net Credit Loss ($ in millions)": (0, None),
+    "Net Credit Loss Rate (%)": (0, 25),
+    "Outstanding Balance ($ in millions)": (0, None),
+    "Loss Reserve ($ in millions)": (0, None),
+    "Coverage Ratio (%)": (0, 40),
+    "Net Credit Loss Coverage": (0, 100),
+    "Loan Loss Reserve ($ in millions)": (None, None),
+    "Impairment Charge ($ in millions)": (None, None),
+}
+
+MISSING_VALUES = ("", "null", "none", "n/a", "-")
+
+# Issue kinds that make a result unacceptable. Missing computed metrics are tolerated:
+# they are legitimately "Null" when an input quarter is missing (e.g. the oldest quarter).
+BLOCKING_ISSUES = ("structure", "unparseable", "out_of_range", "missing")
+
+
+def metrics_json_schema(structure: Dict[str, Dict[str, List[str]]]) -> Dict[str, Any]:
+    """
+    Strict JSON schema for a response of the given shape.
+
+    Args:
+        structure: {category: {metric: [quarter, ...]}}
+
+    Returns:
+        Schema requiring exactly these categories, metrics and quarters, all string values
+    """
+    def strict_object(properties: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+            "additionalProperties": False,
+        }
+
+    return strict_object({
+        category: strict_object({
+            metric: strict_object({quarter: {"type": "string"} for quarter in quarters})
+            for metric, quarters in metrics.items()
+        })
+        for category, metrics in structure.items()
+    })
+
+
+def response_schema(quarters: List[str]) -> Dict[str, Any]:
+    """Schema of a full extraction: every expected metric for every quarter."""
+    return metrics_json_schema({
+        category: {metric: quarters for metric in metric_names}
+        for category, metric_names in EXPECTED_METRICS.items()
+    })
+
+
+def parse_metric_value(value: Any) -> Optional[float]:
+    """
+    Numeric value of a metric cell.
+
+    Returns:
+        The number, or None for a missing value
+    Raises:
+        ValueError: if the cell is neither missing nor numeric
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError(f"Unexpected value type: {type(value).__name__}")
+    cleaned = value.strip()
+    if cleaned.lower() in MISSING_VALUES:
+        return None
+    negative = cleaned.startswith("-") or (cleaned.startswith("(") and cleaned.endswith(")"))
+    cleaned = cleaned.strip("-()").replace("$", "").replace(",", "").replace("%", "").strip()
+    number = float(cleaned)
+    return -number if negative else number
+
+
+def validate_metrics(result: Dict[str, Any], quarters: List[str]) -> List[Dict[str, Any]]:
+    """
+    Check a parsed model response against the expected metrics, quarters and ranges.
+
+    Args:
+        result: Parsed JSON response
+        quarters: Expected quarter keys (compute_past_5_quarters)
+
+    Returns:
+        List of issues; each has "kind" (structure, missing, unparseable, out_of_range),
+        "category", "metric", "quarter" and "value" (where applicable). Empty if valid.
+    """
+    if not isinstance(result, dict) or "raw_output" in result:
+        return [{"kind": "structure", "category": None, "metric": None, "quarter": None,
+                 "value": None, "detail": "response is not a JSON object"}]
+
+    issues = []
+    for category, metric_names in EXPECTED_METRICS.items():
+        section = result.get(category)
+        if not isinstance(section, dict):
+            issues.append({"kind": "structure", "category": category, "metric": None, "quarter": None,
+                           "value": None, "detail": f"missing section '{category}'"})
+            continue
+        for metric in metric_names:
+            values = section.get(metric)
+            if not isinstance(values, dict):
+                issues.append({"kind": "structure", "category": category, "metric": metric, "quarter": None,
+                               "value": None, "detail": "missing metric"})
+                continue
+            low, high = METRIC_RANGES.get(metric, (None, None))
+            for quarter in quarters:
+                value = values.get(quarter)
+                issue = {"category": category, "metric": metric, "quarter": quarter, "value": value}
+                if quarter not in values:
+                    issues.append({**issue, "kind": "structure", "detail": "missing quarter"})
+                    continue
+                try:
+                    number = parse_metric_value(value)
+                except ValueError:
+                    issues.append({**issue, "kind": "unparseable"})
+                    continue
+                if number is None:
+                    if category == "metrics":
+                        issues.append({**issue, "kind": "missing"})
+                elif (low is not None and number < low) or (high is not None and number > high):
+                    issues.append({**issue, "kind": "out_of_range"})
+    return issues
+
+
+def is_acceptable(issues: List[Dict[str, Any]]) -> bool:
+    """True when none of the issues is blocking."""
+    return not any(issue["kind"] in BLOCKING_ISSUES for issue in issues)
+
+
+def summarize_issues(issues: List[Dict[str, Any]]) -> str:
+    """One-line summary such as '2 missing, 1 out_of_range'."""
+    counts: Dict[str, int] = {}
+    for issue in issues:
+        counts[issue["kind"]] = counts.get(issue["kind"], 0) + 1
+    return ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())) or "no issues"
@@ -0,0 +1,85 @@
+"""
+Background refresh of served-stale results (stale-while-revalidate).
+
+When the API answers from the last-good consolidated results of a quarter, the banks
+whose inputs changed since are re-analyzed here in the background: each (quarter, bank)
+at most once at a time, at backfill priority on the shared scheduler, and the quarter is
+re-consolidated when its last refresh finishes. While a remote service's circuit
+breaker is open nothing new is started, so an incident is not made worse by refreshes.
+"""
+
+import threading
+from typing import Callable, Dict, List, Set, Tuple
+
+from backfill import analyze_bank, consolidate_quarter
+from circuit_breaker import any_open
+from instrumentation import record
+from scheduler import AnalysisScheduler, BACKFILL
+
+
+class Revalidator:
+    """Tracks and runs background refreshes of (quarter, bank) results."""
+
+    def __init__(self, scheduler: AnalysisScheduler, analyzer_factory: Callable[[], object], base_dir: str):
+        """
+        Args:
+            scheduler: Shared analysis scheduler
+            analyzer_factory: Returns the (shared) PDFAnalyzer, called only when a refresh starts
+            base_dir: Project root
+        """
+        self.scheduler = scheduler
+        self.analyzer_factory = analyzer_factory
+        self.base_dir = base_dir
+        self._in_flight: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+
+    def refresh(self, quarter: str, banks: List[str], run_id: str = None) -> List[str]:
+        """
+        Start refreshing ``banks`` of ``quarter`` unless they already are.
+
+        Returns:
+            Banks of the quarter being refreshed now (including earlier, still running refreshes)
+        """
+        if any_open():
+            record("revalidations_skipped", reason="circuit_open")
+            return self.refreshing(quarter)
+        with self._lock:
+            new = [bank for bank in banks if (quarter, bank) not in self._in_flight]
+            self._in_flight.update((quarter, bank) for bank in new)
+        if new:
+            analyzer = self.analyzer_factory()
+            for bank in new:
+                record("revalidations", bank=bank)
+                future = self.scheduler.submit(
+                    analyze_bank, analyzer, self.base_dir, quarter, bank, False, run_id,
+                    priority=BACKFILL, fair_key=bank
+                )
+                future.add_done_callback(lambda f, b=bank: self._done(quarter, b, f))
+        return self.refreshing(quarter)
+
+    def _done(self, quarter: str, bank: str, future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            print(f"❌ Background refresh of {bank} {quarter} failed: "
+                  f"{'cancelled' if future.cancelled() else future.exception()}")
+        else:
+            print(f"🔄 Background refresh of {bank} {quarter}: {future.result()}")
+        with self._lock:
+            self._in_flight.discard((quarter, bank))
+            quarter_done = not any(q == quarter for q, _ in self._in_flight)
+        if quarter_done:
+            try:
+                consolidate_quarter(self.base_dir, quarter)
+            except Exception as e:
+                print(f"❌ Consolidating {quarter} after refresh failed: {e}")
+
+    def refreshing(self, quarter: str) -> List[str]:
+        with self._lock:
+            return sorted(bank for q, bank in self._in_flight if q == quarter)
+
+    def status(self) -> Dict[str, List[str]]:
+        with self._lock:
+            in_flight = list(self._in_flight)
+        quarters: Dict[str, List[str]] = {}
+        for quarter, bank in sorted(in_flight):
+            quarters.setdefault(quarter, []).append(bank)
+        return quarters
@@ -0,0 +1,88 @@
+"""
+Per-run configuration.
+
+A ``RunConfig`` carries the settings of one analysis run (requested banks, latest
+quarter) explicitly through batch config creation, prompt injection and consolidation.
+``config/config.json`` only supplies defaults and is never rewritten per request, so
+concurrent API requests for different quarters cannot affect each other.
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RunConfig:
+    """Immutable settings of a single analysis run."""
+
+    __slots__ = ("latest_quarter", "requested_bank_names", "extra")
+
+    def __init__(self, latest_quarter: Optional[str], requested_bank_names: Optional[List[str]] = None,
+                 **extra: Any):
+        """
+        Args:
+            latest_quarter: Quarter to analyze, e.g. "Q12025"
+            requested_bank_names: Bank folder names to analyze
+            extra: Any other settings from the config file
+        """
+        object.__setattr__(self, "latest_quarter", latest_quarter)
+        object.__setattr__(self, "requested_bank_names", tuple(requested_bank_names or ()))
+        object.__setattr__(self, "extra", dict(extra))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RunConfig is immutable; use with_overrides()")
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "RunConfig":
+        config = dict(config)
+        return cls(config.pop("latest_quarter", None), config.pop("requested_bank_names", None), **config)
+
+    @classmethod
+    def from_file(cls, config_path: str, **overrides: Any) -> "RunConfig":
+        """
+        Defaults from a config file (if it exists), with ``overrides`` applied on top.
+
+        None-valued overrides are ignored, so request fields that were not sent keep
+        their defaults.
+        """
+        config = dict(_read_defaults(config_path))
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        return cls.from_dict(config)
+
+    def with_overrides(self, **overrides: Any) -> "RunConfig":
+        config = self.to_dict()
+        config.update({key: value for key, value in overrides.items() if value is not None})
+        return RunConfig.from_dict(config)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.extra,
+            "requested_bank_names": list(self.requested_bank_names),
+            "latest_quarter": self.latest_quarter,
+        }
+
+    def __repr__(self) -> str:
+        return f"RunConfig(latest_quarter={self.latest_quarter!r}, banks={list(self.requested_bank_names)!r})"
+
+
+# config path -> (mtime, parsed defaults); the file is only re-read when it changes
+_defaults_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_defaults_lock = threading.Lock()
+
+
+def _read_defaults(config_path: str) -> Dict[str, Any]:
+    if not os.path.exists(config_path):
+        return {}
+    mtime = os.path.getmtime(config_path)
+    with _defaults_lock:
+        cached = _defaults_cache.get(config_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(config_path, "r") as f:
+                defaults = json.load(f)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid JSON in configuration file: {config_path}")
+        _defaults_cache[config_path] = (mtime, defaults)
+        return defaults
@@ -0,0 +1,93 @@
+"""
+Durable run journal for resumable batch runs.
+
+A run is a directory ``runs/<run_id>/`` holding ``journal.json`` (run metadata) and one
+sub-directory per bank with a checkpoint file per completed stage:
+
+- ``layout.json``     markdown tables produced from the Document Intelligence layout
+- ``completion.json`` raw chat completion content and the deployment that produced it
+- ``done.json``       path of the saved result
+
+Relaunching with the same run id (``main.py --resume <run_id>``) skips banks that are
+done and restarts the others from their last completed stage. Checkpoints are tied to
+the bank's input fingerprint and are discarded if the inputs changed in between.
+"""
+
+import os
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils import atomic_write_json
+
+
+STAGES = ("layout", "completion", "done")
+
+
+class BankCheckpoint:
+    """Stage checkpoints of a single bank within a run."""
+
+    def __init__(self, bank_dir: str):
+        self.bank_dir = bank_dir
+        os.makedirs(bank_dir, exist_ok=True)
+
+    def _path(self, stage_name: str) -> str:
+        if stage_name not in STAGES:
+            raise ValueError(f"Unknown checkpoint stage: {stage_name}")
+        return os.path.join(self.bank_dir, f"{stage_name}.json")
+
+    def load(self, stage_name: str) -> Optional[Any]:
+        """Value stored for a completed stage, or None if the stage has not completed."""
+        path = self._path(stage_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)["value"]
+
+    def save(self, stage_name: str, value: Any) -> None:
+        atomic_write_json(self._path(stage_name), {
+            "value": value,
+            "completed_at": datetime.now().isoformat(timespec="seconds"),
+        })
+
+    def is_done(self) -> bool:
+        return os.path.exists(self._path("done"))
+
+    def completed_stages(self) -> List[str]:
+        return [s for s in STAGES if os.path.exists(self._path(s))]
+
+    def bind_inputs(self, fingerprint: Dict[str, Any]) -> None:
+        """Drop existing checkpoints if they were produced from different inputs."""
+        inputs_path = os.path.join(self.bank_dir, "inputs.json")
+        if os.path.exists(inputs_path):
+            with open(inputs_path, "r") as f:
+                if json.load(f) == fingerprint:
+                    return
+        for stage_name in STAGES:
+            if os.path.exists(self._path(stage_name)):
+                os.remove(self._path(stage_name))
+        atomic_write_json(inputs_path, fingerprint)
+
+
+class RunJournal:
+    """A batch run's journal directory; create a new one or reopen it with ``run_id``."""
+
+    def __init__(self, journal_root: str, run_id: Optional[str] = None, **metadata: Any):
+        self.resumed = run_id is not None
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.run_dir = os.path.join(journal_root, self.run_id)
+        self.journal_path = os.path.join(self.run_dir, "journal.json")
+
+        if self.resumed:
+            if not os.path.exists(self.journal_path):
+                raise FileNotFoundError(f"No run journal found for run id '{run_id}': {self.journal_path}")
+            with open(self.journal_path, "r") as f:
+                self.metadata = json.load(f)
+        else:
+            os.makedirs(self.run_dir, exist_ok=True)
+            self.metadata = {"run_id": self.run_id, "created_at": datetime.now().isoformat(timespec="seconds"), **metadata}
+            atomic_write_json(self.journal_path, self.metadata)
+
+    def bank(self, bank: str) -> BankCheckpoint:
+        return BankCheckpoint(os.path.join(self.run_dir, bank))
@@ -0,0 +1,164 @@
+"""
+Priority-aware scheduler for document analyses.
+
+All analyses of a process run on one pool of ``max_concurrency`` worker threads with
+two priority classes:
+
+- ``INTERACTIVE``: API requests; always dispatched first and may use every slot
+- ``BACKFILL``: history loads; dispatched only when no interactive work is waiting,
+  limited to ``backfill_share`` of the slots (so interactive requests always find free
+  capacity) and round-robined across banks so no bank's backlog starves the others
+
+Running analyses are never interrupted; interactive work preempts backfill at
+dispatch time.
+"""
+
+import os
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from instrumentation import record
+
+
+INTERACTIVE = "interactive"
+BACKFILL = "backfill"
+
+DEFAULT_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+DEFAULT_BACKFILL_SHARE = float(os.getenv("BACKFILL_SHARE", "0.5"))
+
+
+class AnalysisScheduler:
+    """Runs submitted callables on worker threads, interactive work first."""
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 backfill_share: float = DEFAULT_BACKFILL_SHARE):
+        """
+        Args:
+            max_concurrency: Worker threads (analyses running at once)
+            backfill_share: Fraction of the workers backfill may occupy (at least one)
+        """
+        self.max_concurrency = max_concurrency
+        self.backfill_limit = max(1, int(max_concurrency * backfill_share))
+        self._interactive = deque()
+        self._backfill: "OrderedDict[str, deque]" = OrderedDict()  # fair key -> queued tasks
+        self._running = {INTERACTIVE: 0, BACKFILL: 0}
+        self._completed = {INTERACTIVE: 0, BACKFILL: 0}
+        self._cond = threading.Condition()
+        self._workers = []
+        self._stopped = False
+
+    def submit(self, fn: Callable[..., Any], *args: Any, priority: str = INTERACTIVE,
+               fair_key: Optional[str] = None, **kwargs: Any) -> Future:
+        """
+        Queue ``fn(*args, **kwargs)``.
+
+        Args:
+            fn: Work to run
+            priority: INTERACTIVE or BACKFILL
+            fair_key: Backfill fairness group (e.g. the bank); groups are served round-robin
+
+        Returns:
+            Future of the result
+        """
+        future = Future()
+        # Run in the submitter's context so manifests/profiling sessions follow the work
+        task = (future, contextvars.copy_context(), fn, args, kwargs)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Scheduler is shut down")
+            if priority == INTERACTIVE:
+                self._interactive.append(task)
+            elif priority == BACKFILL:
+                self._backfill.setdefault(fair_key or "", deque()).append(task)
+            else:
+                raise ValueError(f"Unknown priority: {priority}")
+            self._ensure_workers()
+            self._cond.notify()
+        record("scheduled_tasks", priority=priority)
+        return future
+
+    def _ensure_workers(self) -> None:
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(target=self._work, name=f"analysis-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_task(self):
+        """Pop the next task to run (caller holds the lock), or None if nothing may run now."""
+        if self._interactive:
+            return INTERACTIVE, self._interactive.popleft()
+        if self._backfill and self._running[BACKFILL] < self.backfill_limit:
+            key, queue = next(iter(self._backfill.items()))
+            task = queue.popleft()
+            del self._backfill[key]
+            if queue:
+                self._backfill[key] = queue  # rotate: the group goes to the back
+            return BACKFILL, task
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                picked = self._next_task()
+                while picked is None and not self._stopped:
+                    self._cond.wait()
+                    picked = self._next_task()
+                if picked is None:
+                    return
+                priority, (future, context, fn, args, kwargs) = picked
+                self._running[priority] += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(context.run(fn, *args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    self._completed[priority] += 1
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queued, running and completed task counts per priority class."""
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "backfill_limit": self.backfill_limit,
+                "queued": {
+                    INTERACTIVE: len(self._interactive),
+                    BACKFILL: sum(len(q) for q in self._backfill.values()),
+                },
+                "queued_backfill_by_key": {key: len(q) for key, q in self._backfill.items()},
+                "running": dict(self._running),
+                "completed": dict(self._completed),
+            }
+
+    def shutdown(self, cancel_pending: bool = True) -> None:
+        """Stop the workers once their current task is done."""
+        with self._cond:
+            self._stopped = True
+            if cancel_pending:
+                for future, *_ in list(self._interactive) + [t for q in self._backfill.values() for t in q]:
+                    future.cancel()
+                self._interactive.clear()
+                self._backfill.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+
+_scheduler: Optional[AnalysisScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> AnalysisScheduler:
+    """Process-wide scheduler shared by API requests and backfills."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AnalysisScheduler()
+        return _scheduler
@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark for the API and CLI entry points.
+
+Imports each entry module in a fresh interpreter with ``python -X importtime``, reports
+the total import time and the slowest modules, checks that heavy dependencies
+(dashboard libraries, Azure SDKs) are not loaded at import time, and compares the
+result against the startup budget:
+
+    python startup_benchmark.py            # report, exit 1 if over budget
+    python startup_benchmark.py --top 25
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+
+# Seconds allowed for a cold ``import <module>`` (median of the runs)
+STARTUP_BUDGET_SECONDS = {
+    "app": 0.5,
+    "main": 0.3,
+}
+# Packages that must only be loaded on first use
+DEFERRED_PACKAGES = ("pandas", "numpy", "plotly", "azure", "openai")
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple of (total seconds, [(module, cumulative seconds)], deferred packages loaded)
+    """
+    probe = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr.strip().splitlines()[-1]}")
+
+    timings = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            cumulative_us, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            timings.append((name, cumulative_us / 1e6, depth))
+    total = next(seconds for name, seconds, depth in timings if name == module and depth == 1)
+    loaded = set(json.loads(completed.stdout.strip().splitlines()[-1]))
+    slowest = sorted(((name, seconds) for name, seconds, _ in timings), key=lambda t: -t[1])
+    return total, slowest, sorted(loaded & set(DEFERRED_PACKAGES))
+
+
+def run_benchmark(runs: int = 3, top_n: int = 10) -> Dict[str, Dict[str, object]]:
+    """Measure every entry module and print a report; returns the results per module."""
+    results = {}
+    for module, budget in STARTUP_BUDGET_SECONDS.items():
+        try:
+            measurements = [measure_import(module) for _ in range(runs)]
+        except RuntimeError as e:
+            print(f"⚠️  {e}")
+            results[module] = {"error": str(e)}
+            continue
+        measurements.sort(key=lambda m: m[0])
+        total, slowest, deferred_loaded = measurements[len(measurements) // 2]
+        within_budget = total <= budget and not deferred_loaded
+        results[module] = {
+            "seconds": round(total, 4),
+            "budget": budget,
+            "deferred_loaded": deferred_loaded,
+            "within_budget": within_budget,
+        }
+
+        print(f"{'✅' if within_budget else '❌'} import {module}: {total * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+        if deferred_loaded:
+            print(f"   loaded at import time: {', '.join(deferred_loaded)}")
+        for name, seconds in slowest[:top_n]:
+            print(f"   {seconds * 1000:8.1f} ms  {name}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the API and CLI")
+    parser.add_argument("--runs", type=int, default=3, help="Imports per module (median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs, args.top)
+    sys.exit(0 if all(r.get("within_budget") for r in results.values()) else 1)
@@ -0,0 +1,377 @@
+"""
+Pluggable table-extraction backends.
+
+Every backend returns an ``ExtractedLayout``: the document's tables as compact
+``TableGrid``s (see ``table_ir``) plus a confidence score.
+
+- ``DocumentIntelligenceTableExtractor``: remote ``prebuilt-layout`` analysis
+- ``LocalTableExtractor``: rebuilds tables from the PDF text layer (pdfplumber), pages
+  processed in one shared, process-wide pool of spawned workers. Born-digital supplements need no remote round trip.
+- ``FallbackTableExtractor``: the local engine, falling back to the remote service when
+  the local result's confidence is low (scanned pages, irregular layouts)
+
+``TABLE_EXTRACTION_BACKEND`` selects the backend: ``auto`` (default: local with remote
+fallback when pdfplumber is installed, otherwise remote), ``local`` or ``remote``.
+"""
+
+import os
+import re
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from instrumentation import stage, record
+from table_ir import TableGrid
+from latency_control import DeadlineExceeded, stage_deadline
+from circuit_breaker import get_breaker
+
+
+# Local engine tuning (PDF points)
+LINE_TOLERANCE = 3.0          # words whose tops differ less than this are on the same line
+SEGMENT_GAP_EM = 0.6          # words closer than this many line heights form one cell
+COLUMN_TOLERANCE = 12.0       # right edges closer than this belong to the same column
+MAX_ROW_GAP_LINES = 2.5       # a vertical gap larger than this many line heights ends a table
+MIN_TABLE_ROWS = 3            # rows with a label and at least one value
+PAGES_PER_TASK = 8
+MIN_LOCAL_CONFIDENCE = float(os.getenv("LOCAL_TABLE_MIN_CONFIDENCE", "0.75"))
+
+_NUMERIC_RE = re.compile(r"^[(\-–$]*\d[\d,.]*%?\)?[a-z]?$|^[—–-]+$|^n/?[am]$", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractedLayout:
+    """Tables of a document plus how confident the backend is that they are complete."""
+
+    def __init__(self, tables: List[TableGrid], confidence: float, backend: str, billed_pages: int = 0):
+        self.tables = tables
+        self.confidence = confidence
+        self.backend = backend
+        self.billed_pages = billed_pages  # pages analyzed by a paid remote service
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tables": [table.to_dict() for table in self.tables],
+            "confidence": self.confidence,
+            "backend": self.backend,
+            "billed_pages": self.billed_pages,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExtractedLayout":
+        return cls([TableGrid.from_dict(t) for t in data["tables"]], data["confidence"], data["backend"],
+                   data.get("billed_pages", 0))
+
+
+class TableExtractor:
+    """Interface of a table-extraction backend."""
+
+    name = "base"
+
+    def extract(self, pdf_path: str) -> ExtractedLayout:
+        raise NotImplementedError
+
+
+class DocumentIntelligenceTableExtractor(TableExtractor):
+    """Azure Document Intelligence ``prebuilt-layout``."""
+
+    name = "remote"
+
+    def __init__(self, client_factory: Callable[[], Any]):
+        """
+        Args:
+            client_factory: Returns the DocumentIntelligenceClient (called on first use)
+        """
+        self.client_factory = client_factory
+
+    def extract(self, pdf_path: str) -> ExtractedLayout:
+        record("bytes_uploaded", os.path.getsize(pdf_path))
+        with open(pdf_path, "rb") as f:
+            # Only the service calls go through the breaker (local I/O errors say nothing about
+            # its health); while it is open, fail fast instead of queueing more work on it
+            result = get_breaker("document_intelligence").call(lambda: self._analyze(f))
+        # Keep only the tables; the AnalyzeResult (pages, words, polygons) is released here
+        tables = [TableGrid.from_sdk_table(table) for table in result.tables or []]
+        pages = len(result.pages or [])
+        record("layout_pages", pages)
+        del result
+        return ExtractedLayout(tables, 1.0, self.name, billed_pages=pages)
+
+    def _analyze(self, document) -> Any:
+        with stage("layout_upload"):
+            poller = self.client_factory().begin_analyze_document("prebuilt-layout", body=document)
+        with stage("layout_poll"):
+            deadline = stage_deadline("layout_poll")
+            poller.wait(timeout=deadline)
+            if not poller.done():
+                record("deadline_exceeded", stage="layout_poll")
+                raise DeadlineExceeded("layout_poll", deadline)
+            return poller.result()
+
+
+def _is_numeric(text: str) -> bool:
+    return bool(_NUMERIC_RE.match(text.replace(" ", "")))
+
+
+def _page_lines(words: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group positioned words into lines of cell segments."""
+    lines = []
+    for word in sorted(words, key=lambda w: (round(w["top"]), w["x0"])):
+        if lines and abs(word["top"] - lines[-1]["top"]) <= LINE_TOLERANCE:
+            lines[-1]["words"].append(word)
+        else:
+            lines.append({"top": word["top"], "bottom": word["bottom"], "words": [word]})
+
+    for line in lines:
+        line["words"].sort(key=lambda w: w["x0"])
+        height = max(w["bottom"] - w["top"] for w in line["words"]) or 1.0
+        segments = []
+        for word in line["words"]:
+            if segments and word["x0"] - segments[-1]["x1"] <= SEGMENT_GAP_EM * height:
+                segments[-1]["text"] += " " + word["text"]
+                segments[-1]["x1"] = word["x1"]
+            else:
+                segments.append({"text": word["text"], "x0": word["x0"], "x1": word["x1"]})
+        line["segments"] = segments
+        line["height"] = height
+        line["bottom"] = max(w["bottom"] for w in line["words"])
+    return lines
+
+
+def _table_blocks(lines: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Runs of vertically close lines containing enough label + value rows."""
+    blocks, current = [], []
+    for line in lines:
+        if current and line["top"] - current[-1]["bottom"] > MAX_ROW_GAP_LINES * line["height"]:
+            blocks.append(current)
+            current = []
+        current.append(line)
+    if current:
+        blocks.append(current)
+
+    def is_data_row(line):
+        return len(line["segments"]) >= 2 and any(_is_numeric(s["text"]) for s in line["segments"][1:])
+
+    tables = []
+    for block in blocks:
+        data_rows = [i for i, line in enumerate(block) if is_data_row(line)]
+        if len(data_rows) >= MIN_TABLE_ROWS:
+            # Keep up to two header lines above the first data row
+            tables.append(block[max(0, data_rows[0] - 2):data_rows[-1] + 1])
+    return tables
+
+
+def _build_grid(block: List[Dict[str, Any]]) -> Tuple[List[List[str]], float]:
+    """
+    Align a block's segments into columns.
+
+    Value columns are found by clustering the right edges of numeric segments (figures
+    are right-aligned); segments left of every value column form the label column.
+
+    Returns:
+        Tuple of (rows of cell text, share of segments that fit a column)
+    """
+    edges = sorted(s["x1"] for line in block for s in line["segments"][1:] if _is_numeric(s["text"]))
+    clusters: List[List[float]] = []
+    for edge in edges:
+        if clusters and edge - clusters[-1][-1] <= COLUMN_TOLERANCE:
+            clusters[-1].append(edge)
+        else:
+            clusters.append([edge])
+    columns = []  # (left, right) extent of each value column
+    for cluster in clusters:
+        members = [s for line in block for s in line["segments"]
+                   if _is_numeric(s["text"]) and cluster[0] - 0.5 <= s["x1"] <= cluster[-1] + 0.5]
+        columns.append((min(s["x0"] for s in members), max(s["x1"] for s in members)))
+    if not columns:
+        return [], 0.0
+    label_right = columns[0][0]
+
+    rows, fitted, total = [], 0, 0
+    for line in block:
+        row = [""] * (len(columns) + 1)
+        for segment in line["segments"]:
+            total += 1
+            if segment["x1"] <= label_right + COLUMN_TOLERANCE / 2 and not _is_numeric(segment["text"]):
+                row[0] = f"{row[0]} {segment['text']}".strip()
+                fitted += 1
+                continue
+            overlaps = [
+                min(segment["x1"], right) - max(segment["x0"], left) for left, right in columns
+            ]
+            best = max(range(len(columns)), key=lambda i: overlaps[i])
+            if overlaps[best] < 0:
+                distances = [abs(segment["x1"] - right) for _, right in columns]
+                best = min(range(len(columns)), key=lambda i: distances[i])
+                if distances[best] > COLUMN_TOLERANCE:
+                    continue  # does not line up with any column
+            if row[best + 1]:
+                row[best + 1] += " " + segment["text"]
+            else:
+                row[best + 1] = segment["text"]
+                fitted += 1
+        rows.append(row)
+    return rows, (fitted / total if total else 0.0)
+
+
+def _extract_page_tables(pdf_path: str, page_indices: List[int]) -> List[Dict[str, Any]]:
+    """Worker: tables of some pages as plain data (picklable)."""
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in page_indices:
+            page = pdf.pages[index]
+            words = page.extract_words(x_tolerance=1.5, y_tolerance=2)
+            tables = []
+            for block in _table_blocks(_page_lines(words)):
+                rows, confidence = _build_grid(block)
+                if rows:
+                    x0 = min(w["x0"] for line in block for w in line["words"])
+                    x1 = max(w["x1"] for line in block for w in line["words"])
+                    grid = TableGrid(rows, index + 1, (x0, block[0]["top"], x1, block[-1]["bottom"]))
+                    tables.append({"grid": grid, "confidence": confidence})
+            pages.append({"page": index + 1, "has_text": bool(words), "tables": tables})
+            page.flush_cache()
+    return pages
+
+
+# One pool of page workers for the whole process, started on first use. Workers are
+# spawned rather than forked: extraction runs on scheduler and request threads, and
+# forking a multi-threaded process can deadlock the child on a lock held by another thread.
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool(max_workers: int) -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return _page_pool
+
+
+def _reset_page_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (a worker died) so the next document starts a fresh one."""
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False)
+
+
+@atexit.register
+def _shutdown_page_pool() -> None:
+    with _page_pool_lock:
+        pool = _page_pool
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class LocalTableExtractor(TableExtractor):
+    """Tables rebuilt from the PDF text layer, pages processed in parallel."""
+
+    name = "local"
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = PAGES_PER_TASK):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+
+    @staticmethod
+    def available() -> bool:
+        try:
+            import pdfplumber  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def extract(self, pdf_path: str) -> ExtractedLayout:
+        import pdfplumber
+
+        with pdfplumber.open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+        chunks = [
+            list(range(start, min(start + self.pages_per_task, page_count)))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        with stage("layout_local"):
+            if len(chunks) <= 1 or self.max_workers == 1:
+                pages = [page for chunk in chunks for page in _extract_page_tables(pdf_path, chunk)]
+            else:
+                pool = _get_page_pool(self.max_workers)
+                try:
+                    results = pool.map(_extract_page_tables, [pdf_path] * len(chunks), chunks)
+                    pages = [page for chunk_pages in results for page in chunk_pages]
+                except BrokenProcessPool:
+                    _reset_page_pool(pool)
+                    raise
+
+        tables = [table for page in pages for table in page["tables"]]
+        return ExtractedLayout([t["grid"] for t in tables], self._confidence(pages, tables), self.name)
+
+    @staticmethod
+    def _confidence(pages: List[Dict[str, Any]], tables: List[Dict[str, Any]]) -> float:
+        """Share of pages with a text layer times the cell-weighted column fit of the tables."""
+        if not pages or not tables:
+            return 0.0
+        text_share = sum(page["has_text"] for page in pages) / len(pages)
+        weights = [t["grid"].cell_count for t in tables]
+        fit = sum(t["confidence"] * w for t, w in zip(tables, weights)) / (sum(weights) or 1)
+        return text_share * fit
+
+
+class FallbackTableExtractor(TableExtractor):
+    """Try a primary (local) backend; use the fallback (remote) when its confidence is low."""
+
+    name = "auto"
+
+    def __init__(self, primary: TableExtractor, fallback: TableExtractor,
+                 min_confidence: float = MIN_LOCAL_CONFIDENCE):
+        self.primary = primary
+        self.fallback = fallback
+        self.min_confidence = min_confidence
+
+    def extract(self, pdf_path: str) -> ExtractedLayout:
+        try:
+            layout = self.primary.extract(pdf_path)
+        except Exception as e:
+            logger.warning(f"{self.primary.name} table extraction failed for {pdf_path}: {e}")
+            layout = None
+        if layout is not None and layout.confidence >= self.min_confidence:
+            return layout
+        if layout is not None:
+            logger.info(
+                f"{self.primary.name} table extraction confidence {layout.confidence:.2f} "
+                f"< {self.min_confidence:.2f}, using {self.fallback.name}"
+            )
+        record("table_extraction_fallbacks", backend=self.fallback.name)
+        return self.fallback.extract(pdf_path)
+
+
+def create_table_extractor(remote_client_factory: Callable[[], Any],
+                           backend: Optional[str] = None) -> TableExtractor:
+    """
+    Table extractor for the configured backend.
+
+    Args:
+        remote_client_factory: Returns the DocumentIntelligenceClient
+        backend: "auto", "local" or "remote" (default: TABLE_EXTRACTION_BACKEND or "auto")
+    """
+    backend = (backend or os.getenv("TABLE_EXTRACTION_BACKEND", "auto")).lower()
+    remote = DocumentIntelligenceTableExtractor(remote_client_factory)
+    if backend == "remote":
+        return remote
+    if not LocalTableExtractor.available():
+        if backend == "local":
+            raise ImportError("pdfplumber is required for the local table-extraction backend")
+        return remote
+    if backend == "local":
+        return LocalTableExtractor()
+    if backend != "auto":
+        raise ValueError(f"Unknown table extraction backend: {backend}")
+    return FallbackTableExtractor(LocalTableExtractor(), remote)
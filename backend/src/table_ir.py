@@ -0,0 +1,107 @@
+"""
+Compact in-memory representation of extracted tables.
+
+A ``TableGrid`` keeps the text of all cells of a table in one string plus an
+``array('I')`` of offsets (row-major), the few spanning cells in a sparse tuple, and the
+page number / bounding box of the table. It is built directly from a Document
+Intelligence table (or from rows of text for the local engine) so the much larger
+``AnalyzeResult`` (pages, words, lines, polygons) can be released right after
+extraction. Grids pickle cheaply across processes and round-trip through
+``to_dict``/``from_dict`` for caching.
+"""
+
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+BBox = Tuple[float, float, float, float]
+
+
+class TableGrid:
+    """Row-major grid of cell text with spans and the table's location in the document."""
+
+    __slots__ = ("row_count", "column_count", "page_number", "bbox", "spans", "_text", "_offsets")
+
+    def __init__(self, rows: List[List[str]], page_number: Optional[int] = None,
+                 bbox: Optional[BBox] = None, spans: Tuple[Tuple[int, int, int, int], ...] = ()):
+        """
+        Args:
+            rows: Cell text per row (shorter rows are padded with empty cells)
+            page_number: 1-based page the table starts on
+            bbox: (x0, y0, x1, y1) of the table on that page
+            spans: (row, column, row_span, column_span) of cells spanning more than one slot
+        """
+        self.row_count = len(rows)
+        self.column_count = max((len(row) for row in rows), default=0)
+        self.page_number = page_number
+        self.bbox = bbox
+        self.spans = spans
+        parts, offsets, position = [], array("I", [0]), 0
+        for row in rows:
+            for c in range(self.column_count):
+                text = row[c] if c < len(row) else ""
+                parts.append(text)
+                position += len(text)
+                offsets.append(position)
+        self._text = "".join(parts)
+        self._offsets = offsets
+
+    @classmethod
+    def from_sdk_table(cls, table: Any) -> "TableGrid":
+        """Build a grid from a Document Intelligence ``DocumentTable``."""
+        rows = [[""] * table.column_count for _ in range(table.row_count)]
+        spans = []
+        for cell in table.cells:
+            rows[cell.row_index][cell.column_index] = cell.content.strip()
+            row_span, column_span = cell.row_span or 1, cell.column_span or 1
+            if row_span > 1 or column_span > 1:
+                spans.append((cell.row_index, cell.column_index, row_span, column_span))
+
+        page_number, bbox = None, None
+        if table.bounding_regions:
+            region = table.bounding_regions[0]
+            page_number = region.page_number
+            if region.polygon:
+                xs, ys = region.polygon[0::2], region.polygon[1::2]
+                bbox = (min(xs), min(ys), max(xs), max(ys))
+        return cls(rows, page_number, bbox, tuple(spans))
+
+    def cell(self, row: int, column: int) -> str:
+        i = row * self.column_count + column
+        return self._text[self._offsets[i]:self._offsets[i + 1]]
+
+    def rows(self) -> Iterator[List[str]]:
+        """Cell text row by row."""
+        for r in range(self.row_count):
+            yield [self.cell(r, c) for c in range(self.column_count)]
+
+    @property
+    def cell_count(self) -> int:
+        """Number of non-empty cells."""
+        offsets = self._offsets
+        return sum(1 for i in range(len(offsets) - 1) if offsets[i + 1] > offsets[i])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": list(self.rows()),
+            "page_number": self.page_number,
+            "bbox": list(self.bbox) if self.bbox else None,
+            "spans": [list(span) for span in self.spans],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TableGrid":
+        return cls(
+            data["rows"],
+            data.get("page_number"),
+            tuple(data["bbox"]) if data.get("bbox") else None,
+            tuple(tuple(span) for span in data.get("spans", [])),
+        )
+
+    def __getstate__(self):
+        return (self.row_count, self.column_count, self.page_number, self.bbox,
+                self.spans, self._text, self._offsets)
+
+    def __setstate__(self, state):
+        (self.row_count, self.column_count, self.page_number, self.bbox,
+         self.spans, self._text, self._offsets) = state
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from azure_fixtures import RECORD, FixtureNotFound, FixtureStore
+from build_graph import rebuild_reason
+from circuit_breaker import any_open
+from conftest import FakeChatClient, chat_response
+from instrumentation import failed_manifest_path_for, manifest_path_for
+from model_router import routing_fingerprint
+from result_validation import EXPECTED_METRICS
+from table_extraction import ExtractedLayout, TableExtractor
+from table_ir import TableGrid
+
+
+class FakeTableExtractor(TableExtractor):
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def extract(self, pdf_path):
+        self.calls += 1
+        grid = TableGrid([["Metric", "Q1 2025"], ["Net Credit Loss Rate (%)", "5.1%"]], page_number=1)
+        return ExtractedLayout([grid], confidence=1.0, backend="remote", billed_pages=1)
+
+
+@pytest.fixture
+def document(tmp_path):
+    """A bank's PDF and prompts, as laid out by ``create_batch_config``."""
+    pdf = tmp_path / "Synchrony" / "supplement.pdf"
+    pdf.parent.mkdir()
+    pdf.write_bytes(b"%PDF-1.7 fake supplement")
+    user_prompt = tmp_path / "user_prompt.txt"
+    user_prompt.write_text("Extract the metrics.")
+    system_prompt = tmp_path / "system_prompt.txt"
+    system_prompt.write_text("Quarters: {{quarter_list}}")
+    return {
+        "pdfs": [str(pdf)],
+        "user_prompt": str(user_prompt),
+        "system_prompt": str(system_prompt),
+        "output": str(tmp_path / "results" / "Synchrony_Q12025.json"),
+    }
+
+
+def _metrics_content(quarters):
+    return json.dumps({
+        category: {metric: {quarter: "1.0" for quarter in quarters} for metric in metrics}
+        for category, metrics in EXPECTED_METRICS.items()
+    })
+
+
+def _analyze(analyzer, document):
+    return analyzer.analyze_pdf(document["pdfs"], document["user_prompt"], document["system_prompt"],
+                                output_filename=document["output"], latest_quarter="Q12025")
+
+
+def _record(analyzer, fixture_dir, document):
+    """Run the document once against fakes, recording its remote calls into ``fixture_dir``."""
+    store = FixtureStore(str(fixture_dir), RECORD, latency_scale=0)
+    extractor = FakeTableExtractor()
+    client = FakeChatClient(chat_response(_metrics_content(analyzer.compute_past_5_quarters("Q12025"))))
+    replaying_extractor = analyzer.table_extractor
+    analyzer.table_extractor = store.wrap_table_extractor(extractor)
+    analyzer._openai_client = store.wrap_chat_client(client)
+    recorded = _analyze(analyzer, document)
+    analyzer.table_extractor = replaying_extractor
+    analyzer.reset_clients()
+    return recorded, extractor, client
+
+
+def test_replayed_run_matches_the_recorded_one(analyzer, fixture_dir, document):
+    recorded, extractor, client = _record(analyzer, fixture_dir, document)
+    assert extractor.calls == 1 and len(client.requests) == 1
+    assert (fixture_dir / "layouts").is_dir() and (fixture_dir / "chat").is_dir()
+
+    replayed = _analyze(analyzer, document)
+    assert replayed == recorded
+    assert extractor.calls == 1 and len(client.requests) == 1  # nothing reached the fakes
+    manifest = json.loads(manifest_path_for(document["output"]).read_text())
+    assert manifest["status"] == "success"
+    assert manifest["inputs"]["deployment"] == "strong"
+    # The result is up to date for the routing configuration it was built with
+    assert rebuild_reason(document, "Q12025", routing_fingerprint()) is None
+    assert "deployment" in rebuild_reason(document, "Q12025", routing_fingerprint(["other"]))
+
+
+def test_failed_run_keeps_the_last_good_manifest(analyzer, fixture_dir, document):
+    _record(analyzer, fixture_dir, document)
+    good_manifest = manifest_path_for(document["output"]).read_text()
+
+    # A changed prompt has no recording: the run fails without touching the last good result
+    with open(document["user_prompt"], "a") as f:
+        f.write(" Also the reserves.")
+    with pytest.raises(FixtureNotFound):
+        _analyze(analyzer, document)
+    assert manifest_path_for(document["output"]).read_text() == good_manifest
+    failed = json.loads(failed_manifest_path_for(document["output"]).read_text())
+    assert failed["status"] == "failed"
+    assert not any_open()  # a missing recording says nothing about the service's health
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+import pytest
+
+from build_graph import consolidation_needed, input_fingerprint, plan_builds, rebuild_reason
+from instrumentation import manifest_path_for
+from model_router import routing_fingerprint
+
+
+ROUTING = routing_fingerprint(["fast", "strong"])
+
+
+@pytest.fixture
+def entry(tmp_path):
+    """Batch entry for one bank whose result was built from its current inputs."""
+    paths = {}
+    for name, content in (("pdf", b"%PDF-1.7 supplement"), ("user_prompt", b"user"), ("system_prompt", b"system")):
+        paths[name] = tmp_path / f"{name}.txt"
+        paths[name].write_bytes(content)
+    config = {"bank": "JPMorgan", "pdfs": [str(paths["pdf"])], "user_prompt": str(paths["user_prompt"]),
+              "system_prompt": str(paths["system_prompt"]), "output": str(tmp_path / "JPMorgan.json")}
+    _build(config, "Q12025")
+    return config
+
+
+def _build(config, quarter, routing=ROUTING, deployment="fast"):
+    with open(config["output"], "w") as f:
+        json.dump({"metrics": {}}, f)
+    inputs = input_fingerprint(config["pdfs"], config["user_prompt"], config["system_prompt"], quarter, routing)
+    manifest_path_for(config["output"]).write_text(json.dumps(
+        {"status": "success", "inputs": {**inputs, "deployment": deployment}}))
+
+
+def _touch(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    os.utime(path, (time.time() + 5, time.time() + 5))
+
+
+def test_unchanged_inputs_are_up_to_date(entry):
+    assert rebuild_reason(entry, "Q12025", ROUTING) is None
+    assert plan_builds([entry], "Q12025", ROUTING) == ([], [entry])
+    (stale,), _ = plan_builds([entry], "Q12025", ROUTING, force=True)
+    assert stale["rebuild_reason"] == "forced"
+
+
+def test_changed_inputs_invalidate_the_result(entry):
+    assert rebuild_reason(entry, "Q22025", ROUTING) == "changed: quarter"
+    assert rebuild_reason(entry, "Q12025", routing_fingerprint(["strong"])) == "changed: routing, deployment"
+    _touch(entry["user_prompt"], b"user, reworded")
+    _touch(entry["pdfs"][0], b"%PDF-1.7 restated")
+    (stale,), up_to_date = plan_builds([entry], "Q12025", ROUTING)
+    assert stale["rebuild_reason"] == "changed: pdf, user_prompt"
+    assert up_to_date == []
+
+
+def test_missing_or_failed_builds_are_rebuilt(entry):
+    manifest_path_for(entry["output"]).write_text(json.dumps({"status": "failed"}))
+    assert rebuild_reason(entry, "Q12025", ROUTING) == "no successful build recorded"
+    os.remove(entry["output"])
+    assert rebuild_reason(entry, "Q12025", ROUTING) == "no previous result"
+
+
+def test_consolidation_follows_the_bank_results(entry, tmp_path):
+    consolidated = tmp_path / "consolidated.json"
+    assert consolidation_needed([entry], str(consolidated))
+    consolidated.write_text(json.dumps({"banks": {"JPMorgan": {}}}))
+    os.utime(consolidated, (time.time() + 5, time.time() + 5))
+    assert not consolidation_needed([entry], str(consolidated))
+    consolidated.write_text(json.dumps({"banks": {"JPMorgan": {}, "Citi": {}}}))
+    os.utime(consolidated, (time.time() + 5, time.time() + 5))
+    assert consolidation_needed([entry], str(consolidated))  # covers a bank that is no longer in the batch
+    _touch(entry["output"], b"{}")
+    consolidated.write_text(json.dumps({"banks": {"JPMorgan": {}}}))
+    assert consolidation_needed([entry], str(consolidated))  # older than the rebuilt result
@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+import circuit_breaker
+import pdf_analyzer
+from azure_fixtures import FixtureNotFound
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, is_service_failure
+from conftest import FakeChatClient
+from instrumentation import stage
+from latency_control import HedgedCaller
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _fail(error):
+    def call():
+        raise error
+    return call
+
+
+def test_only_service_failures_are_counted():
+    for error in (TimeoutError(), ConnectionError(), HTTPError(503), HTTPError(429),
+                  type("APITimeoutError", (Exception,), {})()):
+        assert is_service_failure(error), error
+    for error in (ValueError(), FileNotFoundError(), FixtureNotFound("missing"), HTTPError(400), HTTPError(404)):
+        assert not is_service_failure(error), error
+
+
+def test_breaker_opens_after_consecutive_failures_and_rejects_calls():
+    breaker = CircuitBreaker("svc", failure_threshold=2, reset_seconds=60)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail(ConnectionError("refused")))
+    assert breaker.state == OPEN
+    calls = []
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("svc", failure_threshold=2, reset_seconds=60)
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail(TimeoutError()))
+    breaker.call(lambda: "ok")
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail(TimeoutError()))
+    assert breaker.state == CLOSED
+
+
+def test_non_service_errors_leave_the_breaker_closed():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_seconds=60)
+    for error in (ValueError("bad json"), HTTPError(400), FixtureNotFound("missing")):
+        with pytest.raises(type(error)):
+            breaker.call(_fail(error))
+    assert breaker.to_dict() == {"state": CLOSED, "consecutive_failures": 0}
+
+
+def test_half_open_trial_closes_or_reopens_the_breaker():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_seconds=0.05)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail(ConnectionError()))
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail(ConnectionError()))  # failed trial: open again at once
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    # Only one trial at a time; a concurrent caller is rejected
+    nested = []
+
+    def trial():
+        with pytest.raises(CircuitOpen):
+            breaker.call(lambda: nested.append(1))
+        return "ok"
+
+    assert breaker.call(trial) == "ok"
+    assert nested == []
+    assert breaker.state == CLOSED
+
+
+def test_non_service_error_in_a_trial_does_not_block_the_next_trial():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_seconds=0.05)
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail(ConnectionError()))
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        breaker.call(_fail(ValueError()))
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_open_openai_breaker_stops_chat_calls(analyzer, monkeypatch):
+    monkeypatch.setitem(circuit_breaker._breakers, "openai",
+                        CircuitBreaker("openai", failure_threshold=1, reset_seconds=60))
+    monkeypatch.setattr(pdf_analyzer, "DEADLINE_MAX_RETRIES", 0)
+    client = FakeChatClient(TimeoutError("read timed out"))
+    analyzer._openai_client = client
+    analyzer.hedger = HedgedCaller(enabled=False)
+    with stage("chat_completion"):
+        with pytest.raises(TimeoutError):
+            analyzer._process_with_openai("system", "user", "tables")
+        with pytest.raises(CircuitOpen):
+            analyzer._process_with_openai("system", "user", "tables")
+    assert len(client.requests) == 1
+    assert circuit_breaker.any_open()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+
+import pytest
+
+import document_catalog
+from conftest import FakeChatClient, chat_response
+from document_catalog import DocumentCatalog, LayoutArtifactStore, get_document_catalog, select_documents
+from instrumentation import manifest_path_for
+from table_extraction import ExtractedLayout, TableExtractor
+from table_ir import TableGrid
+from utils import create_batch_config, register_documents
+
+
+@pytest.fixture
+def base_dir(tmp_path, monkeypatch):
+    """Project root with Q12025 documents for two banks; the process-wide catalogs start empty."""
+    monkeypatch.setattr(document_catalog, "_catalogs", {})
+    for bank, names in (("JPMorgan", ["supplement_jpm.pdf", "supplement_jpm_extracted.pdf"]),
+                        ("WellsFargo", ["supplement_wf.pdf", "credit supplement_wf.pdf", "press release.pdf"])):
+        folder = tmp_path / "documents" / "Q12025" / bank
+        folder.mkdir(parents=True)
+        for name in names:
+            (folder / name).write_bytes(f"%PDF-1.7 {bank} {name}".encode())
+    (tmp_path / "documents" / "Q12025" / "EmptyBank").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Paths hashed by the catalog."""
+    paths = []
+    real = document_catalog.file_sha256
+
+    def file_sha256(path):
+        paths.append(os.path.basename(path))
+        return real(path)
+
+    monkeypatch.setattr(document_catalog, "file_sha256", file_sha256)
+    return paths
+
+
+def test_refresh_only_rehashes_changed_documents(base_dir, hashed):
+    catalog = DocumentCatalog(str(base_dir / "cache" / "catalog.json"), str(base_dir / "documents"))
+    catalog.refresh("Q12025")
+    assert len(hashed) == 5
+    catalog.save()
+
+    # A new process reads the persisted catalog and finds nothing to redo
+    hashed.clear()
+    catalog = DocumentCatalog(str(base_dir / "cache" / "catalog.json"), str(base_dir / "documents"))
+    catalog.refresh("Q12025")
+    assert hashed == []
+
+    changed = base_dir / "documents" / "Q12025" / "JPMorgan" / "supplement_jpm.pdf"
+    changed.write_bytes(b"%PDF-1.7 restated")
+    os.utime(changed, (time.time() + 5, time.time() + 5))
+    catalog.refresh("Q12025")
+    assert hashed == ["supplement_jpm.pdf"]
+
+
+def test_removed_documents_and_folders_leave_the_catalog(base_dir):
+    catalog = DocumentCatalog(str(base_dir / "catalog.json"), str(base_dir / "documents"))
+    catalog.refresh("Q12025")
+    folder = base_dir / "documents" / "Q12025" / "JPMorgan"
+    for pdf in folder.iterdir():
+        pdf.unlink()
+    folder.rmdir()
+    catalog.refresh("Q12025")
+    assert not catalog.has_folder("Q12025", "JPMorgan")
+    assert catalog.documents_for("Q12025", "JPMorgan") == []
+    assert catalog.banks_for("Q12025") == ["EmptyBank", "WellsFargo"]
+
+
+def test_full_supplement_is_left_out_when_its_extract_is_present():
+    paths = ["/d/a_extracted.pdf", "/d/a.pdf", "/d/b.pdf"]
+    assert select_documents(paths) == ["/d/a_extracted.pdf", "/d/b.pdf"]
+
+
+def test_batch_config_lists_every_relevant_document_and_skips_banks_without_any(base_dir):
+    batch = create_batch_config(["JPMorgan", "WellsFargo", "EmptyBank", "Missing"], "Q12025", str(base_dir))
+    pdfs = {config["bank"]: [os.path.basename(path) for path in config["pdfs"]] for config in batch}
+    assert pdfs == {
+        "JPMorgan": ["supplement_jpm_extracted.pdf"],
+        "WellsFargo": ["credit supplement_wf.pdf", "supplement_wf.pdf"],
+    }
+    # Planning has no side effects; registering the documents persists the catalog
+    assert not (base_dir / "cache" / "document_catalog.json").exists()
+    register_documents(batch, "Q12025", str(base_dir))
+    assert (base_dir / "cache" / "document_catalog.json").exists()
+
+
+def test_byte_identical_documents_are_found_across_quarters(base_dir):
+    reused = base_dir / "documents" / "Q22025" / "JPMorgan"
+    reused.mkdir(parents=True)
+    source = base_dir / "documents" / "Q12025" / "JPMorgan" / "supplement_jpm.pdf"
+    (reused / "supplement_jpm.pdf").write_bytes(source.read_bytes())
+    catalog = get_document_catalog(str(base_dir))
+    catalog.refresh()
+    assert catalog.duplicates_of(str(reused / "supplement_jpm.pdf")) == ["Q12025/JPMorgan/supplement_jpm.pdf"]
+    assert catalog.register(str(reused / "supplement_jpm.pdf"), "Q22025", "JPMorgan") == \
+        catalog.fingerprint(str(source))["sha256"]
+
+
+def test_all_documents_of_a_bank_go_into_one_completion(analyzer, tmp_path):
+    class FakeExtractor(TableExtractor):
+        def extract(self, pdf_path):
+            name = os.path.basename(pdf_path)
+            return ExtractedLayout([TableGrid([["Source"], [name]])], confidence=1.0, backend="fake")
+
+    folder = tmp_path / "WellsFargo"
+    folder.mkdir()
+    pdfs = []
+    for name in ("credit supplement.pdf", "supplement.pdf"):
+        (folder / name).write_bytes(f"%PDF-1.7 {name}".encode())
+        pdfs.append(str(folder / name))
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Quarters: {{quarter_list}}")
+    client = FakeChatClient(chat_response("{}"))
+    analyzer.table_extractor = FakeExtractor()
+    analyzer._openai_client = client
+    output = str(tmp_path / "results" / "WellsFargo.json")
+
+    analyzer.analyze_pdf(pdfs, str(prompt), str(prompt), output_filename=output, latest_quarter="Q12025")
+    user_message = client.requests[0]["messages"][1]["content"]
+    assert "## Document: credit supplement.pdf" in user_message
+    assert "## Document: supplement.pdf" in user_message
+    manifest = json.loads(manifest_path_for(output).read_text())
+    assert manifest["bank"] == "WellsFargo"
+    assert len(manifest["inputs"]["pdf"]) == 2
+
+
+def test_layout_artifacts_are_keyed_by_backend_and_format_version(tmp_path, monkeypatch):
+    store = LayoutArtifactStore(str(tmp_path / "layouts"))
+    store.put("abc", "local", ExtractedLayout([TableGrid([["NCL", "1.2"]])], confidence=0.9, backend="local"))
+    assert store.get("abc", "local").tables[0].cell(0, 1) == "1.2"
+    assert store.get("abc", "remote") is None  # a pdfplumber layout is not a Document Intelligence one
+    monkeypatch.setattr(document_catalog, "LAYOUT_FORMAT_VERSION", document_catalog.LAYOUT_FORMAT_VERSION + 1)
+    assert store.get("abc", "local") is None
@@ -0,0 +1,129 @@
+import time
+import threading
+
+import pytest
+
+import latency_control
+import pdf_analyzer
+from conftest import FakeChatClient, chat_response
+from instrumentation import stage
+from latency_control import DeadlineExceeded, HedgedCaller, remaining_seconds
+
+
+def test_deadline_stops_waiting_for_a_slow_call():
+    hedger = HedgedCaller(enabled=False)
+    started = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        hedger.call("chat_completion", lambda: time.sleep(1.0), deadline=0.1)
+    assert time.perf_counter() - started < 0.5
+
+
+def test_attempt_sees_what_is_left_of_the_deadline():
+    hedger = HedgedCaller(enabled=False)
+    assert remaining_seconds() is None
+    remaining = hedger.call("chat_completion", remaining_seconds, deadline=5.0)
+    assert 4.0 < remaining <= 5.0
+
+
+def test_call_slower_than_p95_is_hedged_and_first_result_wins():
+    hedger = HedgedCaller(enabled=True, budget=1.0, min_samples=3, percentile=95)
+    for _ in range(3):
+        hedger.call("chat_completion", lambda: time.sleep(0.01))
+
+    attempts = []
+    discarded = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            attempts.append(len(attempts))
+            first = len(attempts) == 1
+        time.sleep(0.5 if first else 0.01)
+        return "primary" if first else "hedge"
+
+    result = hedger.call("chat_completion", call, deadline=5.0, on_discard=discarded.append)
+    assert result == "hedge"
+    assert len(attempts) == 2
+    assert hedger.stats()["chat_completion"]["hedges"] == 1
+    time.sleep(0.6)  # the abandoned primary still finishes; its result is handed over
+    assert discarded == ["primary"]
+
+
+def test_hedges_are_capped_by_the_budget():
+    hedger = HedgedCaller(enabled=True, budget=0.0, min_samples=1)
+    hedger.call("chat_completion", lambda: time.sleep(0.01))
+    calls = []
+    hedger.call("chat_completion", lambda: calls.append(1) or time.sleep(0.1), deadline=5.0)
+    assert len(calls) == 1
+    assert hedger.stats()["chat_completion"]["hedges"] == 0
+
+
+def test_failed_attempt_does_not_beat_a_successful_one():
+    hedger = HedgedCaller(enabled=True, budget=1.0, min_samples=1)
+    hedger.call("chat_completion", lambda: time.sleep(0.01))
+    attempts = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            attempts.append(1)
+            first = len(attempts) == 1
+        if first:
+            time.sleep(0.2)
+            return "slow but fine"
+        raise ConnectionError("reset")
+
+    assert hedger.call("chat_completion", call, deadline=5.0) == "slow but fine"
+
+
+def test_client_call_is_bounded_by_the_remaining_deadline(analyzer):
+    client = FakeChatClient(chat_response('{"ok": 1}'))
+    analyzer._openai_client = client
+    analyzer.hedger = HedgedCaller(enabled=False)
+    with stage("chat_completion"):
+        content = analyzer._process_with_openai("system", "user", "tables")
+    assert content == '{"ok": 1}'
+    (options,) = client.options
+    assert options["max_retries"] == 0  # SDK retries would restart the timeout
+    assert 0 < options["timeout"] <= 180
+
+
+def test_failed_attempt_is_retried_while_the_deadline_allows(analyzer, monkeypatch):
+    monkeypatch.setattr(pdf_analyzer, "RETRY_BACKOFF_SECONDS", 0.01)
+    client = FakeChatClient(TimeoutError("read timed out"), chat_response('{"ok": 1}'))
+    analyzer._openai_client = client
+    analyzer.hedger = HedgedCaller(enabled=False)
+    with stage("chat_completion"):
+        assert analyzer._process_with_openai("system", "user", "tables") == '{"ok": 1}'
+    assert len(client.requests) == 2
+
+
+def test_no_retry_once_the_backoff_would_pass_the_deadline(analyzer, monkeypatch):
+    monkeypatch.setitem(latency_control.STAGE_DEADLINES, "chat_completion", 1.0)
+    monkeypatch.setattr(pdf_analyzer, "RETRY_BACKOFF_SECONDS", 2.0)
+    client = FakeChatClient(TimeoutError("read timed out"))
+    analyzer._openai_client = client
+    analyzer.hedger = HedgedCaller(enabled=False)
+    with stage("chat_completion"), pytest.raises(TimeoutError):
+        analyzer._process_with_openai("system", "user", "tables")
+    assert len(client.requests) == 1
+
+
+def test_attempts_on_pool_threads_are_profiled_into_the_callers_report(tmp_path):
+    from profiling import profiled, profiling_session
+
+    hedger = HedgedCaller(enabled=False)
+
+    def busy_completion():
+        return sum(i * i for i in range(20000))
+
+    @profiled("analyze")
+    def analyze():
+        return hedger.call("chat_completion", busy_completion, deadline=5.0)
+
+    with profiling_session(str(tmp_path)):
+        analyze()
+    (report,) = tmp_path.glob("*.txt")
+    text = report.read_text()
+    assert "Worker threads profiled: 1" in text
+    assert "busy_completion" in text
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from model_router import ModelRouter
+from result_validation import EXPECTED_METRICS, is_acceptable, parse_metric_value, validate_metrics
+
+
+QUARTERS = ["Q42024", "Q12025"]
+
+
+def _result(value="1.0%"):
+    return {category: {metric: {quarter: value for quarter in QUARTERS} for metric in metrics}
+            for category, metrics in EXPECTED_METRICS.items()}
+
+
+def _validate(content):
+    return validate_metrics(json.loads(content), QUARTERS)
+
+
+def test_metric_values_are_parsed_from_reported_formats():
+    assert parse_metric_value("4.52%") == 4.52
+    assert parse_metric_value("$1,588") == 1588
+    assert parse_metric_value("-$101") == -101
+    assert parse_metric_value("(12.5)") == -12.5
+    assert parse_metric_value("Null") is None
+    with pytest.raises(ValueError):
+        parse_metric_value("about four")
+
+
+def test_values_outside_the_sanity_ranges_are_blocking():
+    assert validate_metrics(_result(), QUARTERS) == []
+    result = _result()
+    result["metrics"]["Net Credit Loss Rate (%)"]["Q12025"] = "52%"
+    result["metrics"]["Outstanding Balance ($ in millions)"]["Q12025"] = "$250,000"  # unbounded above
+    result["metrics"]["30+ Delinquency Rate (%)"]["Q42024"] = "n/a"
+    result["computed_metrics"]["Coverage Ratio (%)"]["Q42024"] = "Null"  # tolerated
+    issues = validate_metrics(result, QUARTERS)
+    assert [(issue["kind"], issue["metric"], issue["quarter"]) for issue in issues] == [
+        ("missing", "30+ Delinquency Rate (%)", "Q42024"),
+        ("out_of_range", "Net Credit Loss Rate (%)", "Q12025"),
+    ]
+    assert not is_acceptable(issues)
+    assert is_acceptable(validate_metrics({**_result(), "computed_metrics": _result("Null")["computed_metrics"]},
+                                          QUARTERS))
+
+
+def test_structural_problems_are_reported():
+    (issue,) = validate_metrics({"raw_output": "not json"}, QUARTERS)
+    assert issue["kind"] == "structure"
+    result = _result()
+    del result["metrics"]["Net Credit Loss Rate (%)"]["Q12025"]
+    assert [issue["detail"] for issue in validate_metrics(result, QUARTERS)] == ["missing quarter"]
+
+
+def test_failed_validation_escalates_to_the_strong_tier():
+    calls = []
+    outputs = {"fast": json.dumps(_result("85%")), "strong": json.dumps(_result())}
+    router = ModelRouter(["fast", "strong"])
+
+    def call(deployment):
+        calls.append(deployment)
+        return outputs[deployment]
+
+    content, deployment, issues = router.complete(call, _validate, bank="A")
+    assert (deployment, issues, calls) == ("strong", [], ["fast", "strong"])
+    content, deployment, _ = router.complete(lambda name: json.dumps(_result()), _validate, bank="B")
+    assert deployment == "fast"
+    assert router.escalation_rates() == {"A": {"routed": 1, "escalated": 1, "rate": 1.0},
+                                         "B": {"routed": 1, "escalated": 0, "rate": 0.0}}
+
+
+def test_the_strong_tier_output_is_returned_even_if_it_still_fails():
+    router = ModelRouter(["fast", "strong"])
+    content, deployment, issues = router.complete(lambda name: json.dumps(_result("85%")), _validate, bank="A")
+    assert deployment == "strong"
+    assert not is_acceptable(issues)
+
+
+def test_banks_that_keep_escalating_skip_the_fast_tier_across_runs(tmp_path):
+    stats_path = str(tmp_path / "routing" / "stats.json")
+    router = ModelRouter(["fast", "strong"], stats_path=stats_path, sticky_min_samples=2)
+    failing_fast = {"fast": json.dumps(_result("85%")), "strong": json.dumps(_result())}
+    for _ in range(2):
+        router.complete(failing_fast.get, _validate, bank="A")
+    assert router.tiers_for("A") == ["strong"]
+    assert router.tiers_for("B") == ["fast", "strong"]
+
+    restarted = ModelRouter(["fast", "strong"], stats_path=stats_path, sticky_min_samples=2)
+    calls = []
+    _, deployment, _ = restarted.complete(lambda name: calls.append(name) or failing_fast[name], _validate, bank="A")
+    assert calls == ["strong"] and deployment == "strong"
+    assert restarted.escalation_rates()["A"] == {"routed": 3, "escalated": 3, "rate": 1.0}
+    assert ModelRouter(["strong"]).tiers_for("A") == ["strong"]
@@ -0,0 +1,67 @@
+from result_repair import cells_to_repair, merge_repair, relevant_tables, salvage_json
+
+
+NCL_RATE = "Net Credit Loss Rate (%)"
+DELINQUENCY = "30+ Delinquency Rate (%)"
+
+
+def test_salvage_parses_fenced_and_surrounded_json():
+    assert salvage_json('```json\n{"a": 1}\n```') == {"a": 1}
+    assert salvage_json('Here are the metrics: {"a": 1} Let me know.') == {"a": 1}
+    assert salvage_json("no json at all") is None
+    assert salvage_json("[1, 2]") is None
+
+
+def test_salvage_closes_truncated_output_at_the_last_complete_value():
+    truncated = '{"metrics": {"%s": {"Q12025": "5.1%%", "Q42024": "4.9%%"}, "%s": {"Q12025": "3.' % (
+        NCL_RATE, DELINQUENCY)
+    assert salvage_json(truncated) == {"metrics": {NCL_RATE: {"Q12025": "5.1%", "Q42024": "4.9%"}}}
+
+
+def test_salvage_falls_back_to_individual_metric_objects():
+    text = 'garbage {{ "%s": {"Q12025": "5.1%%"} ]] more' % NCL_RATE
+    assert salvage_json(text) == {"metrics": {NCL_RATE: {"Q12025": "5.1%"}}}
+
+
+def test_cells_to_repair_expands_issues_in_schema_order():
+    issues = [
+        {"kind": "out_of_range", "category": "metrics", "metric": NCL_RATE, "quarter": "Q12025"},
+        {"kind": "missing", "category": "metrics", "metric": DELINQUENCY, "quarter": None},
+        {"kind": "missing_computed", "category": "computed_metrics", "metric": "Coverage Ratio (%)",
+         "quarter": "Q12025"},
+    ]
+    assert cells_to_repair(issues, ["Q42024", "Q12025"]) == [
+        ("metrics", DELINQUENCY, "Q42024"),
+        ("metrics", DELINQUENCY, "Q12025"),
+        ("metrics", NCL_RATE, "Q12025"),
+    ]
+
+
+def test_merge_takes_only_requested_valid_cells():
+    result = {"metrics": {NCL_RATE: {"Q12025": "", "Q42024": "4.9%"}}}
+    repair = {"metrics": {
+        NCL_RATE: {"Q12025": "5.1%"},
+        DELINQUENCY: {"Q12025": "85%", "Q42024": "2.0%"},  # 85% is out of range
+    }}
+    cells = [("metrics", NCL_RATE, "Q12025"), ("metrics", DELINQUENCY, "Q12025")]
+    assert merge_repair(result, repair, cells) == 1
+    assert result == {"metrics": {NCL_RATE: {"Q42024": "4.9%", "Q12025": "5.1%"}}}  # chronological
+
+
+def test_merge_skips_malformed_sections():
+    result = {"metrics": ["not", "a", "dict"]}
+    cells = [("metrics", NCL_RATE, "Q12025"), ("computed_metrics", "Coverage Ratio (%)", "Q12025")]
+    repair = {"metrics": {NCL_RATE: {"Q12025": "5.1%"}}, "computed_metrics": ["Coverage", "12%"]}
+    assert merge_repair(result, repair, cells) == 1
+    assert result == {"metrics": {NCL_RATE: {"Q12025": "5.1%"}}}
+    assert merge_repair(result, {"metrics": "5.1%"}, cells) == 0
+    assert merge_repair(result, None, cells) == 0
+
+
+def test_relevant_tables_keeps_tables_mentioning_the_metrics():
+    markdown = ("### Table 1\n\n| Net charge-offs | 1.2 |\n\n"
+                "### Table 2\n\n| Headcount | 100 |\n\n"
+                "### Table 3\n\n| Allowance for loan losses | 3.4 |")
+    selected = relevant_tables(markdown, [NCL_RATE])
+    assert "Table 1" in selected
+    assert "Headcount" not in selected
@@ -0,0 +1,108 @@
+import json
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+import revalidation
+from circuit_breaker import get_breaker
+from revalidation import Revalidator
+from scheduler import BACKFILL
+
+
+class FakeScheduler:
+    """Keeps submitted work pending until the test resolves its future."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args, priority, fair_key=None, **kwargs):
+        future = Future()
+        self.submitted.append({"args": args, "priority": priority, "fair_key": fair_key, "future": future})
+        return future
+
+
+@pytest.fixture
+def consolidated(monkeypatch):
+    quarters = []
+    monkeypatch.setattr(revalidation, "consolidate_quarter", lambda base_dir, quarter: quarters.append(quarter))
+    return quarters
+
+
+def _raise(error):
+    raise error
+
+
+def _open_circuit(name="openai"):
+    breaker = get_breaker(name)
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(lambda: _raise(ConnectionError("refused")))
+
+
+def test_each_bank_is_refreshed_once_at_backfill_priority(consolidated):
+    scheduler = FakeScheduler()
+    revalidator = Revalidator(scheduler, lambda: "analyzer", "base")
+    assert revalidator.refresh("Q12025", ["A", "B"]) == ["A", "B"]
+    assert revalidator.refresh("Q12025", ["A", "C"]) == ["A", "B", "C"]
+    assert [(s["fair_key"], s["priority"]) for s in scheduler.submitted] == [
+        ("A", BACKFILL), ("B", BACKFILL), ("C", BACKFILL)]
+
+    for submitted in scheduler.submitted[:2]:
+        submitted["future"].set_result("analyzed")
+    assert revalidator.refreshing("Q12025") == ["C"]
+    assert consolidated == []  # C is still running
+    scheduler.submitted[2]["future"].set_exception(RuntimeError("boom"))
+    assert revalidator.status() == {}
+    assert consolidated == ["Q12025"]
+
+
+def test_nothing_is_refreshed_while_a_circuit_is_open(consolidated):
+    _open_circuit()
+    scheduler = FakeScheduler()
+    revalidator = Revalidator(scheduler, lambda: "analyzer", "base")
+    assert revalidator.refresh("Q12025", ["A"]) == []
+    assert scheduler.submitted == []
+
+
+def test_last_good_results_are_served_with_their_freshness(tmp_path, monkeypatch):
+    import app
+
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(app, "REVALIDATOR", Revalidator(scheduler, lambda: "analyzer", str(tmp_path)))
+    monkeypatch.setattr(app, "_get_dashboard", lambda quarter: _raise(RuntimeError("no plotly")))
+    results_path = tmp_path / "consolidated_results.json"
+    results_path.write_text(json.dumps({"A": {"metrics": {}}}))
+    run_config = SimpleNamespace(extra={"run_id": "api-1"})
+
+    with app.app.test_request_context():
+        response, status = app._serve_last_good(str(results_path), "Q12025", "inline",
+                                                [{"bank": "A"}], run_config)
+    body = response.get_json()
+    assert status == 200
+    assert body["consolidated_results"] == {"A": {"metrics": {}}}
+    assert body["freshness"]["stale"] is True
+    assert body["freshness"]["outdated_banks"] == ["A"]
+    assert body["freshness"]["refreshing"] == ["A"]
+    assert scheduler.submitted[0]["args"][-1] == "api-1"  # refresh charged to the request's run
+
+
+def test_circuit_error_is_reported_when_serving_stale(tmp_path, monkeypatch):
+    import app
+
+    _open_circuit("openai")
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(app, "REVALIDATOR", Revalidator(scheduler, lambda: "analyzer", str(tmp_path)))
+    monkeypatch.setattr(app, "_get_dashboard", lambda quarter: _raise(RuntimeError("no plotly")))
+    results_path = tmp_path / "consolidated_results.json"
+    results_path.write_text("{}")
+
+    with app.app.test_request_context():
+        response, status = app._serve_last_good(str(results_path), "Q12025", "inline", [{"bank": "A"}],
+                                                SimpleNamespace(extra={"run_id": "api-1"}), error="A: circuit open")
+    freshness = response.get_json()["freshness"]
+    assert status == 200
+    assert freshness["error"] == "A: circuit open"
+    assert freshness["refreshing"] == []  # no refreshes during an incident
+    assert freshness["circuits"]["openai"]["state"] == "open"
+    assert scheduler.submitted == []
@@ -0,0 +1,72 @@
+import pytest
+
+from conftest import FakeChatClient, chat_response
+from run_journal import RunJournal
+from table_extraction import ExtractedLayout, TableExtractor
+from table_ir import TableGrid
+
+
+class CountingExtractor(TableExtractor):
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    def extract(self, pdf_path):
+        self.calls += 1
+        return ExtractedLayout([TableGrid([["Net Credit Loss Rate (%)", "5.1%"]])], confidence=1.0, backend="fake")
+
+
+@pytest.fixture
+def bank_inputs(tmp_path):
+    folder = tmp_path / "JPMorgan"
+    folder.mkdir()
+    pdf = folder / "supplement.pdf"
+    pdf.write_bytes(b"%PDF-1.7 supplement")
+    prompt = tmp_path / "prompt.txt"
+    prompt.write_text("Quarters: {{quarter_list}}")
+    return str(pdf), str(prompt), str(tmp_path / "results" / "JPMorgan.json")
+
+
+def test_resumed_journal_keeps_its_metadata(tmp_path):
+    journal = RunJournal(str(tmp_path / "runs"), quarter="Q12025")
+    resumed = RunJournal(str(tmp_path / "runs"), run_id=journal.run_id)
+    assert resumed.resumed and resumed.metadata["quarter"] == "Q12025"
+    with pytest.raises(FileNotFoundError):
+        RunJournal(str(tmp_path / "runs"), run_id="unknown")
+    with pytest.raises(ValueError):
+        journal.bank("A").save("upload", {})
+
+
+def test_checkpoints_are_dropped_when_inputs_change(tmp_path):
+    checkpoint = RunJournal(str(tmp_path / "runs")).bank("JPMorgan")
+    checkpoint.bind_inputs({"pdf": "a"})
+    checkpoint.save("layout", "tables")
+    checkpoint.bind_inputs({"pdf": "a"})
+    assert checkpoint.completed_stages() == ["layout"]
+    checkpoint.bind_inputs({"pdf": "b"})
+    assert checkpoint.completed_stages() == []
+
+
+def test_interrupted_run_resumes_after_its_last_completed_stage(analyzer, bank_inputs, tmp_path):
+    pdf, prompt, output = bank_inputs
+    extractor = CountingExtractor()
+    analyzer.table_extractor = extractor
+    journal = RunJournal(str(tmp_path / "runs"))
+
+    # The completion fails after the layout was checkpointed
+    analyzer._openai_client = FakeChatClient(RuntimeError("connection reset"))
+    with pytest.raises(RuntimeError):
+        analyzer.analyze_pdf(pdf, prompt, prompt, output_filename=output,
+                             checkpoint=journal.bank("JPMorgan"), latest_quarter="Q12025")
+    assert journal.bank("JPMorgan").completed_stages() == ["layout"]
+
+    client = FakeChatClient(chat_response("{}"))
+    analyzer._openai_client = client
+    checkpoint = RunJournal(str(tmp_path / "runs"), run_id=journal.run_id).bank("JPMorgan")
+    analyzer.analyze_pdf(pdf, prompt, prompt, output_filename=output, checkpoint=checkpoint,
+                         latest_quarter="Q12025")
+    assert extractor.calls == 1
+    assert "5.1%" in client.requests[0]["messages"][1]["content"]
+    assert checkpoint.is_done()
+    assert checkpoint.load("done") == output
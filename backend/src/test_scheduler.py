@@ -0,0 +1,72 @@
+import threading
+import time
+
+from scheduler import AnalysisScheduler, BACKFILL, INTERACTIVE
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def _blocked(scheduler):
+    """Occupy a worker until the returned event is set."""
+    gate = threading.Event()
+    started = threading.Event()
+    scheduler.submit(lambda: started.set() or gate.wait(2.0))
+    assert started.wait(2.0)
+    return gate
+
+
+def test_interactive_work_is_dispatched_before_queued_backfill():
+    scheduler = AnalysisScheduler(max_concurrency=1, backfill_share=1.0)
+    gate = _blocked(scheduler)
+    order = []
+    backfill = scheduler.submit(order.append, "backfill", priority=BACKFILL, fair_key="A")
+    interactive = scheduler.submit(order.append, "interactive", priority=INTERACTIVE)
+    gate.set()
+    backfill.result(2.0), interactive.result(2.0)
+    assert order == ["interactive", "backfill"]
+    scheduler.shutdown()
+
+
+def test_backfill_is_capped_and_leaves_slots_to_interactive_work():
+    scheduler = AnalysisScheduler(max_concurrency=4, backfill_share=0.5)
+    gate = threading.Event()
+    for i in range(4):
+        scheduler.submit(gate.wait, 2.0, priority=BACKFILL, fair_key=f"bank{i}")
+    _wait_for(lambda: scheduler.stats()["running"][BACKFILL] == 2)
+    time.sleep(0.05)
+    stats = scheduler.stats()
+    assert stats["backfill_limit"] == 2
+    assert stats["running"][BACKFILL] == 2
+    assert stats["queued"][BACKFILL] == 2
+    # Free slots still serve interactive requests at once
+    assert scheduler.submit(lambda: "done").result(1.0) == "done"
+    gate.set()
+    scheduler.shutdown(cancel_pending=False)
+    assert scheduler.stats()["completed"][BACKFILL] == 4
+
+
+def test_backfill_is_round_robined_across_banks():
+    scheduler = AnalysisScheduler(max_concurrency=1, backfill_share=1.0)
+    gate = _blocked(scheduler)
+    order = []
+    futures = [scheduler.submit(order.append, f"{bank}{n}", priority=BACKFILL, fair_key=bank)
+               for bank, n in (("A", 1), ("A", 2), ("A", 3), ("B", 1), ("B", 2))]
+    gate.set()
+    for future in futures:
+        future.result(2.0)
+    assert order == ["A1", "B1", "A2", "B2", "A3"]
+    scheduler.shutdown()
+
+
+def test_shutdown_cancels_pending_work():
+    scheduler = AnalysisScheduler(max_concurrency=1)
+    gate = _blocked(scheduler)
+    pending = scheduler.submit(lambda: "never")
+    threading.Timer(0.05, gate.set).start()
+    scheduler.shutdown()
+    assert pending.cancelled()
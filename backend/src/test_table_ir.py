@@ -0,0 +1,64 @@
+import json
+import pickle
+from types import SimpleNamespace
+
+from document_catalog import LayoutArtifactStore
+from table_extraction import ExtractedLayout, TableExtractor
+from table_ir import TableGrid
+
+
+def _grid():
+    return TableGrid([["Metric", "Q1 2025", "Q4 2024"], ["Net Credit Loss Rate (%)", "5.1%"]],
+                     page_number=3, bbox=(0.5, 1.0, 7.5, 4.25), spans=((0, 1, 1, 2),))
+
+
+def test_grid_pads_short_rows_and_counts_non_empty_cells():
+    grid = _grid()
+    assert (grid.row_count, grid.column_count) == (2, 3)
+    assert list(grid.rows())[1] == ["Net Credit Loss Rate (%)", "5.1%", ""]
+    assert grid.cell_count == 5
+
+
+def test_grid_round_trips_through_json_and_pickle():
+    grid = _grid()
+    restored = TableGrid.from_dict(json.loads(json.dumps(grid.to_dict())))
+    for copy in (restored, pickle.loads(pickle.dumps(grid))):
+        assert list(copy.rows()) == list(grid.rows())
+        assert (copy.page_number, copy.bbox, copy.spans) == (3, (0.5, 1.0, 7.5, 4.25), ((0, 1, 1, 2),))
+
+
+def test_grid_from_sdk_table():
+    cells = [SimpleNamespace(row_index=0, column_index=0, content="Metric", row_span=None, column_span=2),
+             SimpleNamespace(row_index=1, column_index=1, content="1.2", row_span=None, column_span=None)]
+    region = SimpleNamespace(page_number=2, polygon=[1, 1, 5, 1, 5, 3, 1, 3])
+    table = SimpleNamespace(row_count=2, column_count=2, cells=cells, bounding_regions=[region])
+    grid = TableGrid.from_sdk_table(table)
+    assert list(grid.rows()) == [["Metric", ""], ["", "1.2"]]
+    assert grid.page_number == 2
+    assert grid.spans == ((0, 0, 1, 2),)
+
+
+def test_cached_layout_is_rendered_from_the_stored_tables(analyzer, tmp_path):
+    class CountingExtractor(TableExtractor):
+        name = "remote"
+        calls = 0
+
+        def extract(self, pdf_path):
+            CountingExtractor.calls += 1
+            return ExtractedLayout([_grid()], confidence=1.0, backend="remote", billed_pages=4)
+
+    analyzer.table_extractor = CountingExtractor()
+    analyzer.layout_store = LayoutArtifactStore(str(tmp_path / "layouts"))
+    pdfs = []
+    for folder in ("Q12025", "Q22025"):  # the same supplement dropped into two quarters
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "supplement.pdf").write_bytes(b"%PDF-1.7 same bytes")
+        pdfs.append(str(tmp_path / folder / "supplement.pdf"))
+
+    first = analyzer._get_documents_markdown(pdfs[:1])
+    second = analyzer._get_documents_markdown(pdfs[1:])
+    assert CountingExtractor.calls == 1
+    assert second == first
+    assert "| Net Credit Loss Rate (%) | 5.1% |  |" in second
+    (artifact,) = (tmp_path / "layouts").iterdir()
+    assert artifact.name.endswith(".remote.v1.json")
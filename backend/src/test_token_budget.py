@@ -0,0 +1,53 @@
+import token_budget
+from conftest import FakeChatClient, chat_response
+from instrumentation import stage
+from latency_control import HedgedCaller
+from pdf_analyzer import PDFAnalyzer
+from result_validation import response_schema
+from token_budget import (
+    DEFAULT_MAX_TOKENS, MIN_COMPLETION_TOKENS, completion_cap, estimate_completion_tokens, next_cap
+)
+
+
+def test_cap_is_sized_from_the_response_schema():
+    schema = response_schema(PDFAnalyzer.compute_past_5_quarters("Q12025"))
+    cap = completion_cap(schema)
+    assert cap > estimate_completion_tokens(schema)  # the safety margin
+    assert MIN_COMPLETION_TOKENS <= cap <= token_budget.MAX_COMPLETION_TOKENS
+    fewer_quarters = response_schema(["Q12025"])
+    assert completion_cap(fewer_quarters) < cap
+    assert completion_cap(None) == DEFAULT_MAX_TOKENS
+
+
+def test_next_cap_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(token_budget, "MAX_COMPLETION_TOKENS", 5000)
+    assert next_cap(2000) == 4000
+    assert next_cap(4000) == 5000
+    assert next_cap(5000) is None
+
+
+def _analyzer_with(analyzer, client):
+    analyzer._openai_client = client
+    analyzer.hedger = HedgedCaller(enabled=False)
+    return analyzer
+
+
+def test_truncated_completion_is_retried_with_a_larger_cap(analyzer):
+    client = FakeChatClient(chat_response('{"metrics": {', finish_reason="length"), chat_response('{"ok": 1}'))
+    _analyzer_with(analyzer, client)
+    with stage("chat_completion"):
+        content = analyzer._process_with_openai("system", "user", "tables")
+    assert content == '{"ok": 1}'
+    first, second = (request["max_tokens"] for request in client.requests)
+    assert first == DEFAULT_MAX_TOKENS
+    assert second == 2 * first
+
+
+def test_truncation_at_the_maximum_cap_is_not_retried_again(analyzer, monkeypatch):
+    monkeypatch.setattr(token_budget, "MAX_COMPLETION_TOKENS", 2 * DEFAULT_MAX_TOKENS)
+    client = FakeChatClient(chat_response('{"metrics": {', finish_reason="length"))
+    _analyzer_with(analyzer, client)
+    with stage("chat_completion"):
+        content = analyzer._process_with_openai("system", "user", "tables")
+    assert content == '{"metrics": {'
+    assert [request["max_tokens"] for request in client.requests] == [DEFAULT_MAX_TOKENS, 2 * DEFAULT_MAX_TOKENS]
@@ -0,0 +1,149 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import backfill
+import usage_ledger
+from backfill import Backfill
+from conftest import FakeChatClient, chat_response
+from instrumentation import RunManifest, stage
+from scheduler import AnalysisScheduler
+from table_extraction import ExtractedLayout, TableExtractor
+from usage_ledger import BudgetExceeded, UsageLedger
+
+
+def test_daily_budget_counts_the_expected_usage_of_the_next_call(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.db"), daily_token_budget=100)
+    ledger.charge(prompt_tokens=60, completion_tokens=30)
+    ledger.check(tokens=10)
+    with pytest.raises(BudgetExceeded) as excinfo:
+        ledger.check(tokens=11)
+    assert (excinfo.value.scope, excinfo.value.resource, excinfo.value.used) == ("daily", "tokens", 90)
+
+
+def test_run_budget_only_applies_to_its_run(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.db"), run_page_budget=5)
+    ledger.charge(pages=5, run_id="r1")
+    with pytest.raises(BudgetExceeded) as excinfo:
+        ledger.check("r1")
+    assert excinfo.value.scope == "run"
+    ledger.check("r2")
+
+
+def test_usage_is_attributed_to_the_active_manifest_and_stage(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.db"))
+    with RunManifest(pdf_path="a.pdf", output="a.json", bank="A", quarter="Q12025", run_id="r1"):
+        with stage("chat_completion"):
+            ledger.charge(prompt_tokens=10, completion_tokens=5, deployment="strong")
+    (row,) = ledger.usage(group_by=("run_id", "bank", "quarter", "stage", "deployment"))
+    assert row["run_id"] == "r1" and row["bank"] == "A" and row["quarter"] == "Q12025"
+    assert row["stage"] == "chat_completion" and row["deployment"] == "strong"
+    assert row["tokens"] == 15
+
+
+def test_waiting_pauses_on_the_daily_budget_but_not_on_the_run_budget(tmp_path, monkeypatch):
+    ledger = UsageLedger(str(tmp_path / "usage.db"), run_token_budget=10)
+    ledger.charge(prompt_tokens=10, run_id="r1")
+    with pytest.raises(BudgetExceeded) as excinfo:
+        ledger.wait_for_budget("r1")  # waiting would not help
+    assert excinfo.value.scope == "run"
+
+    ledger.budgets[("daily", "tokens")] = 10
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        ledger.budgets[("daily", "tokens")] = None  # the day rolled over
+
+    monkeypatch.setattr(usage_ledger.time, "sleep", sleep)
+    ledger.wait_for_budget("r2", poll_seconds=1.0)
+    assert sleeps == [1.0]
+
+
+def test_analyzer_refuses_a_completion_that_would_exceed_the_budget(analyzer, tmp_path):
+    analyzer.ledger = UsageLedger(str(tmp_path / "usage.db"), daily_token_budget=500)
+    client = FakeChatClient(chat_response('{"ok": 1}'))
+    analyzer._openai_client = client
+    with pytest.raises(BudgetExceeded):
+        analyzer._process_with_openai("system", "user", "tables")  # reserves the 4000-token cap
+    assert client.requests == []
+
+
+def test_wait_ends_when_stopped(tmp_path):
+    ledger = UsageLedger(str(tmp_path / "usage.db"), daily_token_budget=10)
+    ledger.charge(prompt_tokens=10)
+    stop = threading.Event()
+    threading.Timer(0.05, stop.set).start()
+    assert ledger.wait_for_budget(poll_seconds=10.0, stop=stop) is False
+
+
+def test_layout_is_rejected_before_upload_when_its_pages_exceed_the_budget(analyzer, tmp_path):
+    class BilledExtractor(TableExtractor):
+        name = "remote"
+        calls = 0
+
+        def extract(self, pdf_path):
+            BilledExtractor.calls += 1
+            return ExtractedLayout([], confidence=1.0, backend="remote", billed_pages=3)
+
+    pdf = tmp_path / "supplement.pdf"
+    pdf.write_bytes(b"%PDF-1.7 " + b"<< /Type /Page >> " * 3)
+    analyzer.table_extractor = BilledExtractor()
+    analyzer.ledger = UsageLedger(str(tmp_path / "usage.db"), daily_page_budget=5)
+    analyzer.ledger.charge(pages=3)
+    with pytest.raises(BudgetExceeded) as excinfo:
+        analyzer._get_layout_markdown(str(pdf), "sha")
+    assert excinfo.value.resource == "pages"
+    assert BilledExtractor.calls == 0
+
+
+class _DailyBudgetOnce:
+    """analyze_bank stand-in: the first call hits the daily budget, later ones succeed."""
+
+    def __init__(self, always=False):
+        self.calls = 0
+        self.always = always
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.always or self.calls == 1:
+            raise BudgetExceeded("daily", "tokens", 100, 100)
+        return "analyzed"
+
+
+@pytest.fixture
+def no_consolidation(monkeypatch):
+    monkeypatch.setattr(backfill, "consolidate_quarter", lambda base_dir, quarter: None)
+
+
+def test_backfill_resubmits_deferred_work_and_stops_its_resubmitter(monkeypatch, no_consolidation):
+    monkeypatch.setattr(backfill, "analyze_bank", _DailyBudgetOnce())
+    waits = []
+    ledger = SimpleNamespace(wait_for_budget=lambda run_id, stop=None: waits.append(run_id) or True)
+    scheduler = AnalysisScheduler(max_concurrency=1)
+    run = Backfill(scheduler, SimpleNamespace(ledger=ledger), "base", [("Q12025", "A")]).start()
+    assert run.wait() == {("Q12025", "A"): "analyzed"}
+    assert waits == [run.run_id]
+    assert not run._resubmitter.is_alive()
+    scheduler.shutdown()
+
+
+def test_cancelled_backfill_stops_waiting_for_the_budget(monkeypatch, no_consolidation):
+    monkeypatch.setattr(backfill, "analyze_bank", _DailyBudgetOnce(always=True))
+
+    def wait_for_budget(run_id, stop=None):
+        stop.wait(5.0)
+        return False
+
+    scheduler = AnalysisScheduler(max_concurrency=1)
+    run = Backfill(scheduler, SimpleNamespace(ledger=SimpleNamespace(wait_for_budget=wait_for_budget)),
+                   "base", [("Q12025", "A")]).start()
+    deadline = time.monotonic() + 2.0
+    while run._resubmitter is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    run.cancel()
+    assert run.wait() == {("Q12025", "A"): "cancelled"}
+    assert not run._resubmitter.is_alive()
+    scheduler.shutdown()
@@ -0,0 +1,105 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import backfill
+from usage_ledger import BudgetExceeded
+from work_queue import QueueWorker, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=2)
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.05, max_attempts=3)
+    job = queue.enqueue([("Q12025", "A")])
+    first = queue.claim("w1", job)
+    assert first.attempt == 1
+    assert queue.claim("w2", job) is None  # still leased
+
+    time.sleep(0.1)
+    second = queue.claim("w2", job)
+    assert (second.bank, second.attempt, second.worker_id) == ("A", 2, "w2")
+    # The first worker lost its lease and can no longer finish the task
+    assert not queue.heartbeat(first)
+    assert not queue.complete(first, "analyzed")
+    assert queue.complete(second, "analyzed")
+    assert queue.status(job)["done"] == 1
+
+
+def test_task_fails_once_its_attempts_are_used_up(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0.05, max_attempts=1)
+    job = queue.enqueue([("Q12025", "A")])
+    queue.claim("w1", job)
+    time.sleep(0.1)
+    assert queue.claim("w2", job) is None
+    status = queue.status(job)
+    assert status["failed"] == 1 and status["finished"]
+    assert status["failures"][0]["error"] == "lease expired"
+
+
+def test_failed_task_is_retried_until_max_attempts(queue):
+    job = queue.enqueue([("Q12025", "A")])
+    queue.fail(queue.claim("w1", job), "boom")
+    assert queue.status(job)["queued"] == 1
+    queue.fail(queue.claim("w1", job), "boom again")
+    assert queue.status(job)["failed"] == 1
+
+
+def test_released_task_does_not_count_the_attempt(queue):
+    job = queue.enqueue([("Q12025", "A")])
+    lease = queue.claim("w1", job)
+    assert queue.release(lease, "budget")
+    again = queue.claim("w2", job)
+    assert again.attempt == 1
+
+
+def test_quarter_is_consolidated_exactly_once(queue):
+    job = queue.enqueue([("Q12025", "A"), ("Q12025", "B")])
+    first = queue.claim("w1", job)
+    second = queue.claim("w2", job)
+    queue.complete(first, "analyzed")
+    assert not queue.claim_consolidation(job, "Q12025", "w1")  # B is still open
+    queue.complete(second, "analyzed")
+    claims = [queue.claim_consolidation(job, "Q12025", w) for w in ("w1", "w2")]
+    assert claims == [True, False]
+    assert queue.unconsolidated_quarters(job) == []
+
+
+def test_worker_hands_back_a_task_on_the_daily_budget_and_retries_it(queue, monkeypatch):
+    outcomes = [BudgetExceeded("daily", "tokens", 100, 100), "analyzed"]
+
+    def analyze_bank(*args, **kwargs):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(backfill, "analyze_bank", analyze_bank)
+    consolidated = []
+    monkeypatch.setattr(backfill, "consolidate_quarter", lambda base_dir, quarter: consolidated.append(quarter))
+    waits = []
+    ledger = SimpleNamespace(wait_for_budget=lambda run_id=None: waits.append(run_id))
+    worker = QueueWorker(queue, SimpleNamespace(ledger=ledger), "base", worker_id="w1", poll_seconds=0)
+
+    job = queue.enqueue([("Q12025", "A")])
+    assert worker.run(job) == 1
+    assert job in waits  # paused without holding the lease
+    status = queue.status(job)
+    assert status["done"] == 1
+    assert consolidated == ["Q12025"]
+
+
+def test_worker_stops_on_the_run_budget(queue, monkeypatch):
+    def over_budget(*args, **kwargs):
+        raise BudgetExceeded("run", "tokens", 100, 100)
+
+    monkeypatch.setattr(backfill, "analyze_bank", over_budget)
+    worker = QueueWorker(queue, SimpleNamespace(ledger=None), "base", worker_id="w1")
+    job = queue.enqueue([("Q12025", "A")])
+    with pytest.raises(BudgetExceeded):
+        worker.run_one(queue.claim("w1", job))
+    assert queue.status(job)["queued"] == 1
@@ -0,0 +1,85 @@
+"""
+Pre-flight token estimates for chat completions.
+
+Azure OpenAI counts ``max_tokens`` against the deployment's tokens-per-minute quota
+when a request is admitted, so reserving a fixed 4000 tokens for a response that needs
+a few hundred limits how many banks can be analyzed at once. The completion cap is
+instead derived from the requested response schema: a skeleton response with a
+placeholder in every cell is rendered and counted, and a safety margin is added. A
+response cut off at the cap (``finish_reason == "length"``) is retried with a larger one.
+
+Tokens are counted with ``tiktoken`` when it is installed and estimated from the
+character count otherwise.
+"""
+
+import os
+import json
+import math
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_MAX_TOKENS = 4000           # cap for requests without a response schema
+MIN_COMPLETION_TOKENS = 256
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "16000"))
+COMPLETION_TOKEN_MARGIN = float(os.getenv("COMPLETION_TOKEN_MARGIN", "1.3"))
+TOKENS_PER_MESSAGE = 4              # role and separators of each chat message
+CHARS_PER_TOKEN = 3.0               # conservative for number-heavy tables
+PLACEHOLDER_VALUE = "-12,345.67%"   # widest typical metric cell
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except ValueError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text`` (exact with tiktoken, a conservative estimate without)."""
+    encoder = _encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]], response_schema: Optional[Dict[str, Any]] = None) -> int:
+    """Prompt tokens of a chat request (a structured-output schema is sent along as well)."""
+    tokens = sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages)
+    if response_schema is not None:
+        tokens += count_tokens(json.dumps(response_schema))
+    return tokens
+
+
+def schema_skeleton(schema: Dict[str, Any]) -> Any:
+    """Example instance of a schema with ``PLACEHOLDER_VALUE`` in every string cell."""
+    if schema.get("type") == "object":
+        return {name: schema_skeleton(sub) for name, sub in schema.get("properties", {}).items()}
+    if schema.get("type") == "array":
+        return [schema_skeleton(schema.get("items", {}))]
+    return PLACEHOLDER_VALUE
+
+
+def estimate_completion_tokens(response_schema: Dict[str, Any]) -> int:
+    """Tokens of a complete (pretty-printed) response matching the schema."""
+    return count_tokens(json.dumps(schema_skeleton(response_schema), indent=2))
+
+
+def completion_cap(response_schema: Optional[Dict[str, Any]], margin: float = COMPLETION_TOKEN_MARGIN) -> int:
+    """``max_tokens`` for a request: the expected completion plus the safety margin."""
+    if response_schema is None:
+        return DEFAULT_MAX_TOKENS
+    expected = estimate_completion_tokens(response_schema)
+    return min(MAX_COMPLETION_TOKENS, max(MIN_COMPLETION_TOKENS, math.ceil(expected * margin)))
+
+
+def next_cap(cap: int) -> Optional[int]:
+    """Larger cap to retry a truncated completion with, or None if already at the maximum."""
+    if cap >= MAX_COMPLETION_TOKENS:
+        return None
+    return min(MAX_COMPLETION_TOKENS, cap * 2)
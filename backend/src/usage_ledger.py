@@ -0,0 +1,249 @@
+"""
+Persistent ledger of Azure usage with run-level and daily budgets.
+
+Every chat completion (prompt/completion tokens from the response's ``usage``) and every
+Document Intelligence layout (pages analyzed) is charged to the ledger together with
+the run, bank, quarter and stage it belongs to (taken from the active ``RunManifest``
+and ``stage``). The ledger is a SQLite database shared by all processes of a deployment.
+
+Budgets (unset or 0 = unlimited)::
+
+    DAILY_TOKEN_BUDGET / DAILY_PAGE_BUDGET   all usage of the current (local) day
+    RUN_TOKEN_BUDGET / RUN_PAGE_BUDGET       usage of one run (API request, batch, backfill or queue job)
+
+``check`` raises ``BudgetExceeded`` before new remote work is dispatched once a budget
+is used up; ``wait_for_budget`` instead pauses background work until the daily budget
+resets.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from instrumentation import current_manifest, current_stage, record
+
+
+GROUP_COLUMNS = ("day", "run_id", "bank", "quarter", "stage", "deployment")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    run_id TEXT,
+    bank TEXT,
+    quarter TEXT,
+    stage TEXT,
+    deployment TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS usage_day ON usage (day);
+CREATE INDEX IF NOT EXISTS usage_run ON usage (run_id);
+"""
+
+
+def _budget_from_env(name: str) -> Optional[int]:
+    value = int(os.getenv(name, "0") or 0)
+    return value or None
+
+
+class BudgetExceeded(RuntimeError):
+    """A run-level or daily budget is used up."""
+
+    def __init__(self, scope: str, resource: str, used: int, budget: int):
+        self.scope = scope          # "daily" or "run"
+        self.resource = resource    # "tokens" or "pages"
+        self.used = used
+        self.budget = budget
+        super().__init__(f"{scope.capitalize()} {resource} budget reached: {used} of {budget} used")
+
+
+class UsageLedger:
+    """Token and page usage per run, bank, quarter and stage."""
+
+    def __init__(self, db_path: str, daily_token_budget: Optional[int] = None,
+                 daily_page_budget: Optional[int] = None, run_token_budget: Optional[int] = None,
+                 run_page_budget: Optional[int] = None):
+        """
+        Args:
+            db_path: Ledger database
+            daily_token_budget: Prompt + completion tokens allowed per day
+            daily_page_budget: Document Intelligence pages allowed per day
+            run_token_budget: Tokens allowed per run
+            run_page_budget: Pages allowed per run
+        """
+        self.db_path = db_path
+        self.budgets = {
+            ("daily", "tokens"): daily_token_budget,
+            ("daily", "pages"): daily_page_budget,
+            ("run", "tokens"): run_token_budget,
+            ("run", "pages"): run_page_budget,
+        }
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls, db_path: str) -> "UsageLedger":
+        return cls(
+            db_path,
+            daily_token_budget=_budget_from_env("DAILY_TOKEN_BUDGET"),
+            daily_page_budget=_budget_from_env("DAILY_PAGE_BUDGET"),
+            run_token_budget=_budget_from_env("RUN_TOKEN_BUDGET"),
+            run_page_budget=_budget_from_env("RUN_PAGE_BUDGET"),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=60)
+
+    def charge(self, prompt_tokens: int = 0, completion_tokens: int = 0, pages: int = 0,
+               deployment: Optional[str] = None, **context: Any) -> None:
+        """
+        Record usage of one remote call.
+
+        run_id, bank, quarter and stage default to those of the active manifest and stage
+        and can be overridden through ``context``.
+        """
+        manifest = current_manifest()
+        attributed = dict(manifest.context) if manifest is not None else {}
+        attributed.setdefault("stage", current_stage())
+        attributed.update(context)
+        now = datetime.now()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO usage (ts, day, run_id, bank, quarter, stage, deployment, "
+                "prompt_tokens, completion_tokens, pages) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now.timestamp(), now.date().isoformat(), attributed.get("run_id"), attributed.get("bank"),
+                 attributed.get("quarter"), attributed.get("stage"), deployment,
+                 int(prompt_tokens or 0), int(completion_tokens or 0), int(pages or 0)))
+
+    def totals(self, day: Optional[str] = None, run_id: Optional[str] = None) -> Dict[str, int]:
+        """Tokens and pages used on a day and/or by a run."""
+        rows = self.usage(day=day, run_id=run_id)
+        return {
+            "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+            "completion_tokens": sum(r["completion_tokens"] for r in rows),
+            "tokens": sum(r["tokens"] for r in rows),
+            "pages": sum(r["pages"] for r in rows),
+        }
+
+    def usage(self, group_by: Sequence[str] = (), day: Optional[str] = None, run_id: Optional[str] = None,
+              since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregated usage rows.
+
+        Args:
+            group_by: Columns of GROUP_COLUMNS to group by
+            day: Only this day ("YYYY-MM-DD")
+            run_id: Only this run
+            since: Only days on or after this one
+        """
+        unknown = set(group_by) - set(GROUP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot group usage by {', '.join(sorted(unknown))}")
+        where, params = [], []
+        for column, op, value in (("day", "=", day), ("run_id", "=", run_id), ("day", ">=", since)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                params.append(value)
+        columns = ", ".join(group_by)
+        query = (f"SELECT {columns + ', ' if columns else ''}"
+                 "SUM(prompt_tokens), SUM(completion_tokens), SUM(pages), COUNT(*) FROM usage")
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        if columns:
+            query += f" GROUP BY {columns} ORDER BY {columns}"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        result = []
+        for row in rows:
+            keys = dict(zip(group_by, row[:len(group_by)]))
+            prompt, completion, pages, calls = (v or 0 for v in row[len(group_by):])
+            if not calls:
+                continue
+            result.append({**keys, "prompt_tokens": prompt, "completion_tokens": completion,
+                           "tokens": prompt + completion, "pages": pages, "calls": calls})
+        return result
+
+    def check(self, run_id: Optional[str] = None, tokens: int = 0, pages: int = 0) -> None:
+        """
+        Raise ``BudgetExceeded`` if a budget is used up, or would be by ``tokens``/``pages`` more.
+
+        Args:
+            run_id: Run whose run-level budget applies (default: the active manifest's)
+            tokens: Tokens the next call is expected to use
+            pages: Pages the next call is expected to analyze
+        """
+        if not any(self.budgets.values()):
+            return
+        if run_id is None:
+            manifest = current_manifest()
+            run_id = manifest.context.get("run_id") if manifest is not None else None
+        used = {"daily": self.totals(day=date.today().isoformat())}
+        if run_id is not None:
+            used["run"] = self.totals(run_id=run_id)
+        for (scope, resource), budget in self.budgets.items():
+            if budget is None or scope not in used:
+                continue
+            expected = tokens if resource == "tokens" else pages
+            if used[scope][resource] >= budget or (expected and used[scope][resource] + expected > budget):
+                record("budget_rejections", scope=scope, resource=resource)
+                raise BudgetExceeded(scope, resource, used[scope][resource], budget)
+
+    def wait_for_budget(self, run_id: Optional[str] = None, poll_seconds: float = 300.0,
+                        stop: Optional[threading.Event] = None) -> bool:
+        """
+        Block while the daily budget is used up (background work pauses until it resets).
+
+        Args:
+            run_id: Run whose run-level budget applies
+            poll_seconds: How often the budget is checked again
+            stop: Optional event that ends the wait early
+
+        Returns:
+            True once the budget allows work, False if ``stop`` was set first
+
+        Raises:
+            BudgetExceeded: If the run's own budget is used up (waiting would not help)
+        """
+        while True:
+            if stop is not None and stop.is_set():
+                return False
+            try:
+                self.check(run_id)
+                return True
+            except BudgetExceeded as e:
+                if e.scope != "daily":
+                    raise
+                record("budget_pauses", resource=e.resource)
+                delay = min(poll_seconds, seconds_until_midnight())
+                if stop is not None:
+                    stop.wait(delay)
+                else:
+                    time.sleep(delay)
+
+
+def seconds_until_midnight() -> float:
+    now = datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1.0, (tomorrow - now).total_seconds())
+
+
+def format_report(rows: List[Dict[str, Any]], group_by: Sequence[str]) -> str:
+    """Plain-text table of ``UsageLedger.usage`` rows."""
+    headers = list(group_by) + ["calls", "prompt_tokens", "completion_tokens", "tokens", "pages"]
+    table = [[str(row.get(h) if row.get(h) is not None else "-") for h in headers] for row in rows]
+    if rows and group_by:
+        totals = [str(sum(row[h] for row in rows)) for h in headers[len(group_by):]]
+        table.append(["TOTAL"] + [""] * (len(group_by) - 1) + totals)
+    widths = [max([len(h)] + [len(r[i]) for r in table]) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths)),
+             "  ".join("-" * w for w in widths)]
+    lines += ["  ".join(cell.ljust(w) for cell, w in zip(r, widths)) for r in table]
+    return "\n".join(lines)
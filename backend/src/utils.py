@@ -1,8 +1,11 @@
 import os
 import json
-from typing import List, Dict
+import tempfile
+from typing import List, Dict, Any, Union
 from pathlib import Path
 
+from run_config import RunConfig
+
 def ensure_results_subdirs(output_path: str):
     """
     Ensure the results directory and all necessary subdirectories exist for the output path.
@@ -11,47 +14,79 @@ def ensure_results_subdirs(output_path: str):
     output_dir.mkdir(parents=True, exist_ok=True)
 
 
-def create_batch_config_from_config(config_path: str, base_dir: str) -> List[Dict]:
+def atomic_write_json(output_path: str, data: Any, indent: int = 2):
+    """
+    Write JSON via a temp file in the same directory and an atomic rename,
+    so a crash never leaves a truncated file behind.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def create_batch_config_from_config(config: Union[str, RunConfig], base_dir: str) -> List[Dict]:
     """
-    Create batch config list from config.json and folder structure.
+    Create batch config list from a run configuration and folder structure.
     Args:
-        config_path: Path to config.json
+        config: RunConfig of the run, or path to a config.json to read it from
         base_dir: Base directory of the project (e.g., 'D:/office_Work_shennanigans/hackathon/integrated_hackathon_codebase')
     Returns:
         List of config dicts for batch processing.
     """
+    run_config = RunConfig.from_file(config) if isinstance(config, str) else config
+    return create_batch_config(list(run_config.requested_bank_names), run_config.latest_quarter, base_dir)
+
+def create_batch_config(banks: List[str], latest_quarter: str, base_dir: str) -> List[Dict]:
+    """
+    Create batch config list for the given banks and quarter from the document catalog.
+    Args:
+        banks: Bank folder names to include
+        latest_quarter: Quarter folder name, e.g. "Q12025"
+        base_dir: Base directory of the project
+    Returns:
+        List of config dicts for batch processing (banks without documents are skipped);
+        "pdfs" lists every document of the bank, most preferred first.
+    """
+    from document_catalog import get_document_catalog, select_documents  # imported here: document_catalog depends on this module
+
     batch_config = []
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+    catalog = get_document_catalog(base_dir)
+    catalog.refresh(latest_quarter)
     
-    banks = config.get("requested_bank_names", [])
-    latest_quarter = config.get("latest_quarter")
-    
-    # Check if the documents directory for the latest_quarter exists for each bank
+    # Look up the supplement(s) of each bank in the document catalog
     for bank in banks:
         documents_dir = os.path.join(base_dir, "documents", latest_quarter, bank)
-        if not os.path.exists(documents_dir):
-            # raise FileNotFoundError(f"Data does not exist for quarter '{latest_quarter}' for bank '{bank}'. Expected directory: {documents_dir}")
-            return
+        if not catalog.has_folder(latest_quarter, bank):
+            print(f"Data does not exist for quarter '{latest_quarter}' for bank '{bank}'. Expected directory: {documents_dir}. Skipping this bank.")
+            continue
 
-        # Find the PDF file that contains "supplement" in its name
-        pdf_files = [f for f in os.listdir(documents_dir) if "supplement" in f.lower() and f.endswith('.pdf')]
+        # Every relevant document is analyzed; a full supplement is left out when its
+        # extracted page subset is present (same tables, a fraction of the upload and token cost)
+        pdf_files = select_documents(catalog.documents_for(latest_quarter, bank))
         
         if not pdf_files:
             print(f"No PDF file found for {bank} in {documents_dir} with 'supplement' in the name. Skipping this bank.")
             continue 
         
-        # Assuming we take the first matching PDF file
-        pdf_path = os.path.join(documents_dir, pdf_files[0])
+        if len(pdf_files) > 1:
+            print(f"{bank}: analyzing {len(pdf_files)} documents together: "
+                  f"{', '.join(os.path.basename(path) for path in pdf_files)}")
         
         user_prompt_path = os.path.join(base_dir, "prompts", bank, f"user_prompt.txt")
         system_prompt_path = os.path.join(base_dir, "prompts", "System_prompt", "system_prompt2.txt")
         output_path = os.path.join(base_dir, "results", latest_quarter, bank, f"{bank}.json")
         
-        ensure_results_subdirs(output_path)  # Ensure the output directory exists
-        
         batch_config.append({
-            "pdf": pdf_path,
+            "pdfs": pdf_files,
             "user_prompt": user_prompt_path,
             "system_prompt": system_prompt_path,
             "output": output_path,
@@ -60,6 +95,27 @@ def create_batch_config_from_config(config_path: str, base_dir: str) -> List[Dic
     
     return batch_config
 
+def register_documents(batch_config: List[Dict], latest_quarter: str, base_dir: str):
+    """
+    Catalog the documents a run is about to analyze and persist the catalog.
+    Kept out of create_batch_config so that planning (dry runs) has no side effects.
+    Args:
+        batch_config: Entries that will be analyzed
+        latest_quarter: Quarter folder name
+        base_dir: Base directory of the project
+    """
+    from document_catalog import get_document_catalog
+
+    catalog = get_document_catalog(base_dir)
+    for config in batch_config:
+        for pdf_path in config["pdfs"]:
+            catalog.register(pdf_path, latest_quarter, config["bank"])  # warns about reused documents
+    catalog.save()
+
+def consolidated_results_path(base_dir: str, run_config: RunConfig) -> str:
+    """Path of the consolidated results of a run's quarter."""
+    return os.path.join(base_dir, "results", run_config.latest_quarter, "consolidated_results.json")
+
 def create_consolidated_results(batch_config: List[Dict], consolidated_output_path: str):
     """
     Aggregate individual bank results into a consolidated_results.json.
@@ -77,6 +133,5 @@ def create_consolidated_results(batch_config: List[Dict], consolidated_output_pa
         with open(output_path, 'r') as f:
             bank_data = json.load(f)
         consolidated["banks"][bank] = bank_data
-    with open(consolidated_output_path, 'w') as f:
-        json.dump(consolidated, f, indent=2)
+    atomic_write_json(consolidated_output_path, consolidated)
     print(f"Consolidated results saved to {consolidated_output_path}") 
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Watch mode: process supplements as they are dropped into ``documents/``.
+
+File system events come from watchdog (inotify on Linux) when it is installed; otherwise
+the tree is polled. Either way a new or changed PDF is only handed to the pipeline once
+its size and mtime have stopped changing for ``settle_seconds``, so partially copied
+files are never analyzed.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from document_catalog import detect_document_type, RELEVANT_DOCUMENT_TYPES
+
+
+DEFAULT_SETTLE_SECONDS = 30
+DEFAULT_POLL_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentWatcher:
+    """Calls ``on_ready(quarter, bank)`` when a supplement under ``documents/<quarter>/<bank>/`` settles."""
+
+    def __init__(self, documents_root: str, on_ready: Callable[[str, str], None],
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            documents_root: The ``documents/`` directory
+            on_ready: Callback run (in the watcher thread) for each settled (quarter, bank)
+            settle_seconds: How long a file must stay unchanged before it is processed
+            poll_interval: Seconds between settle checks (and tree scans when polling)
+        """
+        self.documents_root = os.path.abspath(documents_root)
+        self.on_ready = on_ready
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        # path -> (size, mtime, time the file was last seen changing)
+        self._pending: Dict[str, Tuple[int, float, float]] = {}
+        self._lock = threading.Lock()
+        self._snapshot = self._scan()  # files present at startup are the baseline
+        self._stop = threading.Event()
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        snapshot = {}
+        for root, _, files in os.walk(self.documents_root):
+            for name in files:
+                if name.lower().endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def notify(self, path: str) -> None:
+        """Mark a path as changed; it is processed once it has settled."""
+        if not path.lower().endswith(".pdf"):
+            return
+        if detect_document_type(os.path.basename(path)) not in RELEVANT_DOCUMENT_TYPES:
+            return
+        with self._lock:
+            self._pending[os.path.abspath(path)] = (-1, -1.0, time.monotonic())
+
+    def _poll_tree(self) -> None:
+        snapshot = self._scan()
+        for path, state in snapshot.items():
+            if self._snapshot.get(path) != state:
+                self.notify(path)
+        self._snapshot = snapshot
+
+    def _location(self, path: str) -> Optional[Tuple[str, str]]:
+        parts = os.path.relpath(path, self.documents_root).split(os.sep)
+        if len(parts) != 3:
+            logger.warning(f"Ignoring {path}: expected documents/<quarter>/<bank>/<file>.pdf")
+            return None
+        return parts[0], parts[1]
+
+    def _settled(self):
+        """Pop pending paths whose size and mtime have been stable for settle_seconds."""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (size, mtime, changed_at) in list(self._pending.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self._pending[path]  # removed or renamed away
+                    continue
+                if (stat.st_size, stat.st_mtime) != (size, mtime):
+                    self._pending[path] = (stat.st_size, stat.st_mtime, now)
+                elif now - changed_at >= self.settle_seconds:
+                    del self._pending[path]
+                    ready.append(path)
+        return ready
+
+    def _start_observer(self):
+        """Start a watchdog observer, or return None to fall back to polling."""
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("watchdog not installed; polling documents/ for changes")
+            return None
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher.notify(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(_Handler(), self.documents_root, recursive=True)
+        observer.start()
+        logger.info(f"Watching {self.documents_root} for new supplements")
+        return observer
+
+    def run(self) -> None:
+        """Block and process settled documents until ``stop()`` is called (or Ctrl+C)."""
+        observer = self._start_observer()
+        try:
+            while not self._stop.is_set():
+                if observer is None:
+                    self._poll_tree()
+                for quarter_bank in sorted({loc for loc in map(self._location, self._settled()) if loc}):
+                    try:
+                        self.on_ready(*quarter_bank)
+                    except Exception as e:
+                        logger.error(f"Processing {quarter_bank[1]} {quarter_bank[0]} failed: {e}")
+                self._stop.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    def stop(self) -> None:
+        self._stop.set()
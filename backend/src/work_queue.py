@@ -0,0 +1,337 @@
+"""
+Lease-based work queue for sharding analyses across worker processes and nodes.
+
+A coordinator enqueues (quarter, bank) tasks for a job into a SQLite database; any
+number of workers (``main.py --worker``) pointing at the same database claim tasks,
+heartbeat while they run and record the outcome. A claim is a lease that expires after
+``lease_seconds`` without a heartbeat, after which the task is handed to the next worker
+(up to ``max_attempts`` claims). When the last task of a quarter finishes, exactly one
+worker wins the right to consolidate that quarter.
+
+The database must live on storage every worker can lock (a local disk for several
+processes, or a shared filesystem with working POSIX locks for several nodes).
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from instrumentation import record
+
+
+DEFAULT_LEASE_SECONDS = float(os.getenv("WORK_QUEUE_LEASE_SECONDS", "600"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+
+# queued -> leased -> done | failed (leased -> queued again when a lease expires)
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL,
+    quarter TEXT NOT NULL,
+    bank TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (job_id, quarter, bank)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS quarters (
+    job_id TEXT NOT NULL,
+    quarter TEXT NOT NULL,
+    consolidated_by TEXT,
+    PRIMARY KEY (job_id, quarter)
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:4]}"
+
+
+class Lease:
+    """A claimed task; only the holder may heartbeat or complete it."""
+
+    __slots__ = ("job_id", "quarter", "bank", "worker_id", "attempt")
+
+    def __init__(self, job_id: str, quarter: str, bank: str, worker_id: str, attempt: int):
+        self.job_id = job_id
+        self.quarter = quarter
+        self.bank = bank
+        self.worker_id = worker_id
+        self.attempt = attempt
+
+    def __repr__(self) -> str:
+        return f"Lease({self.bank} {self.quarter}, job={self.job_id}, attempt={self.attempt})"
+
+
+class WorkQueue:
+    """(quarter, bank) tasks of one or more jobs in a SQLite database."""
+
+    def __init__(self, db_path: str, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            db_path: Queue database, shared by the coordinator and all workers
+            lease_seconds: How long a claim stays valid without a heartbeat
+            max_attempts: Claims per task before it is marked failed
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(sqlite3.connect(self.db_path, timeout=60)) as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """A connection holding the database write lock until the block ends."""
+        # A connection per operation keeps the queue usable from heartbeat threads
+        with closing(sqlite3.connect(self.db_path, timeout=60, isolation_level=None)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, tasks: List[Tuple[str, str]], job_id: Optional[str] = None) -> str:
+        """
+        Add (quarter, bank) tasks to a job; tasks already in the job are left alone.
+
+        Returns:
+            The job id
+        """
+        job_id = job_id or f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._transaction() as conn:
+            for seq, (quarter, bank) in enumerate(tasks):
+                conn.execute(
+                    "INSERT OR IGNORE INTO tasks (job_id, quarter, bank, seq, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (job_id, quarter, bank, seq, QUEUED, now))
+                conn.execute("INSERT OR IGNORE INTO quarters (job_id, quarter) VALUES (?, ?)", (job_id, quarter))
+        record("queue_enqueued_tasks", len(tasks))
+        return job_id
+
+    def _requeue_expired(self, conn) -> None:
+        now = time.time()
+        expired = conn.execute(
+            "SELECT job_id, quarter, bank, attempts FROM tasks WHERE status = ? AND lease_expires < ?",
+            (LEASED, now)).fetchall()
+        for job_id, quarter, bank, attempts in expired:
+            status = QUEUED if attempts < self.max_attempts else FAILED
+            conn.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, lease_expires = NULL, error = ? "
+                "WHERE job_id = ? AND quarter = ? AND bank = ?",
+                (status, "lease expired", job_id, quarter, bank))
+            record("queue_expired_leases", requeued=str(status == QUEUED).lower())
+
+    def claim(self, worker_id: str, job_id: Optional[str] = None) -> Optional[Lease]:
+        """
+        Lease the next queued task (of ``job_id``, or of any job).
+
+        Returns:
+            The lease, or None if nothing is queued right now
+        """
+        with self._transaction() as conn:
+            self._requeue_expired(conn)
+            query = "SELECT job_id, quarter, bank, attempts FROM tasks WHERE status = ?"
+            params: List[Any] = [QUEUED]
+            if job_id:
+                query += " AND job_id = ?"
+                params.append(job_id)
+            row = conn.execute(query + " ORDER BY job_id, seq LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            task_job, quarter, bank, attempts = row
+            conn.execute(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires = ?, attempts = ?, updated_at = ? "
+                "WHERE job_id = ? AND quarter = ? AND bank = ?",
+                (LEASED, worker_id, time.time() + self.lease_seconds, attempts + 1,
+                 datetime.now().isoformat(timespec="seconds"), task_job, quarter, bank))
+        record("queue_claims")
+        return Lease(task_job, quarter, bank, worker_id, attempts + 1)
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """Extend a lease; False if it expired and was handed to another worker."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE job_id = ? AND quarter = ? AND bank = ? AND status = ? AND worker = ?",
+                (time.time() + self.lease_seconds, lease.job_id, lease.quarter, lease.bank, LEASED, lease.worker_id))
+            return cursor.rowcount == 1
+
+    def _finish(self, lease: Lease, status: str, result: Optional[str], error: Optional[str]) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE job_id = ? AND quarter = ? AND bank = ? AND status = ? AND worker = ?",
+                (status, result, error, datetime.now().isoformat(timespec="seconds"),
+                 lease.job_id, lease.quarter, lease.bank, LEASED, lease.worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, lease: Lease, result: str) -> bool:
+        """Mark a leased task done; False if the lease was lost in the meantime."""
+        return self._finish(lease, DONE, result, None)
+
+    def release(self, lease: Lease, reason: str) -> bool:
+        """Give a leased task back without counting the attempt (the task itself did not fail)."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, worker = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? "
+                "WHERE job_id = ? AND quarter = ? AND bank = ? AND status = ? AND worker = ?",
+                (QUEUED, reason, datetime.now().isoformat(timespec="seconds"),
+                 lease.job_id, lease.quarter, lease.bank, LEASED, lease.worker_id))
+            return cursor.rowcount == 1
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        """Give a leased task back (or mark it failed after ``max_attempts`` claims)."""
+        status = QUEUED if lease.attempt < self.max_attempts else FAILED
+        return self._finish(lease, status, None, error)
+
+    def open_tasks(self, job_id: Optional[str] = None) -> int:
+        """Queued or leased tasks (of ``job_id``, or of every job)."""
+        query, params = "SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)", [QUEUED, LEASED]
+        if job_id:
+            query += " AND job_id = ?"
+            params.append(job_id)
+        with closing(sqlite3.connect(self.db_path, timeout=60)) as conn:
+            (count,) = conn.execute(query, params).fetchone()
+        return count
+
+    def claim_consolidation(self, job_id: str, quarter: str, worker_id: str) -> bool:
+        """True for exactly one caller, once every task of the quarter has finished."""
+        with self._transaction() as conn:
+            (open_tasks,) = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE job_id = ? AND quarter = ? AND status IN (?, ?)",
+                (job_id, quarter, QUEUED, LEASED)).fetchone()
+            if open_tasks:
+                return False
+            cursor = conn.execute(
+                "UPDATE quarters SET consolidated_by = ? WHERE job_id = ? AND quarter = ? AND consolidated_by IS NULL",
+                (worker_id, job_id, quarter))
+            return cursor.rowcount == 1
+
+    def unconsolidated_quarters(self, job_id: str) -> List[str]:
+        with closing(sqlite3.connect(self.db_path, timeout=60)) as conn:
+            rows = conn.execute(
+                "SELECT quarter FROM quarters WHERE job_id = ? AND consolidated_by IS NULL", (job_id,)).fetchall()
+        return [quarter for (quarter,) in rows]
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """Task counts per status plus the failed tasks of a job."""
+        with self._transaction() as conn:
+            self._requeue_expired(conn)
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,)).fetchall())
+            failed = conn.execute(
+                "SELECT quarter, bank, error FROM tasks WHERE job_id = ? AND status = ?", (job_id, FAILED)).fetchall()
+            workers = [w for (w,) in conn.execute(
+                "SELECT DISTINCT worker FROM tasks WHERE job_id = ? AND status = ?", (job_id, LEASED)).fetchall()]
+        counts = {s: counts.get(s, 0) for s in (QUEUED, LEASED, DONE, FAILED)}
+        return {
+            "job_id": job_id,
+            "total": sum(counts.values()),
+            **counts,
+            "finished": counts[QUEUED] + counts[LEASED] == 0,
+            "active_workers": workers,
+            "failures": [{"quarter": q, "bank": b, "error": e} for q, b, e in failed],
+        }
+
+
+class QueueWorker:
+    """Claims tasks from a ``WorkQueue`` and runs them with a ``PDFAnalyzer``."""
+
+    def __init__(self, queue: WorkQueue, analyzer, base_dir: str, worker_id: Optional[str] = None,
+                 force: bool = False, poll_seconds: float = 5.0):
+        self.queue = queue
+        self.analyzer = analyzer
+        self.base_dir = base_dir
+        self.worker_id = worker_id or default_worker_id()
+        self.force = force
+        self.poll_seconds = poll_seconds
+        self.processed = 0
+
+    def _keep_alive(self, lease: Lease, stop: threading.Event) -> None:
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        while not stop.wait(interval):
+            if not self.queue.heartbeat(lease):
+                print(f"⚠️  Lost lease on {lease.bank} {lease.quarter}; another worker took it over")
+                return
+
+    def run_one(self, lease: Lease) -> None:
+        from backfill import analyze_bank, consolidate_quarter
+        from usage_ledger import BudgetExceeded
+
+        print(f"🔧 [{self.worker_id}] {lease.bank} {lease.quarter} (attempt {lease.attempt})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(lease, stop), daemon=True)
+        heartbeat.start()
+        budget_error = None
+        try:
+            # The job is the run its usage is charged to
+            status = analyze_bank(self.analyzer, self.base_dir, lease.quarter, lease.bank, self.force,
+                                  run_id=lease.job_id)
+        except BudgetExceeded as e:
+            # Not the task's fault: hand it back uncounted; the daily budget is waited for below
+            self.queue.release(lease, str(e))
+            budget_error = e
+        except Exception as e:
+            print(f"❌ {lease.bank} {lease.quarter} failed: {e}")
+            self.queue.fail(lease, str(e))
+        else:
+            if not self.queue.complete(lease, status):
+                print(f"⚠️  {lease.bank} {lease.quarter} finished after its lease expired")
+            print(f"✅ {lease.bank} {lease.quarter}: {status}")
+            self.processed += 1
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if budget_error is not None:
+            if budget_error.scope != "daily":
+                print(f"🛑 {budget_error}; stopping worker")
+                raise budget_error
+            print(f"⏸️  {budget_error}; pausing until the budget resets")
+            # Pause without holding a lease; raises if the job's own budget is used up
+            self.analyzer.ledger.wait_for_budget(lease.job_id)
+            return
+
+        # Whoever finishes the last task of the quarter consolidates it
+        if self.queue.claim_consolidation(lease.job_id, lease.quarter, self.worker_id):
+            consolidate_quarter(self.base_dir, lease.quarter)
+            print(f"📦 Consolidated {lease.quarter}")
+
+    def run(self, job_id: Optional[str] = None, exit_when_idle: bool = True) -> int:
+        """
+        Process tasks until the queue is empty (or forever with ``exit_when_idle=False``).
+
+        Returns:
+            Number of tasks this worker completed
+        """
+        print(f"👷 Worker {self.worker_id} polling {self.queue.db_path}")
+        while True:
+            # Pause (without holding a lease) while the daily usage budget is exhausted
+            if self.analyzer.ledger is not None:
+                self.analyzer.ledger.wait_for_budget(job_id)
+            lease = self.queue.claim(self.worker_id, job_id)
+            if lease is not None:
+                self.run_one(lease)
+                continue
+            if exit_when_idle and self.queue.open_tasks(job_id) == 0:
+                return self.processed
+            # Other workers still hold leases that may expire and come back to the queue
+            time.sleep(self.poll_seconds)